@@ -7,3 +7,4 @@ class AposConfig(AppConfig):
 
     def ready(self):
         import apos.signals
+        import apos.prefetch
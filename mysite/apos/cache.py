@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Everything the permission mixins need to know about a user; small and picklable so it can live in a shared cache
+EmployeeScope = namedtuple('EmployeeScope', [
+    'employee_id',
+    'region_location_id',
+    'external_location_id',
+    'unique_identifier',
+    'group_names',
+])
+
+
+# Process-local LRU, optionally backed by a Django cache alias shared between workers; signals only reach
+# the local tier of the process that made the change, so TIMEOUT bounds staleness elsewhere
+class TieredCache:
+    key_prefix = None
+    generation_key = None
+
+    def __init__(self, maxsize=2048, timeout=60, cache_alias=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def shared_cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                expires_at, value = entry
+
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                del self._entries[key]
+
+        value = self._get_shared(key)
+
+        with self._lock:
+            if value is not None:
+                self.shared_hits += 1
+                self._store(key, value, now)
+            else:
+                self.misses += 1
+
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+        shared_cache = self.shared_cache
+
+        if shared_cache:
+            generation = shared_cache.get(self.generation_key, 0)
+            shared_cache.set(self.key_prefix + str(key), (generation, value), self.timeout)
+
+    def invalidate(self, *keys):
+        keys = [key for key in keys if key is not None]
+
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+            self.invalidations += len(keys)
+
+        shared_cache = self.shared_cache
+
+        if shared_cache and keys:
+            shared_cache.delete_many([self.key_prefix + str(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+        # Bumping the generation retires every shared entry without wiping unrelated keys in the same alias
+        shared_cache = self.shared_cache
+
+        if shared_cache:
+            try:
+                shared_cache.incr(self.generation_key)
+            except ValueError:
+                shared_cache.set(self.generation_key, 1, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0,
+            }
+
+    def _get_shared(self, key):
+        shared_cache = self.shared_cache
+
+        if not shared_cache:
+            return None
+
+        shared_key = self.key_prefix + str(key)
+        values = shared_cache.get_many([self.generation_key, shared_key])
+        entry = values.get(shared_key)
+
+        if entry and entry[0] == values.get(self.generation_key, 0):
+            return entry[1]
+
+        return None
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.timeout, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# Keyed by user id
+class EmployeeScopeCache(TieredCache):
+    key_prefix = 'apos:employee-scope:'
+    generation_key = 'apos:employee-scope-generation'
+
+
+def build_cache(cache_class, setting_name):
+    options = getattr(settings, setting_name, {})
+
+    return cache_class(
+        maxsize=options.get('MAXSIZE', 2048),
+        timeout=options.get('TIMEOUT', 60),
+        cache_alias=options.get('CACHE_ALIAS'),
+    )
+
+
+employee_scope_cache = build_cache(EmployeeScopeCache, 'APOS_EMPLOYEE_SCOPE_CACHE')
@@ -0,0 +1,74 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from .cache import TieredCache, build_cache
+from .models import RecipeIngredients
+
+
+ZERO = Decimal('0')
+
+
+# One serving's ingredient cost and the ingredient map Recipes.ingredients shows ({item name: quantity})
+RecipeCost = namedtuple('RecipeCost', ['cost', 'ingredients'])
+
+
+# Keyed by recipe id; signals drop a recipe when one of its ingredients or their inventory items changes
+class RecipeCostCache(TieredCache):
+    key_prefix = 'apos:recipe-cost:'
+    generation_key = 'apos:recipe-cost-generation'
+
+
+recipe_cost_cache = build_cache(RecipeCostCache, 'APOS_RECIPE_COST_CACHE')
+
+
+def unit_price(total_value, quantity):
+    return total_value / quantity if quantity else ZERO
+
+
+# fresh skips the cache for anything that keeps the cost for good; signals only reach this process's cache, so another
+# worker can hold a cost from before a price change for up to TIMEOUT seconds
+def recipe_cost_details(recipe_ids, fresh=False):
+    details = {}
+    missing = []
+
+    for recipe_id in recipe_ids:
+        cached = None if fresh else recipe_cost_cache.get(recipe_id)
+
+        if cached is None:
+            missing.append(recipe_id)
+        else:
+            details[recipe_id] = cached
+
+    if missing:
+        costs = dict.fromkeys(missing, ZERO)
+        ingredients = {recipe_id: {} for recipe_id in missing}
+
+        # Every missing recipe's ingredients and their inventory items in one joined query
+        rows = RecipeIngredients.objects.filter(recipe__in=missing).values_list(
+            'recipe_id', 'quantity', 'inventory_item__item_name', 'inventory_item__total_value', 'inventory_item__quantity'
+        )
+
+        for recipe_id, quantity, item_name, total_value, stock_quantity in rows:
+            costs[recipe_id] += unit_price(total_value, stock_quantity) * quantity
+            ingredients[recipe_id][item_name] = quantity
+
+        for recipe_id in missing:
+            details[recipe_id] = RecipeCost(costs[recipe_id], ingredients[recipe_id])
+            recipe_cost_cache.set(recipe_id, details[recipe_id])
+
+    return details
+
+
+# Ingredient cost of one serving of each recipe; cached recipes cost nothing and the rest share one query
+def recipe_costs(recipe_ids, fresh=False):
+    return {recipe_id: details.cost for recipe_id, details in recipe_cost_details(recipe_ids, fresh).items()}
+
+
+def invalidate_recipe_costs(recipe_ids):
+    recipe_cost_cache.invalidate(*recipe_ids)
+
+
+def invalidate_inventory_item_costs(inventory_item_ids):
+    invalidate_recipe_costs(set(
+        RecipeIngredients.objects.filter(inventory_item__in=inventory_item_ids).values_list('recipe_id', flat=True)
+    ))
@@ -0,0 +1,158 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Employees, EmployeesPerformance
+
+
+COUNTER_SETTINGS = {
+    # 'counters' keeps the stored totals up to date on every save; 'derived' stops writing them and the performance
+    # page works them out from the records instead (see performance.py)
+    'SOURCE': 'counters',
+    # Buffered increments are summed in-process and written in batches; a crashed process loses what it hadn't flushed
+    'BUFFERED': False,
+    'MAX_PENDING': 500,
+    'MAX_AGE_SECONDS': 5,
+    **getattr(settings, 'APOS_PERFORMANCE_COUNTERS', {}),
+}
+
+COUNTER_FIELDS = {
+    field.name: field for field in EmployeesPerformance._meta.concrete_fields
+    if isinstance(field, (models.DecimalField, models.PositiveIntegerField))
+}
+
+
+def _clean(deltas):
+    cleaned = {}
+
+    for name, delta in deltas.items():
+        if name not in COUNTER_FIELDS:
+            raise ValueError(f'{name} is not an EmployeesPerformance counter')
+
+        # Hours come in as floats from the shift maths; decimal columns get the same value as a Decimal
+        if isinstance(COUNTER_FIELDS[name], models.DecimalField) and not isinstance(delta, Decimal):
+            delta = Decimal(str(delta))
+
+        if delta:
+            cleaned[name] = delta
+
+    return cleaned
+
+
+def _increments(deltas_by_employee):
+    names = {name for deltas in deltas_by_employee.values() for name in deltas}
+    changes = {}
+
+    for name in names:
+        zero = Decimal('0') if isinstance(COUNTER_FIELDS[name], models.DecimalField) else 0
+        per_employee = [
+            When(employee=employee, then=Value(deltas[name]))
+            for employee, deltas in deltas_by_employee.items() if name in deltas
+        ]
+
+        changes[name] = F(name) + Case(*per_employee, default=Value(zero), output_field=COUNTER_FIELDS[name])
+
+    return changes
+
+
+# Adds each employee's deltas to their performance row with one UPDATE ... SET x = x + CASE ... for the whole batch, so
+# concurrent terminals never lose each other's increments. A lone employee who already has a row costs that one
+# statement; otherwise missing rows are inserted first (ON CONFLICT DO NOTHING, so a racing writer's row wins) and
+# the UPDATE then applies to all of them
+def apply_counters(deltas_by_employee):
+    deltas_by_employee = {employee: _clean(deltas) for employee, deltas in deltas_by_employee.items() if employee is not None}
+    deltas_by_employee = {employee: deltas for employee, deltas in deltas_by_employee.items() if deltas}
+
+    if not deltas_by_employee:
+        return
+
+    rows = EmployeesPerformance.objects.filter(employee__in=list(deltas_by_employee))
+    changes = _increments(deltas_by_employee)
+
+    from .leaderboards import counters_changed
+
+    # Registered only once the increments are written: outside a transaction on_commit runs straight away, and a
+    # leaderboard rebuilt before the UPDATE would be cached without them
+    if len(deltas_by_employee) == 1 and rows.update(**changes):
+        transaction.on_commit(lambda: counters_changed(changes))
+        return
+
+    # Read before the transaction opens; SQLite can't turn a read transaction into a write one while another writer waits
+    new_rows = _new_rows(deltas_by_employee)
+
+    with transaction.atomic():
+        EmployeesPerformance.objects.bulk_create(new_rows, ignore_conflicts=True)
+        rows.update(**changes)
+        transaction.on_commit(lambda: counters_changed(changes))
+
+
+def _new_rows(employee_ids):
+    return [
+        EmployeesPerformance(employee_id=employee, external_location_id=external_location)
+        for employee, external_location in Employees.objects.filter(pk__in=list(employee_ids)).values_list('pk', 'external_location_id')
+    ]
+
+
+# Zeroed rows for employees who don't have one yet (INSERT ... ON CONFLICT DO NOTHING); existing rows are untouched
+def ensure_performance_rows(employee_ids):
+    EmployeesPerformance.objects.bulk_create(_new_rows(employee_ids), ignore_conflicts=True)
+
+
+# Sums increments per employee until MAX_PENDING employees are waiting or the oldest has waited MAX_AGE_SECONDS,
+# then writes them all with one apply_counters call
+class CounterBuffer:
+    def __init__(self, max_pending=None, max_age_seconds=None):
+        self.max_pending = max_pending or COUNTER_SETTINGS['MAX_PENDING']
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else COUNTER_SETTINGS['MAX_AGE_SECONDS']
+        self.lock = threading.Lock()
+        self.pending = defaultdict(lambda: defaultdict(int))
+        self.oldest = None
+
+    def add(self, employee_id, **deltas):
+        with self.lock:
+            for name, delta in _clean(deltas).items():
+                self.pending[employee_id][name] += delta
+
+            self.oldest = self.oldest or time.monotonic()
+            due = len(self.pending) >= self.max_pending or time.monotonic() - self.oldest >= self.max_age_seconds
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending, self.oldest = self.pending, defaultdict(lambda: defaultdict(int)), None
+
+        if pending:
+            apply_counters(pending)
+
+
+counter_buffer = CounterBuffer()
+atexit.register(counter_buffer.flush)
+
+
+# Employees this process has already given a performance row while counters are derived
+_rows_ensured = set()
+
+
+# What the save() methods call. Unbuffered, the increment is written straight away inside the caller's transaction;
+# buffered, it joins the batch once that transaction commits, so a rolled-back save counts nothing either way. With
+# derived counters nothing is written beyond making sure the employee has a row for the performance page to list
+def add_to_performance(employee_id, **deltas):
+    if employee_id is None:
+        return
+
+    if COUNTER_SETTINGS['SOURCE'] == 'derived':
+        if employee_id not in _rows_ensured:
+            ensure_performance_rows([employee_id])
+            _rows_ensured.add(employee_id)
+    elif COUNTER_SETTINGS['BUFFERED']:
+        transaction.on_commit(lambda: counter_buffer.add(employee_id, **deltas))
+    else:
+        apply_counters({employee_id: deltas})
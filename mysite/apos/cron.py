@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+
+# minute hour day-of-month month day-of-week, each a *, number, a-b range or comma list, any of them /step
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+
+def _parse_field(field, low, high):
+    values = set()
+
+    for part in field.split(','):
+        step = 1
+
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+
+            if step < 1:
+                raise ValueError(f'Step must be positive in \'{field}\'')
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if not low <= start <= end <= high:
+            raise ValueError(f'\'{part}\' is out of range {low}-{high}')
+
+        values.update(range(start, end + 1, step))
+
+    return frozenset(values)
+
+
+class CronSchedule:
+    def __init__(self, expression, timezone='UTC'):
+        self.expression = ALIASES.get(expression.strip(), expression.strip())
+        self.timezone = ZoneInfo(timezone)
+
+        fields = self.expression.split()
+
+        if len(fields) != 5:
+            raise ValueError(f'\'{expression}\' needs five fields: minute hour day-of-month month day-of-week')
+
+        try:
+            self.minutes, self.hours, self.days, self.months, self.weekdays = (
+                _parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)
+            )
+        except ValueError as error:
+            raise ValueError(f'Invalid cron expression \'{expression}\': {error}')
+
+        # Sunday can be written 7 as well as 0
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+
+        # As in cron, a restricted day-of-month and day-of-week match either one, not both
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches_day(self, day):
+        if day.month not in self.months:
+            return False
+
+        in_days = day.day in self.days
+        in_weekdays = (day.isoweekday() % 7) in self.weekdays
+
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+
+        return in_days or in_weekdays
+
+    # First matching minute strictly after `after`, worked out on the schedule's own wall clock and returned aware
+    def next_after(self, after):
+        local = after.astimezone(self.timezone).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+
+        for _ in range(366 * 5):
+            if self.matches_day(day):
+                earliest = local.time() if day == local.date() else time(0, 0)
+
+                for hour in sorted(self.hours):
+                    if hour < earliest.hour:
+                        continue
+
+                    for minute in sorted(self.minutes):
+                        if hour == earliest.hour and minute < earliest.minute:
+                            continue
+
+                        return datetime.combine(day, time(hour, minute), tzinfo=self.timezone)
+
+            day += timedelta(days=1)
+
+        raise ValueError(f'\'{self.expression}\' never matches')
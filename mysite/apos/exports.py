@@ -0,0 +1,132 @@
+import csv
+import json
+import zlib
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+from .models import (
+    DailyShiftRecords, EmployeeTipPayouts, EmployeeTipRecords, InventoryCostReports, InventoryUsage, Payments,
+    TipPoolingRecords, WeeklyShiftRecords
+)
+
+
+CHUNK_SIZE = 2000
+
+# Rows go out through values_list, so each export names its columns (follow FKs with __) and the date it filters on
+ExportSpec = namedtuple('ExportSpec', ['model', 'columns', 'date_field'])
+
+EXPORTS = {
+    'payments': ExportSpec(Payments, (
+        'id', 'payment_datetime', 'external_location__location_name', 'internal_location__location_name',
+        'employee__first_name', 'employee__last_name', 'category', 'payment_type', 'tip_amount_percent',
+        'service_charge_percent', 'total_bill', 'name_ordered_menu_items_and_quantities',
+    ), 'payment_datetime'),
+    'daily-shifts': ExportSpec(DailyShiftRecords, (
+        'id', 'shift_date', 'external_location__location_name', 'employee__first_name', 'employee__last_name',
+        'shift_type', 'punch_in_time', 'punch_out_time', 'total_hours_worked', 'earnings', 'status',
+    ), 'shift_date'),
+    'weekly-shifts': ExportSpec(WeeklyShiftRecords, (
+        'id', 'start_week_date', 'end_week_date', 'external_location__location_name', 'employee__first_name',
+        'employee__last_name', 'regular_hours_worked', 'overtime_hours_worked', 'earnings_this_week',
+    ), 'start_week_date'),
+    'inventory-cost-reports': ExportSpec(InventoryCostReports, (
+        'id', 'report_date', 'external_location__location_name', 'accounting_period__accounting_period_start',
+        'accounting_period__accounting_period_end', 'beginning_inventory', 'ending_inventory', 'purchases',
+        'total_revenue', 'total_inventory_wastage_value', 'theoretical_cogs', 'actual_cogs', 'current_cogs',
+        'cogs_variance', 'cogs_variance_percent', 'theoretical_gross_profit', 'actual_gross_profit', 'total_transfers',
+    ), 'report_date'),
+    'inventory-usage': ExportSpec(InventoryUsage, (
+        'id', 'report_date', 'external_location__location_name', 'inventory_item__item_name',
+        'accounting_period__accounting_period_start', 'accounting_period__accounting_period_end',
+        'opening_stock_quantity', 'opening_stock_value', 'closing_stock_quantity', 'closing_stock_value',
+        'purchases_quantity', 'purchases_value', 'wasted_quantity', 'wasted_value', 'theoretical_usage_quantity',
+        'theoretical_usage_value', 'actual_usage_quantity', 'actual_usage_value', 'current_usage_quantity',
+        'current_usage_value', 'usage_variance', 'usage_variance_percent',
+    ), 'report_date'),
+    'tip-records': ExportSpec(EmployeeTipRecords, (
+        'id', 'tip_date', 'external_location__location_name', 'internal_location__location_name',
+        'employee__first_name', 'employee__last_name', 'category', 'tip_amount', 'tip_type',
+    ), 'tip_date'),
+    'tip-pools': ExportSpec(TipPoolingRecords, (
+        'id', 'date', 'external_location__location_name', 'total_pool', 'participants', 'total_hours_worked', 'tip_per_hour',
+    ), 'date'),
+    'tip-payouts': ExportSpec(EmployeeTipPayouts, (
+        'id', 'date', 'external_location__location_name', 'employee__first_name', 'employee__last_name',
+        'tip_pool_record', 'payout_amount', 'tip_per_hour',
+    ), 'date'),
+}
+
+
+# Date filters are inclusive days. On datetime columns they become half-open local-midnight bounds rather than
+# __date lookups, so the (location, date) indexes still apply
+def export_queryset(name, external_locations=None, start=None, end=None):
+    spec = EXPORTS[name]
+    queryset = spec.model.objects.all()
+
+    if external_locations is not None:
+        queryset = queryset.filter(external_location__in=external_locations)
+
+    if isinstance(spec.model._meta.get_field(spec.date_field), models.DateTimeField):
+        if start is not None:
+            start = timezone.make_aware(datetime.combine(start, time.min))
+        if end is not None:
+            end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+
+        lookups = {f'{spec.date_field}__gte': start, f'{spec.date_field}__lt': end}
+    else:
+        lookups = {f'{spec.date_field}__gte': start, f'{spec.date_field}__lte': end}
+
+    queryset = queryset.filter(**{lookup: value for lookup, value in lookups.items() if value is not None})
+
+    return queryset.order_by(spec.date_field, 'pk').values_list(*spec.columns)
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+
+    return value
+
+
+# csv.writer wants a file; this one hands each formatted line straight back instead of keeping it
+class _Echo:
+    def write(self, value):
+        return value
+
+
+# Header then one line per row, read off a server-side cursor a chunk at a time so memory stays flat however long the export
+def csv_lines(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(queryset._fields)
+
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow([_cell(value) for value in row])
+
+
+# Gzip stream of the lines, flushed roughly every `flush_bytes` of input so the client keeps receiving data
+def gzip_chunks(lines, flush_bytes=64 * 1024):
+    compressor = zlib.compressobj(wbits=31)
+    pending = 0
+
+    for line in lines:
+        data = line.encode()
+        pending += len(data)
+        compressed = compressor.compress(data)
+
+        if pending >= flush_bytes:
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def export_filename(name, start=None, end=None, compress=False):
+    parts = [name] + [day.isoformat() for day in (start, end) if day is not None]
+    return '_'.join(parts) + ('.csv.gz' if compress else '.csv')
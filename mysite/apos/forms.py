@@ -182,6 +182,11 @@ class VendorsForm(forms.ModelForm):
       exclude = ['external_location']
 
 
+# Bulk import
+class CSVImportForm(forms.Form):
+   file = forms.FileField()
+
+
 # Inventory order management
 class OrdersForm(forms.ModelForm):
    class Meta:
@@ -0,0 +1,218 @@
+import csv
+import io
+from collections import namedtuple
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.forms import modelform_factory
+
+from .forms import EmployeesForm, InventoryItemsForm, VendorsForm
+from .models import CustomUser, Employees, InventoryItems, InventoryMovements, Vendors
+from .stock import record_movements
+
+
+CHUNK_SIZE = 500
+
+# Same groups create_user_for_employee puts a new employee's account in
+POSITION_GROUPS = {'Owner': 'Owner', 'Manager': 'Management', 'Chef': 'Chef'}
+
+# natural_key is the field a row is recognised by on a rerun; location_scoped says whether it only has to be unique
+# within the location rather than across the whole table
+ImportSpec = namedtuple('ImportSpec', ['form_class', 'natural_key', 'location_scoped', 'writer'])
+ImportResult = namedtuple('ImportResult', ['created', 'skipped', 'errors'])
+
+
+# Uniqueness is settled per chunk by natural key in one query, so the per-row unique checks ModelForm would run are skipped
+class _ImportFormMixin:
+    def validate_unique(self):
+        pass
+
+
+def _import_form(form_class, **kwargs):
+    return modelform_factory(form_class._meta.model, form=type(form_class.__name__, (_ImportFormMixin, form_class), {}), **kwargs)
+
+
+# Items go in empty and their opening stock is booked as one batch of adjustments, so the ledger and daily rollups
+# see it exactly as they would a hand-entered item
+def _write_inventory_items(rows, external_location):
+    items = []
+    openings = []
+
+    for _, item in rows:
+        openings.append((item.quantity, item.total_value))
+        item.external_location = external_location
+        item.quantity = 0
+        item.total_value = 0
+        items.append(item)
+
+    InventoryItems.objects.bulk_create(items)
+
+    record_movements([
+        InventoryMovements(
+            external_location=external_location,
+            inventory_item=item,
+            movement_type='Adjustment',
+            quantity=quantity,
+            value=value,
+        )
+        for item, (quantity, value) in zip(items, openings)
+    ])
+
+    return []
+
+
+def _write_vendors(rows, external_location):
+    vendors = [vendor for _, vendor in rows]
+
+    for vendor in vendors:
+        vendor.external_location = external_location
+
+    Vendors.objects.bulk_create(vendors)
+    return []
+
+
+# Does what Employees.save and create_user_for_employee do one employee at a time (username, hashed password, login
+# account, group) for the whole chunk; the account gets the employee's own hash, as create_user_for_employee gives it
+def _write_employees(rows, external_location):
+    errors = []
+    employees = []
+
+    for line, employee in rows:
+        employee.account_username = employee.get_account_username
+        employees.append((line, employee))
+
+    taken = set(CustomUser.objects.filter(
+        username__in=[employee.account_username for _, employee in employees]
+    ).values_list('username', flat=True))
+
+    phones_taken = {str(phone) for phone in CustomUser.objects.filter(
+        phone_number__in=[str(employee.phone) for _, employee in employees]
+    ).values_list('phone_number', flat=True)}
+
+    users = []
+    created = []
+
+    for line, employee in employees:
+        if employee.account_username in taken:
+            errors.append((line, f'A user with username {employee.account_username} already exists.'))
+            continue
+
+        if str(employee.phone) in phones_taken:
+            errors.append((line, f'A user with phone number {employee.phone} already exists.'))
+            continue
+
+        taken.add(employee.account_username)
+
+        employee.account_password = make_password(employee.get_account_password)
+        employee.region_location = external_location.region_location
+        employee.external_location = external_location
+
+        users.append(CustomUser(username=employee.account_username, password=employee.account_password, phone_number=employee.phone))
+        created.append(employee)
+
+    CustomUser.objects.bulk_create(users)
+
+    groups = {}
+    memberships = []
+
+    for user, employee in zip(users, created):
+        name = POSITION_GROUPS.get(employee.job_position, 'Employee')
+
+        if name not in groups:
+            groups[name], _ = Group.objects.get_or_create(name=name)
+
+        memberships.append(CustomUser.groups.through(customuser_id=user.pk, group_id=groups[name].pk))
+        employee.user = user
+
+    CustomUser.groups.through.objects.bulk_create(memberships)
+    Employees.objects.bulk_create(created)
+
+    return errors
+
+
+IMPORTS = {
+    'inventory-items': ImportSpec(_import_form(InventoryItemsForm), 'item_name', True, _write_inventory_items),
+    'vendors': ImportSpec(_import_form(VendorsForm), 'phone', False, _write_vendors),
+    'employees': ImportSpec(
+        _import_form(EmployeesForm, exclude=['region_location', 'external_location', 'user', 'unique_identifier', 'account_username', 'account_password']),
+        'phone', False, _write_employees
+    ),
+}
+
+
+# Reads an uploaded or opened file a line at a time; a spreadsheet's byte order mark is dropped from the first header
+def read_csv(file):
+    if isinstance(file, io.TextIOBase):
+        return csv.DictReader(file)
+
+    # Django's uploaded files wrap the real file object, which is what TextIOWrapper needs
+    return csv.DictReader(io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8-sig', newline=''))
+
+
+def _form_errors(form):
+    return '; '.join(
+        f'{field}: {" ".join(messages)}' if field != '__all__' else ' '.join(messages)
+        for field, messages in form.errors.items()
+    )
+
+
+# Validates each row with the model's form and writes every chunk in its own transaction. Rows whose natural key is
+# already in the database (or earlier in the file) are skipped, so the same file can be run again safely
+def import_rows(name, rows, external_location, chunk_size=CHUNK_SIZE):
+    spec = IMPORTS[name]
+    model = spec.form_class._meta.model
+    created = skipped = 0
+    errors = []
+    seen = set()
+
+    # Line 1 is the header
+    numbered = enumerate(rows, 2)
+
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+
+        if not chunk:
+            break
+
+        valid = []
+
+        for line, row in chunk:
+            form = spec.form_class(data=row)
+
+            if form.is_valid():
+                valid.append((line, form.instance))
+            else:
+                errors.append((line, _form_errors(form)))
+
+        keys = [str(getattr(instance, spec.natural_key)) for _, instance in valid]
+        existing = model.objects.filter(**{f'{spec.natural_key}__in': keys})
+
+        if spec.location_scoped:
+            existing = existing.filter(external_location=external_location)
+
+        seen.update(str(key) for key in existing.values_list(spec.natural_key, flat=True))
+
+        new = []
+
+        for line, instance in valid:
+            key = str(getattr(instance, spec.natural_key))
+
+            if key in seen:
+                skipped += 1
+                continue
+
+            seen.add(key)
+            new.append((line, instance))
+
+        if not new:
+            continue
+
+        with transaction.atomic():
+            failed = spec.writer(new, external_location)
+
+        created += len(new) - len(failed)
+        errors += failed
+
+    return ImportResult(created, skipped, sorted(errors))
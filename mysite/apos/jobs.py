@@ -0,0 +1,183 @@
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import InventoryCostReports, ReportJobs, ReportSchedules
+from .reports import generate_inventory_usage_reports, generate_menu_engineering_reports, generate_waste_analysis
+
+
+JOB_SETTINGS = {
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_SECONDS': 30,
+    'MAX_BACKOFF_SECONDS': 3600,
+    'STALE_AFTER_SECONDS': 1800,
+    **getattr(settings, 'APOS_REPORT_JOBS', {}),
+}
+
+ACTIVE_STATUSES = ('Queued', 'Running')
+
+
+# Raised by a handler for a job that can't succeed however often it's retried; the job fails straight away
+class PermanentJobError(Exception):
+    pass
+
+
+def _menu_engineering_report(job, progress):
+    return {'reports': len(generate_menu_engineering_reports(job.external_location, progress=progress))}
+
+
+def _waste_analysis(job, progress):
+    return {'reports': len(generate_waste_analysis(job.external_location, progress=progress))}
+
+
+def _inventory_usage(job, progress):
+    return {'reports': len(generate_inventory_usage_reports(job.external_location, progress=progress))}
+
+
+def _inventory_cost_report(job, progress):
+    report = InventoryCostReports(external_location=job.external_location)
+
+    if report.get_accounting_period is None:
+        raise PermanentJobError(f'No accounting period covers {report.get_report_date}; add one and run the report again.')
+
+    progress(10)
+    report.save()
+
+    return {'report': report.pk}
+
+
+# Each handler gets the job and a progress(percent) callback, and returns a small JSON-able result; one that raises
+# PermanentJobError fails at once instead of being retried
+JOB_HANDLERS = {
+    'Menu engineering report': _menu_engineering_report,
+    'Waste analysis': _waste_analysis,
+    'Inventory usage': _inventory_usage,
+    'Inventory cost report': _inventory_cost_report,
+}
+
+
+# Queues a report for the location, or hands back the one already queued or running so a double click doesn't run it twice
+def enqueue(job_type, external_location, requested_by=None):
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'{job_type} is not a report job type')
+
+    with transaction.atomic():
+        job = ReportJobs.objects.filter(
+            external_location=external_location, job_type=job_type, status__in=ACTIVE_STATUSES
+        ).first()
+
+        if job is None:
+            job = ReportJobs.objects.create(
+                external_location=external_location,
+                job_type=job_type,
+                requested_by=requested_by,
+                max_attempts=JOB_SETTINGS['MAX_ATTEMPTS'],
+            )
+
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# Takes due jobs one at a time with a conditional UPDATE; whichever worker flips a job from Queued wins it, so several
+# workers can share the table without row locks (which SQLite doesn't have)
+def claim_jobs(limit, worker=None):
+    now = timezone.now()
+    claimed = []
+
+    due = ReportJobs.objects.filter(status='Queued', run_after__lte=now).order_by('run_after', 'pk').values_list('pk', flat=True)
+
+    for pk in due[:limit]:
+        if ReportJobs.objects.filter(pk=pk, status='Queued').update(
+            status='Running', worker=worker or worker_name(), started_date=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+
+    return claimed
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(JOB_SETTINGS['BACKOFF_SECONDS'] * 2 ** (attempts - 1), JOB_SETTINGS['MAX_BACKOFF_SECONDS']))
+
+
+def run_job(pk):
+    job = ReportJobs.objects.select_related('external_location').get(pk=pk)
+
+    reported = [job.progress]
+
+    # Handlers call this per item; only a change in the whole percent costs an UPDATE
+    def progress(percent):
+        percent = int(max(0, min(percent, 100)))
+
+        if percent != reported[0]:
+            reported[0] = percent
+            ReportJobs.objects.filter(pk=pk).update(progress=percent)
+
+    try:
+        result = JOB_HANDLERS[job.job_type](job, progress)
+    except PermanentJobError as error:
+        ReportJobs.objects.filter(pk=pk).update(status='Failed', error=str(error), finished_date=timezone.now())
+
+        return False
+    except Exception:
+        error = traceback.format_exc()
+
+        if job.attempts < job.max_attempts:
+            ReportJobs.objects.filter(pk=pk).update(
+                status='Queued', run_after=timezone.now() + backoff(job.attempts), error=error, worker=''
+            )
+        else:
+            ReportJobs.objects.filter(pk=pk).update(status='Failed', error=error, finished_date=timezone.now())
+
+        return False
+
+    ReportJobs.objects.filter(pk=pk).update(
+        status='Succeeded', progress=100, result=result or {}, error='', finished_date=timezone.now()
+    )
+
+    return True
+
+
+# Jobs whose worker died mid-run stay Running forever otherwise; hand them back to the queue (or fail them out)
+def requeue_stale_jobs():
+    stale = ReportJobs.objects.filter(
+        status='Running', started_date__lt=timezone.now() - timedelta(seconds=JOB_SETTINGS['STALE_AFTER_SECONDS'])
+    )
+
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='Failed', error='Worker stopped responding', finished_date=timezone.now()
+    )
+    requeued = stale.update(status='Queued', run_after=timezone.now(), worker='')
+
+    return requeued, failed
+
+
+# Queues a job for every enabled schedule that has come due and moves it on to its next run. The conditional UPDATE on
+# next_run means two schedulers running side by side can't both queue the same run
+def enqueue_due_schedules(now=None):
+    now = now or timezone.now()
+    jobs = []
+
+    for schedule in ReportSchedules.objects.filter(enabled=True, next_run__lte=now).select_related('external_location'):
+        try:
+            next_run = schedule.get_schedule.next_after(now)
+        except (ValueError, KeyError):
+            ReportSchedules.objects.filter(pk=schedule.pk).update(enabled=False)
+            continue
+
+        if not ReportSchedules.objects.filter(pk=schedule.pk, next_run=schedule.next_run).update(next_run=next_run, last_run=now):
+            continue
+
+        job = enqueue(schedule.job_type, schedule.external_location)
+        ReportSchedules.objects.filter(pk=schedule.pk).update(last_job=job)
+        jobs.append(job)
+
+    return jobs
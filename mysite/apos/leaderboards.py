@@ -0,0 +1,174 @@
+import heapq
+import threading
+import time
+from collections import defaultdict, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .cache import TieredCache, build_cache
+from .counters import COUNTER_FIELDS, COUNTER_SETTINGS
+from .models import EmployeesPerformance
+from .performance import derived_performance
+
+
+LEADERBOARD_SIZE = 10
+
+METRICS = tuple(COUNTER_FIELDS)
+
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['employee_id', 'employee_name', 'value'])
+Leaderboard = namedtuple('Leaderboard', ['most', 'least'])
+
+
+# Keyed by external location id; each entry holds {metric: (computed_at, Leaderboard)} so a counter change only
+# recomputes the metrics it touched
+class LeaderboardCache(TieredCache):
+    key_prefix = 'apos:leaderboards:'
+    generation_key = 'apos:leaderboards-generation'
+
+
+leaderboard_cache = build_cache(LeaderboardCache, 'APOS_LEADERBOARD_CACHE')
+
+# When each metric last changed in this process; wall-clock so entries shared between workers compare meaningfully
+_changed_at = {}
+_changed_lock = threading.Lock()
+
+
+# Called once a counter write commits; boards for these metrics computed before now are rebuilt on their next read
+def counters_changed(names):
+    now = time.time()
+
+    with _changed_lock:
+        for name in names:
+            _changed_at[name] = now
+
+
+def _is_stale(entry, metric):
+    return entry is None or metric not in entry or entry[metric][0] < _changed_at.get(metric, 0)
+
+
+def _employee_name(first_name, last_name):
+    return f'{first_name} {last_name}'
+
+
+# Ties go to the lower employee id on both boards, the same order the window functions use
+def _window_boards(location_ids, metrics, size):
+    ranks = {}
+
+    for index, metric in enumerate(metrics):
+        ranks[f'most_{index}'] = Window(RowNumber(), partition_by=F('external_location'), order_by=[F(metric).desc(), F('employee').asc()])
+        ranks[f'least_{index}'] = Window(RowNumber(), partition_by=F('external_location'), order_by=[F(metric).asc(), F('employee').asc()])
+
+    rows = EmployeesPerformance.objects.filter(external_location__in=location_ids).annotate(**ranks).filter(
+        reduce(or_, (Q(**{f'{rank}__lte': size}) for rank in ranks))
+    ).values('external_location', 'employee', 'employee__first_name', 'employee__last_name', *metrics, *ranks)
+
+    ranked = defaultdict(lambda: defaultdict(lambda: ([], [])))
+
+    for row in rows:
+        name = _employee_name(row['employee__first_name'], row['employee__last_name'])
+
+        for index, metric in enumerate(metrics):
+            entry = LeaderboardEntry(row['employee'], name, row[metric])
+            most, least = ranked[row['external_location']][metric]
+
+            if row[f'most_{index}'] <= size:
+                most.append((row[f'most_{index}'], entry))
+
+            if row[f'least_{index}'] <= size:
+                least.append((row[f'least_{index}'], entry))
+
+    return {
+        location: {
+            metric: Leaderboard([entry for _, entry in sorted(most)], [entry for _, entry in sorted(least)])
+            for metric, (most, least) in boards.items()
+        }
+        for location, boards in ranked.items()
+    }
+
+
+# One streamed pass keeping a bounded heap per location, metric and direction; for databases without window functions
+# and for derived counters, which only exist in Python
+def _heap_boards(rows, metrics, size):
+    heaps = defaultdict(lambda: defaultdict(lambda: ([], [])))
+
+    for location, employee, name, counters in rows:
+        for metric in metrics:
+            value = counters[metric]
+            entry = LeaderboardEntry(employee, name, value)
+            most, least = heaps[location][metric]
+
+            for heap, item in ((most, (value, -employee, entry)), (least, (-value, -employee, entry))):
+                if len(heap) < size:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+
+    return {
+        location: {
+            metric: Leaderboard(
+                [item[2] for item in sorted(most, key=lambda item: item[:2], reverse=True)],
+                [item[2] for item in sorted(least, key=lambda item: item[:2], reverse=True)],
+            )
+            for metric, (most, least) in boards.items()
+        }
+        for location, boards in heaps.items()
+    }
+
+
+def _stored_rows(location_ids, metrics):
+    rows = EmployeesPerformance.objects.filter(external_location__in=location_ids).values_list(
+        'external_location', 'employee', 'employee__first_name', 'employee__last_name', *metrics
+    ).order_by()
+
+    for location, employee, first_name, last_name, *values in rows.iterator(chunk_size=2000):
+        yield location, employee, _employee_name(first_name, last_name), dict(zip(metrics, values))
+
+
+def _derived_rows(location_ids):
+    rows = list(EmployeesPerformance.objects.filter(external_location__in=location_ids).values_list(
+        'external_location', 'employee', 'employee__first_name', 'employee__last_name'
+    ).order_by())
+    performance = derived_performance(employee for _, employee, _, _ in rows)
+
+    for location, employee, first_name, last_name in rows:
+        yield location, employee, _employee_name(first_name, last_name), performance[employee]
+
+
+def build_leaderboards(location_ids, metrics=METRICS, size=LEADERBOARD_SIZE):
+    location_ids = list(location_ids)
+
+    if COUNTER_SETTINGS['SOURCE'] == 'derived':
+        return _heap_boards(_derived_rows(location_ids), metrics, size)
+
+    if connection.features.supports_over_clause:
+        return _window_boards(location_ids, metrics, size)
+
+    return _heap_boards(_stored_rows(location_ids, metrics), metrics, size)
+
+
+# The most and least top LEADERBOARD_SIZE employees on every performance counter, as {location id: {metric:
+# Leaderboard}}. Cached per location; the metrics that changed since a location's boards were built are recomputed
+# for every location that needs them in one query, and the rest are served as they are
+def leaderboards(location_ids):
+    location_ids = list(location_ids)
+    cached = {location: leaderboard_cache.get(location) or {} for location in location_ids}
+    stale = {metric for location in location_ids for metric in METRICS if _is_stale(cached[location], metric)}
+
+    if stale:
+        computed_at = time.time()
+        metrics = [metric for metric in METRICS if metric in stale]
+        stale_locations = [location for location in location_ids if any(_is_stale(cached[location], metric) for metric in metrics)]
+        built = build_leaderboards(stale_locations, metrics)
+
+        for location in stale_locations:
+            boards = dict(cached[location])
+            boards.update((metric, (computed_at, built.get(location, {}).get(metric, Leaderboard([], [])))) for metric in metrics)
+
+            leaderboard_cache.set(location, boards)
+            cached[location] = boards
+
+    return {location: {metric: cached[location][metric][1] for metric in METRICS} for location in location_ids}
@@ -0,0 +1,143 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import ExternalLocations, InventoryItems, InventoryMovements, InventorySnapshots
+
+
+ZERO = Decimal('0')
+
+Balance = namedtuple('Balance', ['quantity', 'value'])
+MovementTotals = namedtuple('MovementTotals', ['quantity', 'value', 'count'])
+
+NO_BALANCE = Balance(ZERO, ZERO)
+NO_MOVEMENTS = MovementTotals(ZERO, ZERO, 0)
+
+
+# Each item's balance at the close of on_date: its latest snapshot on or before that day plus what moved after it, or,
+# for an item never snapshotted, today's materialized balance less everything that has moved since
+def balances_at(external_location, on_date, inventory_item_ids=None):
+    items = InventoryItems.objects.filter(external_location=external_location)
+
+    if inventory_item_ids is not None:
+        items = items.filter(pk__in=inventory_item_ids)
+
+    current = {pk: Balance(quantity, value) for pk, quantity, value in items.values_list('pk', 'quantity', 'total_value')}
+
+    if not current:
+        return {}
+
+    snapshots = {}
+
+    rows = InventorySnapshots.objects.filter(inventory_item__in=list(current), snapshot_date__lte=on_date).order_by(
+        'inventory_item', '-snapshot_date'
+    ).values_list('inventory_item', 'snapshot_date', 'quantity', 'total_value')
+
+    for inventory_item, snapshot_date, quantity, value in rows:
+        snapshots.setdefault(inventory_item, (snapshot_date, Balance(quantity, value)))
+
+    # Items snapshotted on the same day share a ledger range; everything goes out in one grouped query
+    snapshotted_on = defaultdict(list)
+
+    for inventory_item, (snapshot_date, _) in snapshots.items():
+        snapshotted_on[snapshot_date].append(inventory_item)
+
+    ranges = [
+        Q(inventory_item__in=inventory_items, movement_date__gt=snapshot_date, movement_date__lte=on_date)
+        for snapshot_date, inventory_items in snapshotted_on.items()
+    ]
+
+    never_snapshotted = [inventory_item for inventory_item in current if inventory_item not in snapshots]
+
+    if never_snapshotted:
+        ranges.append(Q(inventory_item__in=never_snapshotted, movement_date__gt=on_date))
+
+    condition = ranges.pop()
+
+    for other in ranges:
+        condition |= other
+
+    moved = {
+        row['inventory_item']: Balance(row['quantity'], row['value'])
+        for row in InventoryMovements.objects.filter(condition).values('inventory_item').annotate(
+            quantity=Sum('quantity'), value=Sum('value')
+        ).order_by()
+    }
+
+    balances = {}
+
+    for inventory_item, balance in current.items():
+        quantity, value = moved.get(inventory_item, NO_BALANCE)
+
+        if inventory_item in snapshots:
+            opening = snapshots[inventory_item][1]
+            balances[inventory_item] = Balance(opening.quantity + quantity, opening.value + value)
+        else:
+            balances[inventory_item] = Balance(balance.quantity - quantity, balance.value - value)
+
+    return balances
+
+
+def location_balance_at(external_location, on_date):
+    balances = balances_at(external_location, on_date).values()
+    return Balance(sum((b.quantity for b in balances), ZERO), sum((b.value for b in balances), ZERO))
+
+
+# Quantity, value and number of movements of each type between start and end inclusive; types with none read as zero
+def period_movements(external_location, start, end, inventory_item_id=None):
+    movements = InventoryMovements.objects.filter(external_location=external_location, movement_date__range=(start, end))
+
+    if inventory_item_id is not None:
+        movements = movements.filter(inventory_item=inventory_item_id)
+
+    rows = movements.values('movement_type').annotate(quantity=Sum('quantity'), value=Sum('value'), count=Count('pk')).order_by()
+
+    totals = defaultdict(lambda: NO_MOVEMENTS)
+
+    for row in rows:
+        totals[row['movement_type']] = MovementTotals(row['quantity'], row['value'], row['count'])
+
+    return totals
+
+
+# period_movements for every item at the location, from one query grouped by item and type
+def period_movements_by_item(external_location, start, end):
+    rows = InventoryMovements.objects.filter(external_location=external_location, movement_date__range=(start, end)).values(
+        'inventory_item', 'movement_type'
+    ).annotate(quantity=Sum('quantity'), value=Sum('value'), count=Count('pk')).order_by()
+
+    totals = defaultdict(lambda: defaultdict(lambda: NO_MOVEMENTS))
+
+    for row in rows:
+        totals[row['inventory_item']][row['movement_type']] = MovementTotals(row['quantity'], row['value'], row['count'])
+
+    return totals
+
+
+# Closes the period: every item in the period's region gets its balance on the last day recorded. Re-running replaces
+# the period's snapshots, so movements recorded late can be folded in
+def snapshot_accounting_period(accounting_period):
+    locations = ExternalLocations.objects.all()
+
+    if accounting_period.region_location_id:
+        locations = locations.filter(region_location=accounting_period.region_location_id)
+
+    with transaction.atomic():
+        InventorySnapshots.objects.filter(accounting_period=accounting_period).delete()
+
+        snapshots = []
+
+        for external_location in locations:
+            for inventory_item, balance in balances_at(external_location, accounting_period.accounting_period_end).items():
+                snapshots.append(InventorySnapshots(
+                    external_location=external_location,
+                    inventory_item_id=inventory_item,
+                    accounting_period=accounting_period,
+                    quantity=balance.quantity,
+                    total_value=balance.value,
+                    snapshot_date=accounting_period.accounting_period_end,
+                ))
+
+        return InventorySnapshots.objects.bulk_create(snapshots)
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apos.models import PaymentLines, Payments
+from apos.payment_lines import build_payment_lines
+
+
+class Command(BaseCommand):
+    help = 'Writes PaymentLines for payments saved before line items existed, streaming the JSON in primary key order'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--location', type=int, help='Only backfill payments at this external location id')
+        parser.add_argument('--rebuild', action='store_true', help='Rewrite the lines of payments that already have them')
+
+    def handle(self, *args, **options):
+        payments = Payments.objects.only(
+            'pk', 'external_location', 'ordered_menu_items_and_quantities', 'payment_datetime'
+        ).order_by('pk')
+
+        if options['location'] is not None:
+            payments = payments.filter(external_location=options['location'])
+
+        if not options['rebuild']:
+            payments = payments.filter(lines__isnull=True)
+
+        last_pk = 0
+        backfilled = lines_written = 0
+
+        # Seek on pk rather than offsetting, so every chunk is an index range scan however far in we are
+        while True:
+            chunk = list(payments.filter(pk__gt=last_pk)[:options['chunk_size']])
+
+            if not chunk:
+                break
+
+            lines = build_payment_lines(chunk)
+
+            with transaction.atomic():
+                if options['rebuild']:
+                    PaymentLines.objects.filter(payment__in=chunk).delete()
+
+                PaymentLines.objects.bulk_create(lines)
+
+            last_pk = chunk[-1].pk
+            backfilled += len(chunk)
+            lines_written += len(lines)
+
+            self.stdout.write(f'{backfilled:,} payments, {lines_written:,} lines', ending='\r')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {backfilled:,} payments with {lines_written:,} lines'))
@@ -0,0 +1,243 @@
+import random
+import time
+from datetime import date, time as clock_time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from apos.cache import EmployeeScope
+from apos.middleware import EmployeeContext
+from apos.models import DailyShiftRecords, Employees, ExternalLocations, InternalLocations, Payments, RegionLocations, ShiftScheduling
+from apos.scopes import scope_queryset
+
+
+# The columns the old mixins OR'd together; the limited permission mixins AND'ed their list onto the location one
+LEGACY_LOCATION_FIELDS = [
+    'unique_identifier', 'region_location', 'external_location', 'source_external_location', 'destination_external_location',
+]
+
+LEGACY_EMPLOYEE_FIELDS = [
+    'employee', 'employee_requestor', 'employee_responder', 'employee_swapped', 'employee_assignee', 'employee_assignor',
+    'employee_tasker', 'employee_commenter', 'employee_culprit', 'employee_reporter',
+    'region_location', 'external_location', 'source_external_location', 'destination_external_location',
+]
+
+# model, list ordering, and whether its list view applies the limited permission filter for an 'Employee' viewer
+BENCHMARK_MODELS = {
+    'DailyShiftRecords': (DailyShiftRecords, '-shift_date', True),
+    'Payments': (Payments, '-payment_datetime', False),
+}
+
+
+class Command(BaseCommand):
+    help = 'Seeds synthetic DailyShiftRecords and Payments rows inside a rolled-back transaction and times the list page query before and after the scope predicates and indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Rows to insert per model')
+        parser.add_argument('--locations', type=int, default=50)
+        parser.add_argument('--employees-per-location', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query; the best run is reported')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(f'{connection.vendor} cannot roll back index changes; run this benchmark against SQLite or PostgreSQL')
+
+        if options['rows'] < 1 or options['locations'] < 1 or options['employees_per_location'] < 1:
+            raise CommandError('--rows, --locations and --employees-per-location must be positive')
+
+        # Nothing written here survives; the seeded rows and the dropped indexes are rolled back together
+        with transaction.atomic():
+            viewer = self.seed(options)
+
+            for name, (model, ordering, limited) in BENCHMARK_MODELS.items():
+                self.benchmark(name, model, ordering, limited, viewer, options)
+
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        region = RegionLocations.objects.create(
+            unique_identifier='BENCH', state_or_province_name='Benchmark', country_name='Benchmark', overtime_threshold=40
+        )
+
+        external_locations = ExternalLocations.objects.bulk_create([
+            ExternalLocations(region_location=region, location_name=f'Benchmark {i}', address='-', contact_person='-')
+            for i in range(options['locations'])
+        ])
+
+        internal_locations = InternalLocations.objects.bulk_create([
+            InternalLocations(external_location=location, location_name='Table 1') for location in external_locations
+        ])
+
+        employees = Employees.objects.bulk_create([
+            Employees(
+                region_location=region,
+                external_location=location,
+                unique_identifier='',
+                first_name='Bench',
+                last_name=str(i),
+                email=f'bench{location.pk}-{i}@example.com',
+                phone=f'+1555{location.pk:03d}{i:04d}',
+                hire_date=date.today(),
+                job_position='Cook',
+                account_password='-',
+                hourly_wage=Decimal('20.00'),
+                availability={},
+            )
+            for location in external_locations
+            for i in range(options['employees_per_location'])
+        ])
+
+        shift_schedules = ShiftScheduling.objects.bulk_create([
+            ShiftScheduling(
+                external_location=location,
+                job_position='Cook',
+                shift_type='Full',
+                start_time=clock_time(9),
+                end_time=clock_time(17),
+                total_hours=Decimal('8.0'),
+                shift_date=date.today(),
+            )
+            for location in external_locations
+        ])
+
+        schedules_by_location = {schedule.external_location_id: schedule for schedule in shift_schedules}
+        internal_by_location = {internal.external_location_id: internal for internal in internal_locations}
+        rng = random.Random(0)
+        today = date.today()
+        now = timezone.now()
+
+        self.stdout.write(f'Seeding {options["rows"]:,} rows per model across {len(external_locations)} locations...')
+
+        def daily_shift_records():
+            for i in range(options['rows']):
+                employee = employees[rng.randrange(len(employees))]
+
+                yield DailyShiftRecords(
+                    external_location_id=employee.external_location_id,
+                    employee=employee,
+                    shift_scheduling=schedules_by_location[employee.external_location_id],
+                    shift_type='Full',
+                    shift_date=today - timedelta(days=i % 365),
+                    total_hours_worked=Decimal('8.0'),
+                    earnings=Decimal('160.00'),
+                    status='Completed',
+                )
+
+        def payments():
+            for _ in range(options['rows']):
+                employee = employees[rng.randrange(len(employees))]
+
+                yield Payments(
+                    external_location_id=employee.external_location_id,
+                    internal_location=internal_by_location[employee.external_location_id],
+                    ordered_menu_items_and_quantities={},
+                    name_ordered_menu_items_and_quantities={},
+                    total_bill=Decimal('42.00'),
+                    employee=employee,
+                    category='Dine-in',
+                    payment_type='Cash',
+                )
+
+        self.bulk_insert(DailyShiftRecords, daily_shift_records(), options['batch_size'])
+        self.bulk_insert(Payments, payments(), options['batch_size'])
+
+        # auto_now_add stamps every payment with the same instant; spread them over a year so the ordering index has work to do
+        seeded_payments = Payments.objects.filter(external_location__in=external_locations)
+        bounds = seeded_payments.aggregate(first=Min('pk'), last=Max('pk'))
+        chunk = (bounds['last'] - bounds['first']) // 365 + 1
+
+        for day in range(365):
+            first_pk = bounds['first'] + day * chunk
+            seeded_payments.filter(pk__range=(first_pk, first_pk + chunk - 1)).update(payment_datetime=now - timedelta(days=day))
+
+        return employees[0]
+
+    def bulk_insert(self, model, rows, batch_size):
+        batch = []
+
+        for row in rows:
+            batch.append(row)
+
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def benchmark(self, name, model, ordering, limited, viewer, options):
+        scope = EmployeeScope(
+            employee_id=viewer.pk,
+            region_location_id=viewer.region_location_id,
+            external_location_id=viewer.external_location_id,
+            unique_identifier=viewer.unique_identifier,
+            group_names=frozenset(['Employee']),
+        )
+        context = EmployeeContext(scope, viewer)
+
+        before = model.objects.filter(self.legacy_predicate(model, viewer, LEGACY_LOCATION_FIELDS))
+        after = scope_queryset(model.objects.all(), context)
+
+        if limited:
+            before = before.filter(self.legacy_predicate(model, viewer, LEGACY_EMPLOYEE_FIELDS))
+            after = scope_queryset(after, context, identifier=False, employee=True)
+
+        # Raw statements rather than a schema editor context, which SQLite refuses to open inside a transaction
+        schema_editor = connection.schema_editor()
+
+        with connection.cursor() as cursor:
+            for index in model._meta.indexes:
+                cursor.execute(str(index.remove_sql(model, schema_editor)))
+
+            before_seconds = self.time_list_page(before, ordering, options)
+
+            for index in model._meta.indexes:
+                cursor.execute(str(index.create_sql(model, schema_editor)))
+
+        after_seconds = self.time_list_page(after, ordering, options)
+
+        self.stdout.write(
+            f'{name}: {after.count():,} of {model.objects.count():,} rows visible; '
+            f'before {before_seconds * 1000:.1f} ms, after {after_seconds * 1000:.1f} ms '
+            f'({before_seconds / after_seconds:.1f}x)'
+        )
+
+    def legacy_predicate(self, model, viewer, fields):
+        values = {
+            'unique_identifier': viewer.unique_identifier,
+            'region_location': viewer.region_location_id,
+            'external_location': viewer.external_location_id,
+            'source_external_location': viewer.external_location_id,
+            'destination_external_location': viewer.external_location_id,
+        }
+        clauses = []
+
+        # The old OR raised FieldError on columns a model lacks, so "before" only keeps the ones that exist
+        for field in fields:
+            try:
+                model._meta.get_field(field)
+            except FieldDoesNotExist:
+                continue
+
+            clauses.append(Q(**{field: values.get(field, viewer.pk)}))
+
+        return reduce(or_, clauses)
+
+    def time_list_page(self, queryset, ordering, options):
+        timings = []
+
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset.order_by(ordering, '-pk')[:options['page_size']])
+            timings.append(time.perf_counter() - started)
+
+        return min(timings)
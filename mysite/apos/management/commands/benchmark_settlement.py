@@ -0,0 +1,148 @@
+import time
+from datetime import date, time as clock_time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apos.models import (
+    AddOns, DailyShiftRecords, Employees, ExternalLocations, InternalLocations, InventoryItems, MenuItemOrders, MenuItems,
+    Payments, Recipes, RegionLocations, ShiftScheduling
+)
+from apos.settlement import completed_orders, settle_orders
+
+
+class Command(BaseCommand):
+    help = 'Seeds one table of completed orders inside a rolled-back transaction and times settling it the old way and through the settlement service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--covers', type=int, default=12, help='Plates on the table, each a different menu item')
+        parser.add_argument('--add-ons', type=int, default=2, help='Add-ons on every plate')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per path; the best run is reported')
+
+    def handle(self, *args, **options):
+        if options['covers'] < 1 or options['add_ons'] < 0:
+            raise CommandError('--covers must be positive and --add-ons not negative')
+
+        # Nothing written here survives
+        with transaction.atomic():
+            table, employee = self.seed(options)
+
+            before = self.measure(lambda: self.legacy_settle(table), options['repeat'])
+            after = self.measure(lambda: settle_orders(completed_orders(table), 15, 0), options['repeat'])
+            saved = self.measure(lambda: self.save_payment(table, employee), 1)
+
+            transaction.set_rollback(True)
+
+        covers = options['covers']
+        self.stdout.write(f'{covers}-cover table, {options["add_ons"]} add-ons per plate')
+        self.stdout.write(f'  before: {before[0]} queries, {before[1] * 1000:.2f} ms to build the bill, names and total')
+        self.stdout.write(f'  after:  {after[0]} queries, {after[1] * 1000:.2f} ms ({before[1] / after[1]:.1f}x)')
+        self.stdout.write(f'  Payments.save end to end: {saved[0]} queries, {saved[1] * 1000:.2f} ms')
+
+    def seed(self, options):
+        region = RegionLocations.objects.create(
+            unique_identifier='BENCH', state_or_province_name='Benchmark', country_name='Benchmark', overtime_threshold=40
+        )
+        location = ExternalLocations.objects.create(region_location=region, location_name='Benchmark', address='-', contact_person='-')
+        table = InternalLocations.objects.create(external_location=location, location_name='Table 1')
+
+        employee = Employees.objects.bulk_create([Employees(
+            region_location=region, external_location=location, unique_identifier='', first_name='Bench', last_name='Server',
+            email='bench@example.com', phone='+15550000001', hire_date=date.today(), job_position='Waiter',
+            account_password='-', hourly_wage=Decimal('20.00'), availability={},
+        )])[0]
+
+        # Seeded with bulk_create throughout, which skips the save() side effects that aren't being measured
+        schedule = ShiftScheduling.objects.bulk_create([ShiftScheduling(
+            external_location=location, job_position='Waiter', shift_type='Full', start_time=clock_time(9),
+            end_time=clock_time(17), total_hours=Decimal('8.0'), shift_date=timezone.localdate(),
+        )])[0]
+        DailyShiftRecords.objects.bulk_create([DailyShiftRecords(
+            external_location=location, employee=employee, shift_scheduling=schedule, shift_type='Full',
+            shift_date=timezone.localdate(), punch_in_time=clock_time(9), total_hours_worked=Decimal('0'),
+            earnings=Decimal('0'), status='In-progress',
+        )])
+
+        recipe = Recipes.objects.bulk_create([Recipes(
+            region_location=region, recipe_name='Benchmark', image='-', description='-', preparation_time=1,
+            cooking_temperature=1, cooking_time=1, dishing_up_time=1, total_recipe_time=3, quality_standards='-', serving_size=1,
+        )])[0]
+        inventory_item = InventoryItems.objects.bulk_create([InventoryItems(
+            external_location=location, item_name='Benchmark', item_type=InventoryItems.ITEM_TYPE_CHOICES[0][0], quantity=0,
+            total_value=0, unit_of_measurement=InventoryItems.UNIT_OF_MEASUREMENT_CHOICES[0][0], barcode='-',
+            safety_stock=0, deliveries_per_week=1,
+        )])[0]
+
+        menu_items = MenuItems.objects.bulk_create([
+            MenuItems(
+                external_location=location, recipe=recipe, item_name=f'Plate {i}', image='-', price=Decimal('18.50'),
+                course=MenuItems.COURSE_CHOICES[0][0], is_available=True, gross_profit=0,
+            )
+            for i in range(options['covers'])
+        ])
+        add_ons = AddOns.objects.bulk_create([
+            AddOns(
+                external_location=location, inventory_item=inventory_item, add_on_name=f'Extra {i}', additional_quantity=0,
+                additional_price=Decimal('1.25'), is_available=True, additional_ingredient_costs=Decimal('0.40'),
+            )
+            for i in range(options['add_ons'])
+        ])
+
+        orders = MenuItemOrders.objects.bulk_create([
+            MenuItemOrders(
+                external_location=location, menu_item=menu_item, internal_location=table, order_status='Completed',
+                unit_price=menu_item.price + Decimal('1.25') * len(add_ons), unit_cost=Decimal('6.00'),
+            )
+            for menu_item in menu_items
+        ])
+        MenuItemOrders.add_ons.through.objects.bulk_create([
+            MenuItemOrders.add_ons.through(menuitemorders_id=order.pk, addons_id=add_on.pk) for order in orders for add_on in add_ons
+        ])
+
+        return table, employee
+
+    # What Payments.save used to do before the settlement service: the order map built with an add-on query per
+    # order, then rebuilt for the receipt names and again for the bill, fetching every menu item and add-on by pk
+    def legacy_settle(self, table):
+        def order_map():
+            ordered = {}
+
+            for order in MenuItemOrders.objects.filter(internal_location=table, order_status='Completed'):
+                ordered[order.menu_item_id] = {'quantity': order.quantity, 'add-ons': [add_on.pk for add_on in order.add_ons.all()]}
+
+            return ordered
+
+        ordered = order_map()
+
+        names = {}
+        for menu_item, info in order_map().items():
+            names[MenuItems.objects.get(pk=menu_item).item_name] = {
+                'quantity': info['quantity'],
+                'add-ons': [AddOns.objects.get(pk=add_on).add_on_name for add_on in info['add-ons']],
+            }
+
+        total_bill = 0
+        for menu_item, info in order_map().items():
+            total_bill += MenuItems.objects.get(pk=menu_item).price * info['quantity']
+
+            for add_on in info['add-ons']:
+                total_bill += AddOns.objects.get(pk=add_on).additional_price * info['quantity']
+
+        return ordered, names, total_bill * Decimal('1.15')
+
+    def save_payment(self, table, employee):
+        Payments(internal_location=table, employee=employee, tip_amount_percent=15, category='Dine-in', payment_type='Cash').save()
+
+    def measure(self, run, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+
+        return len(queries), min(timings)
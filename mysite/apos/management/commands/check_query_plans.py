@@ -0,0 +1,136 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apos.models import (
+    AccountingPeriods, DailyShiftRecords, EmployeeTipRecords, InventoryCostReports, InventoryUsage,
+    InventoryWasteBin, MenuItemOrders, Orders, Payments, WeeklyShiftRecords,
+)
+
+
+TODAY = date.today()
+PERIOD = (TODAY.replace(day=1), TODAY)
+NOW = timezone.make_aware(datetime.combine(TODAY, time()))
+PERIOD_DATETIMES = (timezone.make_aware(datetime.combine(PERIOD[0], time())), NOW)
+
+
+# The lookups the models and views run on every save and page load, and the index (or indexes) each must be served by;
+# the ids are placeholders, only the shape of the query matters to the planner
+HOT_QUERIES = [
+    (
+        'Daily shift records for a location on a day (tip pooling)',
+        lambda: DailyShiftRecords.objects.filter(external_location=1, employee__in=[1, 2], shift_date=TODAY),
+        ['dailyshift_location_date_idx', 'dailyshift_employee_date_idx'],
+    ),
+    (
+        'Daily shift record for an employee on a day (breaks, tip payouts)',
+        lambda: DailyShiftRecords.objects.filter(external_location=1, employee=1, shift_date=TODAY),
+        ['dailyshift_employee_date_idx', 'dailyshift_location_date_idx'],
+    ),
+    (
+        'Weekly shift record covering a date',
+        lambda: WeeklyShiftRecords.objects.filter(employee=1, start_week_date__lte=TODAY, end_week_date__gte=TODAY),
+        ['weeklyshift_employee_week_idx'],
+    ),
+    (
+        'Payments at a location within an accounting period',
+        lambda: Payments.objects.filter(external_location=1, payment_datetime__range=PERIOD_DATETIMES),
+        ['payment_location_datetime_idx'],
+    ),
+    (
+        'Latest payment taken by an employee',
+        lambda: Payments.objects.filter(employee=1).order_by('-payment_datetime')[:1],
+        ['payment_employee_datetime_idx'],
+    ),
+    (
+        'Orders of an inventory item within an accounting period',
+        lambda: Orders.objects.filter(external_location=1, inventory_item=1, order_date__range=PERIOD),
+        ['order_location_item_date_idx'],
+    ),
+    (
+        'Orders at a location within an accounting period',
+        lambda: Orders.objects.filter(external_location=1, order_date__range=PERIOD),
+        ['order_location_date_idx', 'order_location_item_date_idx'],
+    ),
+    (
+        'Completed menu item orders at a table',
+        lambda: MenuItemOrders.objects.filter(internal_location=1, order_status='Completed'),
+        ['menuitemorder_table_status_idx'],
+    ),
+    (
+        'Accounting period containing a date',
+        lambda: AccountingPeriods.objects.filter(accounting_period_start__lte=TODAY, accounting_period_end__gte=TODAY),
+        ['accounting_period_range_idx'],
+    ),
+    (
+        'Inventory cost report at the start of an accounting period',
+        lambda: InventoryCostReports.objects.filter(external_location=1, report_date=TODAY),
+        ['costreport_location_date_idx'],
+    ),
+    (
+        'Previous inventory cost report',
+        lambda: InventoryCostReports.objects.filter(external_location=1, accounting_period__lt=1).order_by('-accounting_period')[:1],
+        ['costreport_location_period_idx'],
+    ),
+    (
+        'Inventory usage report at the start of an accounting period',
+        lambda: InventoryUsage.objects.filter(external_location=1, inventory_item=1, report_date=TODAY),
+        ['usage_location_item_date_idx'],
+    ),
+    (
+        'Previous inventory usage report',
+        lambda: InventoryUsage.objects.filter(external_location=1, inventory_item=1, accounting_period__lt=1).order_by('-accounting_period')[:1],
+        ['usage_location_item_period_idx'],
+    ),
+    (
+        'Wasted inventory of an item within an accounting period',
+        lambda: InventoryWasteBin.objects.filter(external_location=1, inventory_item=1, waste_date__range=PERIOD),
+        ['wastebin_loc_item_date_idx'],
+    ),
+    (
+        'Wasted inventory at a location within an accounting period',
+        lambda: InventoryWasteBin.objects.filter(external_location=1, waste_date__range=PERIOD),
+        ['wastebin_location_date_idx', 'wastebin_loc_item_date_idx'],
+    ),
+    (
+        'Tips at a location on a day',
+        lambda: EmployeeTipRecords.objects.filter(external_location=1, tip_date=NOW),
+        ['tiprecord_location_date_idx'],
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = 'Explains every hot lookup in apos and fails if one is no longer served by its composite index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        regressions = []
+
+        with transaction.atomic():
+            # An empty or freshly migrated table makes PostgreSQL prefer a sequential scan; only ask whether the index is usable
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, build_queryset, expected_indexes in HOT_QUERIES:
+                plan = build_queryset().explain()
+                used = [index for index in expected_indexes if index in plan]
+
+                if used:
+                    self.stdout.write(self.style.SUCCESS(f'OK    {label} ({used[0]})'))
+                else:
+                    regressions.append(label)
+                    self.stdout.write(self.style.ERROR(f'MISS  {label}; expected {" or ".join(expected_indexes)}'))
+
+                if options['verbose_plans'] or not used:
+                    self.stdout.write(f'      {plan}')
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} of {len(HOT_QUERIES)} hot queries are not using their index')
+
+        self.stdout.write(f'All {len(HOT_QUERIES)} hot queries are using their index')
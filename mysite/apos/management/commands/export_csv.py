@@ -0,0 +1,37 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apos.exports import EXPORTS, csv_lines, export_queryset, gzip_chunks
+
+
+class Command(BaseCommand):
+    help = 'Streams payments, shift, inventory report or tip records out as CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--location', type=int, action='append', help='Only export this external location id (repeatable)')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to export (YYYY-MM-DD)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', help='File to write to; defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        queryset = export_queryset(options['export'], options['location'], options['start'], options['end'])
+        lines = csv_lines(queryset, chunk_size=options['chunk_size'])
+
+        if options['gzip']:
+            output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+            chunks = gzip_chunks(lines)
+        else:
+            output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+            chunks = lines
+
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
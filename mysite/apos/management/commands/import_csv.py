@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apos.imports import CHUNK_SIZE, IMPORTS, import_rows, read_csv
+from apos.models import ExternalLocations
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports inventory items, vendors or employees for a location from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('import_name', choices=sorted(IMPORTS))
+        parser.add_argument('path', help='CSV file whose header row uses the create form\'s field names')
+        parser.add_argument('--location', type=int, required=True, help='External location id the rows belong to')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows validated and written per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            external_location = ExternalLocations.objects.get(pk=options['location'])
+        except ExternalLocations.DoesNotExist:
+            raise CommandError(f'No external location with id {options["location"]}')
+
+        with open(options['path'], newline='', encoding='utf-8-sig') as file:
+            result = import_rows(options['import_name'], read_csv(file), external_location, chunk_size=options['chunk_size'])
+
+        for line, error in result.errors:
+            self.stderr.write(f'Line {line}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.created:,} created, {result.skipped:,} already imported, {len(result.errors):,} failed'
+        ))
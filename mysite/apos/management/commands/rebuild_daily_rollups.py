@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apos.models import ExternalLocations
+from apos.rollups import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes DailyLocationRollups from the inventory ledger and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', type=int, help='Only rebuild this external location id')
+        parser.add_argument('--since', type=date.fromisoformat, help='Only rebuild days on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        locations = ExternalLocations.objects.order_by('pk')
+
+        if options['location'] is not None:
+            locations = locations.filter(pk=options['location'])
+
+        for external_location in locations:
+            rollups = rebuild_daily_rollups(external_location, since=options['since'])
+            self.stdout.write(f'{external_location}: {len(rollups):,} days')
+
+        self.stdout.write(self.style.SUCCESS('Daily rollups rebuilt'))
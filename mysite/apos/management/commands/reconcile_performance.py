@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from apos.counters import apply_counters
+from apos.models import EmployeesPerformance
+from apos.performance import performance_differences
+
+
+class Command(BaseCommand):
+    help = 'Compares the stored EmployeesPerformance counters with the values derived from shifts, breaks, payments, requests and waste'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', type=int, help='Only check employees whose performance row is at this external location id')
+        parser.add_argument('--fix', action='store_true', help='Correct the stored counters that differ to the derived values')
+        parser.add_argument('--batch-size', type=int, default=500, help='Employees derived per round of queries')
+
+    def handle(self, *args, **options):
+        rows = EmployeesPerformance.objects.order_by('pk')
+
+        if options['location'] is not None:
+            rows = rows.filter(external_location=options['location'])
+
+        checked = mismatched = 0
+        batch = []
+
+        for row in rows.iterator(chunk_size=options['batch_size']):
+            batch.append(row)
+
+            if len(batch) >= options['batch_size']:
+                mismatched += self.reconcile(batch, options['fix'])
+                checked += len(batch)
+                batch = []
+
+        if batch:
+            mismatched += self.reconcile(batch, options['fix'])
+            checked += len(batch)
+
+        summary = f'{checked:,} employees checked, {mismatched:,} with counters that differ'
+        self.stdout.write(self.style.SUCCESS(summary + (' (fixed)' if options['fix'] and mismatched else '')))
+
+    # Corrections go in as deltas (derived minus stored as read) through the same F() increments the saves use, so an
+    # increment written while the batch was being derived is kept rather than overwritten
+    def reconcile(self, rows, fix):
+        differences = performance_differences(rows)
+        corrections = {}
+
+        for row in rows:
+            for name, (stored, derived) in differences.get(row.employee_id, {}).items():
+                self.stdout.write(f'employee {row.employee_id} {name}: stored {stored}, derived {derived}')
+                corrections.setdefault(row.employee_id, {})[name] = derived - stored
+
+        if fix:
+            apply_counters(corrections)
+
+        return len(differences)
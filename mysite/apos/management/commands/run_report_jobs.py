@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from apos.jobs import claim_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued report jobs in a pool of worker processes; several of these can share one database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=min(os.cpu_count() or 1, 4))
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait for new jobs when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of waiting for more')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        running = {}
+        succeeded = failed = 0
+
+        # Workers are spawned fresh rather than forked, so none inherits this process's database connection
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+        try:
+            while True:
+                requeue_stale_jobs()
+
+                for pk in claim_jobs(processes - len(running)):
+                    running[pool.submit(run_job, pk)] = pk
+
+                if not running:
+                    if options['once']:
+                        break
+
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    pk = running.pop(future)
+
+                    # A job that couldn't even record its own outcome is left Running for requeue_stale_jobs to pick up
+                    try:
+                        ok = future.result()
+                    except Exception as error:
+                        self.stderr.write(f'Job {pk} crashed: {error!r}')
+                        continue
+
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+
+                    self.stdout.write(f'Job {pk} {"succeeded" if ok else "failed"}')
+
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; waiting for running jobs to finish')
+
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'{succeeded:,} jobs succeeded, {failed:,} failed or retrying'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apos.cron import CronSchedule
+from apos.jobs import enqueue_due_schedules
+from apos.models import ExternalLocations, ReportJobs, ReportSchedules
+
+
+class Command(BaseCommand):
+    help = 'Queues scheduled report jobs as they come due; run_report_jobs works through them in parallel across locations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Queue whatever is due now and exit (for running from cron)')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between checks')
+        parser.add_argument('--install-defaults', action='store_true', help='Give every location a schedule for each report it lacks one for')
+        parser.add_argument('--cron', default='{minute} 3 * * *', help='Expression for installed schedules; {minute} staggers locations across the hour')
+        parser.add_argument('--time-zone', default='UTC', help='Time zone for installed schedules')
+
+    def handle(self, *args, **options):
+        if options['install_defaults']:
+            self.install_defaults(options['cron'], options['time_zone'])
+
+        while True:
+            jobs = enqueue_due_schedules()
+
+            for job in jobs:
+                self.stdout.write(f'Queued {job.job_type.lower()} for {job.external_location} (job {job.pk})')
+
+            if options['once']:
+                break
+
+            time.sleep(options['interval'])
+
+    def install_defaults(self, cron_expression, time_zone):
+        installed = 0
+
+        for external_location in ExternalLocations.objects.order_by('pk'):
+            # Every store on the same minute would hand the workers one big spike; spread them over the hour
+            expression = cron_expression.format(minute=external_location.pk % 60)
+
+            try:
+                CronSchedule(expression, time_zone)
+            except (ValueError, KeyError) as error:
+                raise CommandError(f'Cannot install \'{expression}\' in {time_zone}: {error}')
+
+            existing = set(ReportSchedules.objects.filter(external_location=external_location).values_list('job_type', flat=True))
+
+            for job_type, _ in ReportJobs.JOB_TYPE_CHOICES:
+                if job_type not in existing:
+                    ReportSchedules.objects.create(
+                        external_location=external_location,
+                        job_type=job_type,
+                        cron_expression=expression,
+                        time_zone=time_zone,
+                    )
+                    installed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Installed {installed:,} report schedules'))
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apos.ledger import snapshot_accounting_period
+from apos.models import AccountingPeriods
+
+
+class Command(BaseCommand):
+    help = 'Records every inventory item\'s closing balance for accounting periods that have ended and have no snapshot yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', type=int, help='Snapshot (or re-snapshot) only this accounting period id')
+
+    def handle(self, *args, **options):
+        if options['period'] is not None:
+            periods = AccountingPeriods.objects.filter(pk=options['period'])
+
+            if not periods.exists():
+                raise CommandError(f'Accounting period {options["period"]} does not exist')
+        else:
+            periods = AccountingPeriods.objects.filter(
+                accounting_period_end__lt=date.today(),
+                inventorysnapshots__isnull=True,
+            ).distinct()
+
+        for accounting_period in periods.order_by('accounting_period_end'):
+            snapshots = snapshot_accounting_period(accounting_period)
+
+            self.stdout.write(
+                f'{accounting_period.accounting_period_start} - {accounting_period.accounting_period_end}: {len(snapshots):,} items'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Inventory snapshots are up to date'))
@@ -0,0 +1,127 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from .cache import EmployeeScope, employee_scope_cache
+from .models import Employees
+
+
+ANONYMOUS_SCOPE = EmployeeScope(None, None, None, None, frozenset())
+
+
+# The current user's employee scope and group names, resolved once per request; the employee row itself
+# is only loaded when a view actually needs it
+class EmployeeContext:
+    def __init__(self, scope=ANONYMOUS_SCOPE, employee=None):
+        self.scope = scope
+        self._employee = employee
+
+    @property
+    def employee(self):
+        if self._employee is None and self.scope.employee_id is not None:
+            self._employee = Employees.objects.select_related(
+                'region_location', 'external_location'
+            ).filter(pk=self.scope.employee_id).first()
+
+        return self._employee
+
+    @property
+    def employee_id(self):
+        return self.scope.employee_id
+
+    @property
+    def region_location_id(self):
+        return self.scope.region_location_id
+
+    @property
+    def external_location_id(self):
+        return self.scope.external_location_id
+
+    @property
+    def unique_identifier(self):
+        return self.scope.unique_identifier
+
+    @property
+    def group_names(self):
+        return self.scope.group_names
+
+    @property
+    def region_location(self):
+        return self.employee.region_location if self.employee else None
+
+    @property
+    def external_location(self):
+        return self.employee.external_location if self.employee else None
+
+    def in_groups(self, *names):
+        return not self.scope.group_names.isdisjoint(names)
+
+
+def resolve_employee_context(user):
+    if not user.is_authenticated:
+        return EmployeeContext()
+
+    scope = employee_scope_cache.get(user.pk)
+
+    if scope is not None:
+        return EmployeeContext(scope)
+
+    # One row per group the user belongs to; the employee and its locations come along in the same join
+    employees = Employees.objects.select_related('region_location', 'external_location')
+    rows = list(employees.filter(user=user).annotate(group_name=F('user__groups__name')))
+
+    if rows:
+        employee = rows[0]
+        group_names = frozenset(row.group_name for row in rows if row.group_name)
+    else:
+        # An employee added under a username that already had an account is never linked to it (see signals.py), so
+        # they are found the way the permission mixins always found them, by account username
+        employee = employees.filter(user__isnull=True, account_username=user.username).first()
+        group_names = frozenset(user.groups.values_list('name', flat=True))
+
+    if employee is not None:
+        scope = EmployeeScope(
+            employee_id=employee.pk,
+            region_location_id=employee.region_location_id,
+            external_location_id=employee.external_location_id,
+            unique_identifier=employee.unique_identifier,
+            group_names=group_names,
+        )
+    else:
+        scope = ANONYMOUS_SCOPE._replace(group_names=group_names)
+
+    employee_scope_cache.set(user.pk, scope)
+    return EmployeeContext(scope, employee)
+
+
+def get_employee_context(request):
+    if not hasattr(request, '_cached_employee_context'):
+        request._cached_employee_context = resolve_employee_context(request.user)
+
+    return request._cached_employee_context
+
+
+def get_employee_or_404(request):
+    employee = get_employee_context(request).employee
+
+    if employee is None:
+        raise Http404('No Employees matches the given query.')
+
+    return employee
+
+
+class EmployeeContextMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not hasattr(request, 'user'):
+            raise ImproperlyConfigured(
+                'The employee context middleware requires the authentication middleware to be installed. '
+                'Edit your MIDDLEWARE setting to insert \'django.contrib.auth.middleware.AuthenticationMiddleware\' '
+                'before \'apos.middleware.EmployeeContextMiddleware\'.'
+            )
+
+        request.employee_context = SimpleLazyObject(lambda: get_employee_context(request))
+        return self.get_response(request)
@@ -0,0 +1,29 @@
+# Generated by Django 5.0 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0002_alter_recipes_cooking_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyshiftrecords',
+            index=models.Index(fields=['external_location', 'shift_date'], name='dailyshift_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyshiftrecords',
+            index=models.Index(fields=['employee', 'shift_date'], name='dailyshift_employee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['external_location', 'payment_datetime'], name='payment_location_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['employee', 'payment_datetime'], name='payment_employee_datetime_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0003_scope_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountingperiods',
+            index=models.Index(fields=['accounting_period_start', 'accounting_period_end'], name='accounting_period_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeetiprecords',
+            index=models.Index(fields=['external_location', 'tip_date'], name='tiprecord_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorycostreports',
+            index=models.Index(fields=['external_location', 'report_date'], name='costreport_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorycostreports',
+            index=models.Index(fields=['external_location', 'accounting_period'], name='costreport_location_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryusage',
+            index=models.Index(fields=['external_location', 'inventory_item', 'report_date'], name='usage_location_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryusage',
+            index=models.Index(fields=['external_location', 'inventory_item', 'accounting_period'], name='usage_location_item_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorywastebin',
+            index=models.Index(fields=['external_location', 'inventory_item', 'waste_date'], name='wastebin_loc_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorywastebin',
+            index=models.Index(fields=['external_location', 'waste_date'], name='wastebin_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitemorders',
+            index=models.Index(fields=['internal_location', 'order_status'], name='menuitemorder_table_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['external_location', 'inventory_item', 'order_date'], name='order_location_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['external_location', 'order_date'], name='order_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyshiftrecords',
+            index=models.Index(fields=['employee', 'start_week_date', 'end_week_date'], name='weeklyshift_employee_week_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentLines',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_datetime', models.DateTimeField()),
+                ('add_on', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='apos.addons')),
+                ('external_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apos.menuitems')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='apos.payments')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['external_location', 'menu_item'], name='paymentline_location_item_idx'), models.Index(fields=['external_location', 'payment_datetime'], name='paymentline_location_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0005_payment_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitemorders',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitemorders',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
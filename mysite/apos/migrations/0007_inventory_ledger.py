@@ -0,0 +1,49 @@
+# Generated by Django 5.0 on 2026-10-18 06:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0006_menu_item_order_cost_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovements',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('Receipt', 'Receipt'), ('Sale', 'Sale'), ('Waste', 'Waste'), ('Transfer out', 'Transfer out'), ('Transfer in', 'Transfer in'), ('Adjustment', 'Adjustment')], max_length=12)),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('movement_date', models.DateField(auto_now_add=True)),
+                ('external_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='apos.inventoryitems')),
+                ('inventory_transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.inventorytransfers')),
+                ('inventory_waste', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.inventorywastebin')),
+                ('menu_item_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.menuitemorders')),
+                ('order_inventory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.orderinventory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['external_location', 'inventory_item', 'movement_date'], name='movement_loc_item_date_idx'), models.Index(fields=['external_location', 'movement_date'], name='movement_location_date_idx'), models.Index(fields=['inventory_item', 'movement_date'], name='movement_item_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventorySnapshots',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('total_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('snapshot_date', models.DateField()),
+                ('added_date', models.DateTimeField(auto_now_add=True)),
+                ('accounting_period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apos.accountingperiods')),
+                ('external_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='apos.inventoryitems')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['inventory_item', 'snapshot_date'], name='snapshot_item_date_idx'), models.Index(fields=['accounting_period', 'external_location'], name='snapshot_period_location_idx')],
+            },
+        ),
+    ]
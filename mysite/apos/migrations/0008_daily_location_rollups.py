@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-18 06:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0007_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLocationRollups',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rollup_date', models.DateField()),
+                ('purchases_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('wastage_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('transfers', models.PositiveIntegerField(default=0)),
+                ('closing_inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('external_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailylocationrollups',
+            constraint=models.UniqueConstraint(fields=('external_location', 'rollup_date'), name='rollup_location_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-18 06:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0008_daily_location_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJobs',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('Menu engineering report', 'Menu engineering report'), ('Waste analysis', 'Waste analysis'), ('Inventory usage', 'Inventory usage'), ('Inventory cost report', 'Inventory cost report')], max_length=23)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Running', 'Running'), ('Succeeded', 'Succeeded'), ('Failed', 'Failed')], default='Queued', max_length=9)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('started_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('external_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.employees')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='reportjob_status_run_idx'), models.Index(fields=['external_location', 'job_type', 'status'], name='reportjob_loc_type_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 06:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0009_report_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSchedules',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('Menu engineering report', 'Menu engineering report'), ('Waste analysis', 'Waste analysis'), ('Inventory usage', 'Inventory usage'), ('Inventory cost report', 'Inventory cost report')], max_length=23)),
+                ('cron_expression', models.CharField(default='0 3 * * *', max_length=100)),
+                ('time_zone', models.CharField(default='UTC', max_length=63)),
+                ('enabled', models.BooleanField(default=True)),
+                ('next_run', models.DateTimeField(blank=True, null=True)),
+                ('last_run', models.DateTimeField(blank=True, null=True)),
+                ('external_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apos.externallocations')),
+                ('last_job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apos.reportjobs')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['enabled', 'next_run'], name='reportschedule_due_idx')],
+            },
+        ),
+    ]
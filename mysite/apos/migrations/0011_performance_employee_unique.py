@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+COUNTERS = [
+    'total_earnings', 'total_tips_received', 'total_hours_worked', 'total_overtime_hours_worked', 'late_to_work_count',
+    'missed_work_days_count', 'uncompleted_shift_count', 'requests_created', 'total_transactions_completed',
+    'total_sales_handled_amount', 'total_breaks_taken', 'total_break_time', 'total_inventory_waste_count',
+]
+
+
+# Racing get_or_create calls could leave an employee with two rows; fold them into the oldest before the constraint goes on
+def merge_duplicate_performance_rows(apps, schema_editor):
+    EmployeesPerformance = apps.get_model('apos', 'EmployeesPerformance')
+    duplicated = EmployeesPerformance.objects.values('employee').annotate(rows=models.Count('pk')).filter(rows__gt=1)
+
+    for employee in duplicated.values_list('employee', flat=True):
+        kept, *extras = EmployeesPerformance.objects.filter(employee=employee).order_by('pk')
+
+        for extra in extras:
+            for counter in COUNTERS:
+                setattr(kept, counter, getattr(kept, counter) + getattr(extra, counter))
+
+        kept.save(update_fields=COUNTERS)
+        EmployeesPerformance.objects.filter(pk__in=[extra.pk for extra in extras]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apos', '0010_report_schedules'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_performance_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='employeesperformance',
+            constraint=models.UniqueConstraint(fields=('employee',), name='performance_employee_uniq'),
+        ),
+    ]
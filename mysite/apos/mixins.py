@@ -2,26 +2,33 @@ from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.shortcuts import redirect
 from django.db import OperationalError
-from django.db.models import Q
-from .models import Employees
+from .middleware import get_employee_context
+from .scopes import scope_queryset
+
+
+def no_permission_redirect(request):
+    try:
+        employee = get_employee_context(request).employee
+    except OperationalError:
+        employee = None
+
+    if employee is None:
+        messages.error(request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
+        return redirect('home')
+
+    messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
+
+    previous_url = request.META.get('HTTP_REFERER', 'home')
+    return redirect(previous_url)
 
 
 # Full permissions mixins; only this group can CRUD this model
 class OwnerRequiredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name='Owner').exists()
-    
+        return get_employee_context(self.request).in_groups('Owner')
+
     def handle_no_permission(self):
-        try:
-            employee = Employees.objects.get(account_username=self.request.user.username)
-            messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-    
-            previous_url = self.request.META.get('HTTP_REFERER', 'home')
-            return redirect(previous_url)
-            
-        except OperationalError:
-            messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-            return redirect('home')
+        return no_permission_redirect(self.request)
 
     def is_management_or_chef_or_employee(self):
         return not self.test_func()
@@ -29,17 +36,12 @@ class OwnerRequiredMixin(UserPassesTestMixin):
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
-            employee = Employees.objects.get(
-                account_username=self.request.user.username
-            )
-
-            return queryset.filter(
-                Q(unique_identifier=employee.unique_identifier) |
-                Q(region_location=employee.region_location) |
-                Q(external_location=employee.external_location) |
-                Q(source_external_location=employee.external_location) |
-                Q(destination_external_location=employee.external_location)
-            )
+            context = get_employee_context(self.request)
+
+            if context.employee_id is None:
+                return queryset.none()
+
+            return scope_queryset(queryset, context)
 
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
@@ -48,19 +50,10 @@ class OwnerRequiredMixin(UserPassesTestMixin):
 
 class OwnerOrManagementRequiredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name__in=['Owner', 'Management']).exists()
-    
-    def handle_no_permission(self):
-        try:
-            employee = Employees.objects.get(account_username=self.request.user.username)
-            messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
+        return get_employee_context(self.request).in_groups('Owner', 'Management')
 
-            previous_url = self.request.META.get('HTTP_REFERER', 'home')
-            return redirect(previous_url)
-        
-        except OperationalError:
-            messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-            return redirect('home')
+    def handle_no_permission(self):
+        return no_permission_redirect(self.request)
 
     def is_chef_or_employee(self):
         return not self.test_func()
@@ -68,17 +61,12 @@ class OwnerOrManagementRequiredMixin(UserPassesTestMixin):
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
-            employee = Employees.objects.get(
-                account_username=self.request.user.username
-            )
-
-            return queryset.filter(
-                Q(unique_identifier=employee.unique_identifier) |
-                Q(region_location=employee.region_location) |
-                Q(external_location=employee.external_location) |
-                Q(source_external_location=employee.external_location) |
-                Q(destination_external_location=employee.external_location)
-            )
+            context = get_employee_context(self.request)
+
+            if context.employee_id is None:
+                return queryset.none()
+
+            return scope_queryset(queryset, context)
 
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
@@ -87,19 +75,10 @@ class OwnerOrManagementRequiredMixin(UserPassesTestMixin):
 
 class OwnerOrManagementOrChefRequiredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name__in=['Owner', 'Management', 'Chef']).exists()
+        return get_employee_context(self.request).in_groups('Owner', 'Management', 'Chef')
 
     def handle_no_permission(self):
-        try:
-            employee = Employees.objects.get(account_username=self.request.user.username)
-            messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-
-            previous_url = self.request.META.get('HTTP_REFERER', 'home')
-            return redirect(previous_url)
-            
-        except OperationalError:
-            messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-            return redirect('home')
+        return no_permission_redirect(self.request)
 
     def is_employee(self):
         return not self.test_func()
@@ -107,18 +86,13 @@ class OwnerOrManagementOrChefRequiredMixin(UserPassesTestMixin):
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
-            employee = Employees.objects.get(
-                account_username=self.request.user.username
-            )
-
-            return queryset.filter(
-                Q(unique_identifier=employee.unique_identifier) |
-                Q(region_location=employee.region_location) |
-                Q(external_location=employee.external_location) |
-                Q(source_external_location=employee.external_location) |
-                Q(destination_external_location=employee.external_location)
-            )
-            
+            context = get_employee_context(self.request)
+
+            if context.employee_id is None:
+                return queryset.none()
+
+            return scope_queryset(queryset, context)
+
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
             return redirect('home')
@@ -126,34 +100,20 @@ class OwnerOrManagementOrChefRequiredMixin(UserPassesTestMixin):
 
 class AllGroupsLocationFilteredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name__in=['Owner', 'Management', 'Chef', 'Employee']).exists()
+        return get_employee_context(self.request).in_groups('Owner', 'Management', 'Chef', 'Employee')
 
     def handle_no_permission(self):
-        try:
-            employee = Employees.objects.get(account_username=self.request.user.username)
-            messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-
-            previous_url = self.request.META.get('HTTP_REFERER', 'home')
-            return redirect(previous_url)
-
-        except OperationalError:
-            messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-            return redirect('home')
+        return no_permission_redirect(self.request)
 
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
-            employee = Employees.objects.get(
-                account_username=self.request.user.username
-            )
-
-            return queryset.filter(
-                Q(unique_identifier=employee.unique_identifier) |
-                Q(region_location=employee.region_location) |
-                Q(external_location=employee.external_location) |
-                Q(source_external_location=employee.external_location) |
-                Q(destination_external_location=employee.external_location)
-            )
+            context = get_employee_context(self.request)
+
+            if context.employee_id is None:
+                return queryset.none()
+
+            return scope_queryset(queryset, context)
 
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
@@ -162,45 +122,21 @@ class AllGroupsLocationFilteredMixin(UserPassesTestMixin):
 
 class AllGroupsUserLocationFilteredMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name__in=['Owner', 'Management', 'Chef', 'Employee']).exists()
+        return get_employee_context(self.request).in_groups('Owner', 'Management', 'Chef', 'Employee')
 
     def handle_no_permission(self):
-        try:
-            employee = Employees.objects.get(account_username=self.request.user.username)
-            messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-
-            previous_url = self.request.META.get('HTTP_REFERER', 'home')
-            return redirect(previous_url)
-
-        except OperationalError:
-            messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-            return redirect('home')
+        return no_permission_redirect(self.request)
 
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
-            employee = Employees.objects.get(
-                account_username=self.request.user.username
-            )
-
-            return queryset.filter(
-                Q(unique_identifier=employee.unique_identifier) |
-                Q(employee=employee) |
-                Q(employee_requestor=employee) |
-                Q(employee_responder=employee) |
-                Q(employee_swapped=employee) |
-                Q(employee_assignee=employee) |
-                Q(employee_assignor=employee) |
-                Q(employee_tasker=employee) |
-                Q(employee_commenter=employee) |
-                Q(employee_culprit=employee) |
-                Q(employee_reporter=employee) |
-                Q(region_location=employee.region_location) |
-                Q(external_location=employee.external_location) |
-                Q(source_external_location=employee.external_location) |
-                Q(destination_external_location=employee.external_location)
-            )
-        
+            context = get_employee_context(self.request)
+
+            if context.employee_id is None:
+                return queryset.none()
+
+            return scope_queryset(queryset, context, employee=True)
+
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
             return redirect('home')
@@ -211,16 +147,7 @@ class OwnerFullManagementOrChefOrEmployeeLimitedPermissionMixin(OwnerRequiredMix
     def dispatch(self, request, *args, **kwargs):
         if self.is_management_or_chef_or_employee():
             if self.request.method != 'GET':
-                try:
-                    employee = Employees.objects.get(account_username=self.request.user.username)
-                    messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-
-                    previous_url = self.request.META.get('HTTP_REFERER', 'home')
-                    return redirect(previous_url)
-                
-                except OperationalError:
-                    messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-                    return redirect('home')
+                return no_permission_redirect(self.request)
 
             else:
                 return super().dispatch(request, *args, **kwargs)
@@ -232,26 +159,12 @@ class OwnerFullManagementOrChefOrEmployeeLimitedPermissionMixin(OwnerRequiredMix
             queryset = super().get_queryset()
 
             if self.is_management_or_chef_or_employee():
-                employee = Employees.objects.get(
-                    account_username=self.request.user.username
-                )
-
-                return queryset.filter(
-                    Q(employee=employee) |
-                    Q(employee_requestor=employee) |
-                    Q(employee_responder=employee) |
-                    Q(employee_swapped=employee) |
-                    Q(employee_assignee=employee) |
-                    Q(employee_assignor=employee) |
-                    Q(employee_tasker=employee) |
-                    Q(employee_commenter=employee) |
-                    Q(employee_culprit=employee) |
-                    Q(employee_reporter=employee) |
-                    Q(region_location=employee.region_location) |
-                    Q(external_location=employee.external_location) |
-                    Q(source_external_location=employee.external_location) |
-                    Q(destination_external_location=employee.external_location)
-                )
+                context = get_employee_context(self.request)
+
+                if context.employee_id is None:
+                    return queryset.none()
+
+                return scope_queryset(queryset, context, identifier=False, employee=True)
 
             return queryset
 
@@ -264,50 +177,27 @@ class OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin(OwnerOrManagemen
     def dispatch(self, request, *args, **kwargs):
         if self.is_chef_or_employee():
             if self.request.method != 'GET':
-                try:
-                    employee = Employees.objects.get(account_username=self.request.user.username)
-                    messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-    
-                    previous_url = self.request.META.get('HTTP_REFERER', 'home')
-                    return redirect(previous_url)
-
-                except OperationalError:
-                    messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-                    return redirect('home')
+                return no_permission_redirect(self.request)
 
             else:
                 return super().dispatch(request, *args, **kwargs)
-        
+
         return super().dispatch(request, *args, **kwargs)
-    
+
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
 
             if self.is_chef_or_employee():
-                employee = Employees.objects.get(
-                    account_username=self.request.user.username
-                )
-
-                return queryset.filter(
-                    Q(employee=employee) |
-                    Q(employee_requestor=employee) |
-                    Q(employee_responder=employee) |
-                    Q(employee_swapped=employee) |
-                    Q(employee_assignee=employee) |
-                    Q(employee_assignor=employee) |
-                    Q(employee_tasker=employee) |
-                    Q(employee_commenter=employee) |
-                    Q(employee_culprit=employee) |
-                    Q(employee_reporter=employee) |
-                    Q(region_location=employee.region_location) |
-                    Q(external_location=employee.external_location) |
-                    Q(source_external_location=employee.external_location) |
-                    Q(destination_external_location=employee.external_location)
-                )
+                context = get_employee_context(self.request)
+
+                if context.employee_id is None:
+                    return queryset.none()
+
+                return scope_queryset(queryset, context, identifier=False, employee=True)
 
             return queryset
-        
+
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
             return redirect('home')
@@ -317,50 +207,27 @@ class OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin(OwnerOrManagemen
     def dispatch(self, request, *args, **kwargs):
         if self.is_employee():
             if self.request.method != 'GET':
-                try:
-                    employee = Employees.objects.get(account_username=self.request.user.username)
-                    messages.error(self.request, f'Woah there {employee.first_name}! Nothing to see here! Go back :)')
-
-                    previous_url = self.request.META.get('HTTP_REFERER', 'home')
-                    return redirect(previous_url)
-                
-                except OperationalError:
-                    messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
-                    return redirect('home')
+                return no_permission_redirect(self.request)
 
             else:
                 return super().dispatch(request, *args, **kwargs)
-        
+
         return super().dispatch(request, *args, **kwargs)
-    
+
     def get_queryset(self):
         try:
             queryset = super().get_queryset()
 
             if self.is_employee():
-                employee = Employees.objects.get(
-                    account_username=self.request.user.username
-                )
-
-                return queryset.filter(
-                    Q(employee=employee) |
-                    Q(employee_requestor=employee) |
-                    Q(employee_responder=employee) |
-                    Q(employee_swapped=employee) |
-                    Q(employee_assignee=employee) |
-                    Q(employee_assignor=employee) |
-                    Q(employee_tasker=employee) |
-                    Q(employee_commenter=employee) |
-                    Q(employee_culprit=employee) |
-                    Q(employee_reporter=employee) |
-                    Q(region_location=employee.region_location) |
-                    Q(external_location=employee.external_location) |
-                    Q(source_external_location=employee.external_location) |
-                    Q(destination_external_location=employee.external_location)
-                )
+                context = get_employee_context(self.request)
+
+                if context.employee_id is None:
+                    return queryset.none()
+
+                return scope_queryset(queryset, context, identifier=False, employee=True)
 
             return queryset
-        
+
         except OperationalError:
             messages.error(self.request, 'Create an account, log back in, or add yourself to \'Employees\' to get started')
             return redirect('home')
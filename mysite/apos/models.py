@@ -1,9 +1,14 @@
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 from phonenumber_field.modelfields import PhoneNumberField
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Avg, Count, F, Q, Sum
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 # TODO: LocationTrainingInsights: Add logic for KeplerPro suggestions
@@ -79,17 +84,21 @@ class Employees(models.Model):
 
    @property
    def get_account_username(self):
-      if len(first_name) >= 3 and len(last_name) >= 3:
-         return (first_name[:3] + last_name[:3] + phone[-2] + job_position[0].upper()).replace(' ', '')
+      phone = str(self.phone)
+
+      if len(self.first_name) >= 3 and len(self.last_name) >= 3:
+         return (self.first_name[:3] + self.last_name[:3] + phone[-2] + self.job_position[0].upper()).replace(' ', '')
       else:
-         return (first_name[:2] + last_name[:2] + phone[-2] + job_position[0].upper()).replace(' ', '')
+         return (self.first_name[:2] + self.last_name[:2] + phone[-2] + self.job_position[0].upper()).replace(' ', '')
 
    @property
    def get_account_password(self):
-      if len(first_name) >= 3 and len(last_name) >= 3:
-         return (first_name[:3] + last_name[:3] + phone[-2] + job_position[0].upper() + '@' + email[:3]).replace(' ', '')
+      phone = str(self.phone)
+
+      if len(self.first_name) >= 3 and len(self.last_name) >= 3:
+         return (self.first_name[:3] + self.last_name[:3] + phone[-2] + self.job_position[0].upper() + '@' + self.email[:3]).replace(' ', '')
       else:
-         return (first_name[:2] + last_name[:2] + phone[-2] + job_position[0].upper() + '@' + email[:3]).replace(' ', '')
+         return (self.first_name[:2] + self.last_name[:2] + phone[-2] + self.job_position[0].upper() + '@' + self.email[:3]).replace(' ', '')
 
    def save(self, *args, **kwargs):
       self.account_username = self.get_account_username
@@ -116,6 +125,11 @@ class EmployeesPerformance(models.Model):
    total_break_time = models.DecimalField(max_digits=10, decimal_places=1, default=0)
    total_inventory_waste_count = models.PositiveIntegerField(default=0)
 
+   class Meta:
+      constraints = [
+         models.UniqueConstraint(fields=['employee'], name='performance_employee_uniq'),
+      ]
+
    @property
    def get_external_location(self):
       return self.employee.external_location
@@ -158,12 +172,12 @@ class Requests(models.Model):
       return self.employee.external_location
 
    def save(self, *args, **kwargs):
+      from .counters import add_to_performance
+
       self.external_location = self.get_external_location
       super().save(*args, **kwargs)
 
-      employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee_requestor)
-      employee_performance.requests_created += 1
-      employee_performance.save()
+      add_to_performance(self.employee_requestor_id, requests_created=1)
 
 
 # Shift scheduling management
@@ -273,6 +287,12 @@ class DailyShiftRecords(models.Model):
    earnings = models.DecimalField(max_digits=10, decimal_places=2)
    status = models.CharField(max_length=11, choices=STATUS_CHOICES, default='Upcoming')
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'shift_date'], name='dailyshift_location_date_idx'),
+         models.Index(fields=['employee', 'shift_date'], name='dailyshift_employee_date_idx'),
+      ]
+
    @property
    def calc_total_hours_worked(self):
       if self.punch_in_time and self.punch_out_time:
@@ -287,6 +307,8 @@ class DailyShiftRecords(models.Model):
       return self.employee.hourly_wage * self.calc_total_hours_worked
 
    def save(self, *args, **kwargs):
+      from .counters import add_to_performance
+
       self.total_hours_worked = self.calc_total_hours_worked
       self.earnings = self.calc_earnings
 
@@ -294,9 +316,7 @@ class DailyShiftRecords(models.Model):
          if self.punch_in_time - self.shift_scheduling.start_time > timedelta(minutes=7):
             self.status = 'Late'
 
-            employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-            employee_performance.late_to_work_count += 1
-            employee_performance.save()
+            add_to_performance(self.employee_id, late_to_work_count=1)
 
          else:
             self.status = 'In-progress'
@@ -308,14 +328,10 @@ class DailyShiftRecords(models.Model):
             if self.punch_out_time < self.shift_scheduling.end_time:
                self.status = 'Uncompleted'
 
-               employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-               employee_performance.uncompleted_shift_count += 1
-               employee_performance.save()
+               add_to_performance(self.employee_id, uncompleted_shift_count=1)
       
       if self.status == 'Missed':
-         employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-         employee_performance.missed_work_days_count += 1
-         employee_performance.save()
+         add_to_performance(self.employee_id, missed_work_days_count=1)
 
       super().save(*args, **kwargs)
 
@@ -354,20 +370,18 @@ class DailyShiftRecords(models.Model):
                week_shift_record.regular_hours_worked = 40
                week_shift_record.earnings_this_week += earnings_with_overtime
 
-               employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-               employee_performance.total_earnings += earnings_with_overtime
-               employee_performance.total_hours_worked += self.total_hours_worked
-               employee_performance.total_overtime_hours_worked += regular_hours_worked_added - 40
-               employee_performance.save()
+               add_to_performance(
+                  self.employee_id,
+                  total_earnings=earnings_with_overtime,
+                  total_hours_worked=self.total_hours_worked,
+                  total_overtime_hours_worked=regular_hours_worked_added - 40
+               )
 
             else:
                week_shift_record.regular_hours_worked += self.total_hours_worked
                week_shift_record.earnings_this_week += self.earnings
 
-               employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-               employee_performance.total_earnings += self.earnings
-               employee_performance.total_hours_worked += self.total_hours_worked
-               employee_performance.save()
+               add_to_performance(self.employee_id, total_earnings=self.earnings, total_hours_worked=self.total_hours_worked)
             
             week_shift_record.save()
 
@@ -382,6 +396,11 @@ class WeeklyShiftRecords(models.Model):
    overtime_hours_worked = models.DecimalField(max_digits=10, decimal_places=1)
    earnings_this_week = models.DecimalField(max_digits=10, decimal_places=2)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['employee', 'start_week_date', 'end_week_date'], name='weeklyshift_employee_week_idx'),
+      ]
+
 
 class BreakRecords(models.Model):
    external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
@@ -412,16 +431,15 @@ class BreakRecords(models.Model):
       return int(round((end - start).total_seconds() / 3600, 0))
    
    def save(self, *args, **kwargs):
+      from .counters import add_to_performance
+
       self.external_location = self.get_external_location
       self.daily_shift_record = self.get_daily_shift_record
       self.break_duration = self.calc_break_duration
 
       super().save(*args, **kwargs)
 
-      employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-      employee_performance.total_breaks_taken += 1
-      employee_performance.total_break_time += self.break_duration
-      employee_performance.save()
+      add_to_performance(self.employee_id, total_breaks_taken=1, total_break_time=self.break_duration)
 
 
 # Inventory management
@@ -465,6 +483,25 @@ class InventoryItems(models.Model):
    def avg_unit_price(self):
       return self.total_value / self.quantity
 
+   def save(self, *args, **kwargs):
+      from .rollups import roll_up_movements
+
+      previous = InventoryItems.objects.filter(pk=self.pk).values('quantity', 'total_value').first() if self.pk else None
+      super().save(*args, **kwargs)
+
+      # Stock entered or corrected by hand goes on the ledger as an adjustment, so the ledger always adds up to the balance
+      quantity = self.quantity - (previous['quantity'] if previous else 0)
+      value = self.total_value - (previous['total_value'] if previous else 0)
+
+      if quantity or value:
+         roll_up_movements([InventoryMovements.objects.create(
+            external_location=self.external_location,
+            inventory_item=self,
+            movement_type='Adjustment',
+            quantity=quantity,
+            value=value,
+         )])
+
 
 class InventoryChecks(models.Model):
    external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
@@ -538,6 +575,12 @@ class Orders(models.Model):
    arrival_date = models.DateField()
    order_status = models.CharField(max_length=9, choices=ORDER_STATUS_CHOICES)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'inventory_item', 'order_date'], name='order_location_item_date_idx'),
+         models.Index(fields=['external_location', 'order_date'], name='order_location_date_idx'),
+      ]
+
    def save(self, *args, **kwargs):
       super().save(*args, **kwargs)
       
@@ -598,18 +641,21 @@ class OrderInventory(models.Model):
       return (self.calc_total_order_value_variance / self.order.total_order_value) * 100
 
    def save(self, *args, **kwargs):
+      from .stock import receive_order_inventory
+
       self.external_location = self.get_external_location
       self.quantity_variance = self.calc_quantity_variance
       self.quantity_variance_percent = self.calc_quantity_variance_percent
       self.total_order_value_variance = self.calc_total_order_value_variance
       self.total_order_value_variance_percent = self.calc_total_order_value_variance_percent
 
-      super().save(*args, **kwargs)
+      adding = self._state.adding
+
+      with transaction.atomic():
+         super().save(*args, **kwargs)
 
-      inventory_item = InventoryItems.objects.get(pk=self.order.inventory_item)
-      inventory_item.quantity += self.received_quantity
-      inventory_item.total_value += (self.received_quantity * self.order.unit_price)
-      inventory_item.save()
+         if adding:
+            receive_order_inventory(self)
 
       if self.quantity_variance_percent >= 5:
          location_training_insights = LocationTrainingInsights.objects.get(
@@ -803,23 +849,15 @@ class Recipes(models.Model):
 
    @property
    def ingredients(self):
-      recipe_ingredients = RecipeIngredients.objects.filter(recipe=self.pk)
-      ingredients = {}
+      from .costing import recipe_cost_details
 
-      for ingredient in recipe_ingredients:
-         ingredients[ingredient.inventory_item.item_name] = ingredient.quantity
-      
-      return ingredients
+      return recipe_cost_details([self.pk])[self.pk].ingredients
 
    @property
    def ingredient_costs(self):
-      recipe_ingredients = RecipeIngredients.objects.filter(recipe=self.pk)
-      ingredient_costs = 0
+      from .costing import recipe_costs
 
-      for ingredient in recipe_ingredients:
-         ingredient_costs += ingredient.inventory_item.avg_unit_price * ingredient.quantity
-      
-      return ingredient_costs
+      return recipe_costs([self.pk])[self.pk]
 
    def save(self, *args, **kwargs):
       self.total_recipe_time = self.calc_total_recipe_time
@@ -835,7 +873,7 @@ class RecipeIngredients(models.Model):
 
    @property
    def get_region_location(self):
-      return recipe.region_location
+      return self.recipe.region_location
    
    def save(self, *args, **kwargs):
       self.region_location = self.get_region_location
@@ -862,7 +900,9 @@ class MenuItems(models.Model):
 
    @property
    def calc_gross_profit(self):
-      return self.price - self.recipe.ingredient_costs
+      from .costing import recipe_costs
+
+      return self.price - recipe_costs([self.recipe_id])[self.recipe_id]
 
    def save(self, *args, **kwargs):
       self.gross_profit = self.calc_gross_profit
@@ -926,31 +966,45 @@ class MenuItemOrders(models.Model):
    order_time = models.TimeField(auto_now_add=True)
    internal_location = models.ForeignKey(InternalLocations, on_delete=models.CASCADE)
    order_status = models.CharField(max_length=11, choices=ORDER_STATUS_CHOICES, default='Pending')
+   unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True) # Null/blank until the order goes 'In Progress'; the plate's price and cost are frozen then
+   unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['internal_location', 'order_status'], name='menuitemorder_table_status_idx'),
+      ]
 
    @property
    def get_external_location(self):
-      return menu_item.external_location
+      return self.menu_item.external_location
+
+   @property
+   def calc_unit_price(self):
+      return self.menu_item.price + sum(add_on.additional_price for add_on in self.add_ons.all())
+
+   @property
+   def calc_unit_cost(self):
+      from .costing import recipe_costs
+
+      # Read fresh rather than cached: this is frozen onto the order for good
+      recipe_cost = recipe_costs([self.menu_item.recipe_id], fresh=True)[self.menu_item.recipe_id]
+      return (recipe_cost + sum(add_on.additional_ingredient_costs for add_on in self.add_ons.all())).quantize(Decimal('0.01'))
 
    def save(self, *args, **kwargs):
+      from .stock import consume_order_stock
+
       self.external_location = self.get_external_location
-      super().save(*args, **kwargs)
 
-      if self.order_status == 'In Progress':
-         recipe = self.menu_item.recipe
-         recipe_ingredients = RecipeIngredients.objects.filter(recipe=recipe)
+      with transaction.atomic():
+         super().save(*args, **kwargs)
 
-         for ingredient in recipe_ingredients:
-            inventory_item = InventoryItems.objects.get(id=ingredient.inventory_item)
-            inventory_item.quantity -= ingredient.quantity * self.quantity
-            inventory_item.total_value -= (ingredient.quantity * ingredient.inventory_item.avg_unit_price) * self.quantity
-            inventory_item.save()
-         
-         if self.add_ons.exists():
-            for add_on in self.add_ons.all():
-               add_on_inventory_item = InventoryItems.objects.get(id=add_on.inventory_item.id)
-               add_on_inventory_item.quantity -= add_on.additional_quantity * self.quantity
-               add_on_inventory_item.total_value -= add_on.additional_ingredient_costs * self.quantity
-               add_on_inventory_item.save()
+         # The snapshot doubles as the marker that this order's stock has been taken; re-saving it while 'In Progress' takes nothing
+         if self.order_status == 'In Progress' and self.unit_cost is None:
+            self.unit_price = self.calc_unit_price
+            self.unit_cost = self.calc_unit_cost
+            MenuItemOrders.objects.filter(pk=self.pk).update(unit_price=self.unit_price, unit_cost=self.unit_cost)
+
+            consume_order_stock(self)
 
 
 class MenuEngineeringReports(models.Model):
@@ -974,63 +1028,28 @@ class MenuEngineeringReports(models.Model):
 
    @property
    def get_external_location(self):
-      return menu_item.external_location
+      return self.menu_item.external_location
 
    @property
-   def calc_total_revenue(self):
-      menu_item_orders_payments = list(Payments.objects.filter(
-         external_location=self.external_location
-      ).values_list('ordered_menu_items_and_quantities', flat=True))
-
-      if len(menu_item_orders_payments) == 0:
-         return 0
-
-      total_revenue = 0.0
-
-      for menu_item_orders_payment in menu_item_orders_payments:
-
-         for menu_item, info in menu_item_orders_payment.items():
-            if self.menu_item == menu_item:
-               total_plate_price = 0.0
-
-               menu_item = MenuItems.objects.get(pk=menu_item)
-               total_plate_price += menu_item.price * info['quantity']
-
-               for add_on in info['add-ons']:
-                  add_on = AddOns.objects.get(pk=add_on)
-                  total_plate_price += add_on.additional_price * info['quantity']
-
-               total_revenue += total_plate_price
+   def get_plate_lines(self):
+      # The plate lines already carry the menu item's price and cost with its add-ons at the time of sale
+      return PaymentLines.objects.filter(
+         external_location=self.external_location,
+         menu_item=self.menu_item,
+         add_on__isnull=True
+      )
 
-      return total_revenue
+   @property
+   def calc_total_revenue(self):
+      return self.get_plate_lines.aggregate(
+         total_revenue=Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField())
+      )['total_revenue'] or 0
 
    @property
    def calc_total_cogs(self):
-      menu_item_orders_payments = list(Payments.objects.filter(
-         external_location=self.external_location
-      ).values_list('ordered_menu_items_and_quantities', flat=True))
-
-      if len(menu_item_orders_payments) == 0:
-         return 0
-
-      total_cogs = 0.0
-
-      for menu_item_orders_payment in menu_item_orders_payments:
-
-         for menu_item, info in menu_item_orders_payment.items():
-            if self.menu_item == menu_item:
-               total_plate_cost = 0.0
-
-               menu_item = MenuItems.objects.get(pk=menu_item)
-               total_plate_cost += menu_item.recipe.ingredient_costs * info['quantity']
-
-               for add_on in info['add-ons']:
-                  add_on = AddOns.objects.get(pk=add_on)
-                  total_plate_cost += add_on.additional_ingredient_costs * info['quantity']
-               
-               total_cogs += total_plate_cost
-      
-      return total_cogs
+      return self.get_plate_lines.aggregate(
+         total_cogs=Sum(F('quantity') * F('unit_cost'), output_field=models.DecimalField())
+      )['total_cogs'] or 0
 
    @property
    def calc_gross_profit(self):
@@ -1038,22 +1057,7 @@ class MenuEngineeringReports(models.Model):
 
    @property
    def calc_number_sold(self):
-      menu_item_orders_payments = list(Payments.objects.filter(
-         external_location=self.external_location
-      ).values_list('ordered_menu_items_and_quantities', flat=True))
-
-      if len(menu_item_orders_payments) == 0:
-         return 0
-
-      number_sold = 0
-
-      for menu_item_orders_payment in menu_item_orders_payments:
-
-         for menu_item, info in menu_item_orders_payment.items():
-            if self.menu_item == menu_item:
-               number_sold += info['quantity']
-      
-      return number_sold
+      return self.get_plate_lines.aggregate(Sum('quantity'))['quantity__sum'] or 0
 
    @property
    def get_matrix(self):
@@ -1070,11 +1074,11 @@ class MenuEngineeringReports(models.Model):
       elif self.calc_number_sold < avg_number_sold and self.calc_gross_profit > avg_gross_profit:
          return 'Puzzle' 
       elif self.calc_number_sold > avg_number_sold and self.calc_gross_profit < avg_gross_profit:
-         return 'Plow Horse'
+         return 'Plow horse'
       elif self.calc_number_sold < avg_number_sold and self.calc_gross_profit < avg_gross_profit:
          return 'Dog'
       else:
-         return 'Insufficient Data'
+         return 'Insufficient data'
 
    def save(self, *args, **kwargs):
       self.external_location = self.get_external_location
@@ -1104,7 +1108,7 @@ class WasteRecords(models.Model):
 
    @property
    def get_external_location(self):
-      return menu_item.external_location
+      return self.menu_item.external_location
 
    def save(self, *args, **kwargs):
       self.external_location = self.get_external_location
@@ -1127,7 +1131,7 @@ class WasteAnalysis(models.Model):
 
    @property
    def get_external_location(self):
-      return menu_item.external_location
+      return self.menu_item.external_location
 
    @property
    def get_total_weight_wasted(self):
@@ -1137,9 +1141,11 @@ class WasteAnalysis(models.Model):
 
    @property
    def get_most_common_waste_reason(self):
-      return WasteRecords.objects.filter(
+      from .reports import most_common_waste_reason
+
+      return most_common_waste_reason(dict(WasteRecords.objects.filter(
          menu_item=self.menu_item
-      ).values_list('waste_reason', flat=True).annotate(Count('waste_reason')).order_by('-waste_reason__count')[0] or "Insufficient data"
+      ).values('waste_reason').annotate(count=Count('pk')).order_by().values_list('waste_reason', 'count')))
 
    def save(self, *args, **kwargs):
       self.external_location = self.get_external_location
@@ -1178,100 +1184,85 @@ class Payments(models.Model):
    payment_type = models.CharField(max_length=14, choices=PAYMENT_TYPE_CHOICES)
    payment_datetime = models.DateTimeField(auto_now_add=True)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'payment_datetime'], name='payment_location_datetime_idx'),
+         models.Index(fields=['employee', 'payment_datetime'], name='payment_employee_datetime_idx'),
+      ]
+
    @property
    def get_external_location(self):
       return self.internal_location.external_location
 
-   @property
-   def get_ordered_menu_items_and_quantities(self):
-      menu_item_orders_at_location = MenuItemOrders.objects.filter(
-         internal_location=self.internal_location, 
-         external_location=self.get_external_location, 
-         order_status='Completed'
-      )
+   # Everything the payment takes from the table's completed orders, worked out once per instance
+   @cached_property
+   def get_settlement(self):
+      from .settlement import completed_orders, settle_orders
 
-      ordered_menu_items_and_quantities = {}
+      return settle_orders(completed_orders(self.internal_location), self.tip_amount_percent, self.service_charge_percent)
 
-      for menu_item_order in menu_item_orders_at_location:
-         orderded_menu_items_and_quantities[menu_item_order.menu_item] = {
-            'quantity': menu_item_order.quantity,
-            'add-ons': [add_on.pk for add_on in menu_item_order.add_ons.all()]
-         }
-      
-      return ordered_menu_items_and_quantities
+   @property
+   def get_ordered_menu_items_and_quantities(self):
+      return self.get_settlement.ordered_menu_items_and_quantities
 
    @property
    def get_name_ordered_menu_items_and_quantities(self):
-      name_menu_items_and_quantities = {}
-
-      for menu_item, info in self.get_ordered_menu_items_and_quantities.items():
-         menu_item = MenuItems.objects.get(pk=menu_item)
-
-         name_menu_items_and_quantities[menu_item.item_name] = {
-            'quantity': info['quantity'],
-            'add-ons': [AddOns.objects.get(pk=add_on).add_on_name for add_on in info['add-ons']]
-         }
-
-      return name_menu_items_and_quantities
+      return self.get_settlement.name_ordered_menu_items_and_quantities
 
    @property
    def calc_total_bill(self):
-      total_bill = 0
-      
-      for menu_item, info in self.get_ordered_menu_items_and_quantities.items():
-         menu_item = MenuItems.objects.get(pk=menu_item)
-         total_bill += menu_item.price * info['quantity']
+      return self.get_settlement.total_bill
 
-         for add_on in info['add-ons']:
-            add_on = AddOns.objects.get(pk=add_on)
-            total_bill += add_on.additional_price * info['quantity']
+   def save_payment_lines(self):
+      from .payment_lines import build_payment_lines
 
-      return (
-         total_bill 
-         + (total_bill * (self.tip_amount_percent / 100)) 
-         + (total_bill * (self.service_charge_percent / 100))
-      )
+      self.lines.all().delete()
+      PaymentLines.objects.bulk_create(build_payment_lines([self]))
 
    def save(self, *args, **kwargs):
+      from .rollups import roll_up_payment
+      from .settlement import record_settlement
+
       self.external_location = self.get_external_location
-      self.ordered_menu_items_and_quantities = self.get_ordered_menu_items_and_quantities
-      self.name_ordered_menu_items_and_quantities = self.get_name_ordered_menu_items_and_quantities
-      self.total_bill = self.calc_total_bill
 
-      super().save(*args, **kwargs)
+      # Only a new payment settles the table; its orders are gone afterwards, so re-saving one keeps what it billed
+      settling = self._state.adding
 
-      menu_item_orders_at_location = MenuItemOrders.objects.filter(
-         internal_location=self.internal_location, 
-         external_location=self.external_location, 
-         order_status='Completed'
-      ).delete()
+      if settling:
+         settlement = self.get_settlement
+         self.ordered_menu_items_and_quantities = settlement.ordered_menu_items_and_quantities
+         self.name_ordered_menu_items_and_quantities = settlement.name_ordered_menu_items_and_quantities
+         self.total_bill = settlement.total_bill
 
-      tip_amount = (
-         abs((self.total_bill * (self.tip_amount_percent / 100)) 
-         - (self.total_bill * (self.service_charge_percent / 100)))
-      )
+      previous_total_bill = Payments.objects.filter(pk=self.pk).values_list('total_bill', flat=True).first() if self.pk else None
 
-      employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee)
-      employee_performance.total_tips_received += tip_amount
-      employee_performance.total_transactions_completed += 1
-      employee_performance.total_sales_handled_amount += self.total_bill
-      employee_performance.save()
+      # The line items are the queryable copy of the JSON above, and the orders, tip and counters move with the
+      # payment; all of it is written or none of it is
+      with transaction.atomic():
+         super().save(*args, **kwargs)
+         self.save_payment_lines()
+         roll_up_payment(self, previous_total_bill or 0)
 
-      EmployeeTipRecords.objects.create(
-         external_location=self.external_location,
-         employee=self.employee,
-         category=self.category,
-         internal_location=self.internal_location,
-         tip_amount=tip_amount,
-         tip_type=self.payment_type,
-         daily_shift_record=DailyShiftRecords.objects.filter(
-            external_location=self.external_location,
-            employee=self.employee,
-            shift_date=self.payment_datetime,
-            punch_in_time__isnull=False,
-            punch_out_time__isnull=True
-         ).pk,
-      )
+         if settling:
+            record_settlement(self, settlement)
+
+
+class PaymentLines(models.Model):
+   external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
+
+   payment = models.ForeignKey(Payments, on_delete=models.CASCADE, related_name='lines')
+   menu_item = models.ForeignKey(MenuItems, on_delete=models.CASCADE)
+   add_on = models.ForeignKey(AddOns, null=True, blank=True, on_delete=models.CASCADE) # Null on the plate line (menu item + its add-ons); set on each add-on's breakdown line under it
+   quantity = models.PositiveIntegerField()
+   unit_price = models.DecimalField(max_digits=10, decimal_places=2) # Price and cost at the time of sale, not today's
+   unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
+   payment_datetime = models.DateTimeField()
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'menu_item'], name='paymentline_location_item_idx'),
+         models.Index(fields=['external_location', 'payment_datetime'], name='paymentline_location_date_idx'),
+      ]
 
 
 # Nutrition and allergen management
@@ -1314,6 +1305,11 @@ class AccountingPeriods(models.Model):
    accounting_period_end = models.DateField()
    added_date = models.DateTimeField(auto_now_add=True)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['accounting_period_start', 'accounting_period_end'], name='accounting_period_range_idx'),
+      ]
+
 
 class InventoryCostReports(models.Model):
    external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
@@ -1334,86 +1330,75 @@ class InventoryCostReports(models.Model):
    total_transfers = models.PositiveIntegerField()
    report_date = models.DateField(auto_now_add=True)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'report_date'], name='costreport_location_date_idx'),
+         models.Index(fields=['external_location', 'accounting_period'], name='costreport_location_period_idx'),
+      ]
+
    @property
+   def get_report_date(self):
+      return self.report_date or date.today()
+
+   @cached_property
    def get_accounting_period(self):
       return AccountingPeriods.objects.filter(
-         accounting_period_start__lte=self.report_date, 
-         accounting_period_end__gte=self.report_date
+         accounting_period_start__lte=self.get_report_date, 
+         accounting_period_end__gte=self.get_report_date
       ).first()
 
-   @property
-   def get_beginning_inventory(self):
-      previous_accounting_period_report = InventoryCostReports.objects.filter(
-         accounting_period__lt=self.get_accounting_period,
-         external_location=self.external_location
-      ).order_by('-accounting_period').first()
+   @cached_property
+   def get_period_totals(self):
+      from .rollups import period_totals
 
-      if previous_accounting_period_report:
-         return previous_accounting_period_report.ending_inventory
+      return period_totals(
+         self.external_location,
+         self.get_accounting_period.accounting_period_start,
+         self.get_accounting_period.accounting_period_end
+      )
 
-      elif self.report_date == self.get_accounting_period.accounting_period_start:
-         return InventoryItems.objects.filter(
-            external_location=self.external_location
-         ).aggregate(Sum('total_value'))['total_value__sum'] or 0
+   @cached_property
+   def get_beginning_inventory(self):
+      from .ledger import location_balance_at
 
-      else:
-         start_of_accounting_period_report = InventoryCostReports.objects.filter(
-            external_location=self.external_location,
-            report_date=self.get_accounting_period.accounting_period_start
-         ).first()
+      return location_balance_at(self.external_location, self.get_accounting_period.accounting_period_start - timedelta(days=1)).value
 
-         if start_of_accounting_period_report:
-            return start_of_accounting_period_report.beginning_inventory
-         else:
-            return None
-
-   @property
+   @cached_property
    def get_ending_inventory(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
-         ending_inventory = InventoryItems.objects.filter(
-            external_location=self.external_location
-         ).aggregate(Sum('total_value'))['total_value__sum'] or 0
+      from .ledger import location_balance_at
 
-         return ending_inventory
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
+         return location_balance_at(self.external_location, self.get_report_date).value
       
       return None
 
-   @property
+   @cached_property
    def get_purchases(self):
-      return Orders.objects.filter(
-         external_location=self.external_location,
-         order_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('total_order_value'))['total_order_value__sum'] or 0
+      return self.get_period_totals['purchases_value']
 
-   @property
+   @cached_property
    def get_total_revenue(self):
-      return Payments.objects.filter(
-         external_location=self.external_location,
-         payment_datetime__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('total_bill'))['total_bill__sum'] or 0
+      return self.get_period_totals['revenue']
 
-   @property
+   @cached_property
    def get_total_inventory_wastage_value(self):
-      return InventoryWasteBin.objects.filter(
-         external_location=self.external_location,
-         waste_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('money_wasted'))['money_wasted__sum'] or 0
+      return self.get_period_totals['wastage_value']
 
-   @property
+   @cached_property
    def calc_theoretical_cogs(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return (self.get_beginning_inventory + self.get_purchases) - self.get_ending_inventory
       
       return None
 
-   @property
+   @cached_property
    def calc_actual_cogs(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return self.calc_theoretical_cogs + self.get_total_inventory_wastage_value
       
       return None
 
-   @property
+   @cached_property
    def calc_current_cogs(self):
       current_inventory_value = InventoryItems.objects.filter(
          external_location=self.external_location
@@ -1425,16 +1410,16 @@ class InventoryCostReports(models.Model):
          + self.get_total_inventory_wastage_value
       )
 
-   @property
+   @cached_property
    def calc_cogs_variance(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return self.calc_actual_cogs - self.calc_theoretical_cogs
 
       return self.calc_current_cogs - (self.calc_current_cogs - self.get_total_inventory_wastage_value)
 
-   @property
+   @cached_property
    def calc_cogs_variance_percent(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return (self.calc_cogs_variance / self.calc_theoretical_cogs) * 100
       
       return (
@@ -1443,28 +1428,35 @@ class InventoryCostReports(models.Model):
          * 100
       )
 
-   @property
+   @cached_property
    def calc_theoretical_gross_profit(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return self.get_total_revenue - self.calc_theoretical_cogs
       
       return self.get_total_revenue - (self.calc_current_cogs - self.get_total_inventory_wastage_value)
 
-   @property
+   @cached_property
    def calc_actual_gross_profit(self):
-      if self.report_date == self.get_accounting_period.accounting_period_end:
+      if self.get_report_date == self.get_accounting_period.accounting_period_end:
          return self.get_total_revenue - self.calc_actual_cogs
 
       return self.get_total_revenue - self.calc_current_cogs
 
-   @property
+   @cached_property
    def get_total_transfers(self):
-      return InventoryTransfers.objects.filter(
-         external_location=self.external_location,
-         transfer_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).count()
+      return self.get_period_totals['transfers']
+
+   # Each figure is worked out once per save; forget them so the next save reads the data as it stands then
+   def reset_calculations(self):
+      for name, attribute in vars(InventoryCostReports).items():
+         if isinstance(attribute, cached_property):
+            self.__dict__.pop(name, None)
 
    def save(self, *args, **kwargs):
+      from .reports import record_variance_faults
+
+      self.reset_calculations()
+
       self.accounting_period = self.get_accounting_period
       self.beginning_inventory = self.get_beginning_inventory
       self.ending_inventory = self.get_ending_inventory
@@ -1482,37 +1474,8 @@ class InventoryCostReports(models.Model):
 
       super().save(*args, **kwargs)
 
-      if self.gross_profit <= 0:
-         location_training_insights = LocationTrainingInsights.objects.get(
-            external_location=self.external_location
-         )
-
-         if not location_training_insights:
-            LocationTrainingInsights.objects.create(
-               external_location=self.external_location,
-               variance_faults=1,
-               suggested_training='TBC', # Use KeplerPro to generate suggestions
-            )
-         else:
-            location_training_insights.variance_faults += 1
-            location_training_insights.suggested_training = 'TBC' # Use KeplerPro to generate suggestions
-            location_training_insights.save()
-      
-      if self.cogs_variance_percent >= 10:
-         location_training_insights = LocationTrainingInsights.objects.get(
-            external_location=self.external_location
-         )
-
-         if not location_training_insights:
-            LocationTrainingInsights.objects.create(
-               external_location=self.external_location,
-               variance_faults=1,
-               suggested_training='TBC', # Use KeplerPro to generate suggestions
-            )
-         else:
-            location_training_insights.variance_faults += 1
-            location_training_insights.suggested_training = 'TBC' # Use KeplerPro to generate suggestions
-            location_training_insights.save()
+      faults = sum([self.actual_gross_profit <= 0, self.cogs_variance_percent >= 10])
+      record_variance_faults(self.external_location, faults)
 
 
 class InventoryUsage(models.Model):
@@ -1538,6 +1501,12 @@ class InventoryUsage(models.Model):
    usage_variance_percent = models.DecimalField(max_digits=10, decimal_places=1)
    report_date = models.DateField(auto_now_add=True)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'inventory_item', 'report_date'], name='usage_location_item_date_idx'),
+         models.Index(fields=['external_location', 'inventory_item', 'accounting_period'], name='usage_location_item_period_idx'),
+      ]
+
    @property
    def get_external_location(self):
       return self.inventory_item.external_location
@@ -1555,108 +1524,66 @@ class InventoryUsage(models.Model):
       return delta.days / 7
 
    @property
-   def get_opening_stock_quantity(self):
-      previous_accounting_period_report = InventoryUsage.objects.filter(
-         accounting_period__lt=self.get_accounting_period,
-         inventory_item=self.inventory_item,
-         external_location=self.external_location
-      ).order_by('-accounting_period').first()
+   def get_period_movements(self):
+      from .ledger import period_movements
 
-      if previous_accounting_period_report:
-         return previous_accounting_period_report.closing_stock_quantity
-
-      elif self.report_date == self.get_accounting_period.accounting_period_start:
-         return InventoryItems.objects.filter(
-            pk=self.inventory_item,
-            external_location=self.external_location
-         ).aggregate(Sum('quantity'))['quantity__sum'] or 0
+      return period_movements(
+         self.external_location,
+         self.get_accounting_period.accounting_period_start,
+         self.get_accounting_period.accounting_period_end,
+         self.inventory_item_id
+      )
 
-      else:
-         start_of_accounting_period_report = InventoryUsage.objects.filter(
-            external_location=self.external_location,
-            inventory_item=self.inventory_item,
-            report_date=self.get_accounting_period.accounting_period_start
-         ).first()
+   @property
+   def get_opening_balance(self):
+      from .ledger import NO_BALANCE, balances_at
 
-         if start_of_accounting_period_report:
-            return start_of_accounting_period_report.opening_stock_quantity
-         else:
-            None
+      opening_date = self.get_accounting_period.accounting_period_start - timedelta(days=1)
+      return balances_at(self.external_location, opening_date, [self.inventory_item_id]).get(self.inventory_item_id, NO_BALANCE)
 
    @property
-   def get_opening_stock_value(self):
-      previous_accounting_period_report = InventoryUsage.objects.filter(
-         accounting_period__lt=self.get_accounting_period,
-         inventory_item=self.inventory_item,
-         external_location=self.external_location
-      ).order_by('-accounting_period').first()
+   def get_closing_balance(self):
+      from .ledger import NO_BALANCE, balances_at
 
-      if previous_accounting_period_report:
-         return previous_accounting_period_report.closing_stock_value
+      return balances_at(self.external_location, self.report_date, [self.inventory_item_id]).get(self.inventory_item_id, NO_BALANCE)
 
-      elif self.report_date == self.get_accounting_period.accounting_period_start:
-         return InventoryItems.objects.filter(
-            pk=self.inventory_item,
-            external_location=self.external_location
-         ).aggregate(Sum('total_value'))['total_value__sum'] or 0
-
-      else:
-         start_of_accounting_period_report = InventoryUsage.objects.filter(
-            external_location=self.external_location,
-            inventory_item=self.inventory_item,
-            report_date=self.get_accounting_period.accounting_period_start
-         ).first()
+   @property
+   def get_opening_stock_quantity(self):
+      return self.get_opening_balance.quantity
 
-         if start_of_accounting_period_report:
-            return start_of_accounting_period_report.opening_stock_value
-         else:
-            return None
+   @property
+   def get_opening_stock_value(self):
+      return self.get_opening_balance.value
 
    @property
    def get_closing_stock_quantity(self):
       if self.report_date == self.get_accounting_period.accounting_period_end:
-         return self.inventory_item.quantity
+         return self.get_closing_balance.quantity
       
       return None
 
    @property
    def get_closing_stock_value(self):
       if self.report_date == self.get_accounting_period.accounting_period_end:
-         return self.inventory_item.total_value
+         return self.get_closing_balance.value
       
       return None
 
    @property 
    def get_purchases_quantity(self):
-      return Orders.objects.filter(
-         external_location=self.external_location,
-         inventory_item=self.inventory_item,
-         order_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('ordered_quantity'))['ordered_quantity__sum'] or 0
+      return self.get_period_movements['Receipt'].quantity
 
    @property
    def get_purchases_value(self):
-      return Orders.objects.filter(
-         external_location=self.external_location,
-         inventory_item=self.inventory_item,
-         order_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('total_order_value'))['total_order_value__sum'] or 0
+      return self.get_period_movements['Receipt'].value
 
    @property
    def get_wasted_quantity(self):
-      return InventoryWasteBin.objects.filter(
-         inventory_item=self.inventory_item,
-         external_location=self.external_location,
-         waste_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('quantity_wasted'))['quantity_wasted__sum'] or 0
+      return -self.get_period_movements['Waste'].quantity
 
    @property
    def get_wasted_value(self):
-      return InventoryWasteBin.objects.filter(
-         inventory_item=self.inventory_item,
-         external_location=self.external_location,
-         waste_date__range=(self.get_accounting_period.accounting_period_start, self.get_accounting_period.accounting_period_end)
-      ).aggregate(Sum('money_wasted'))['money_wasted__sum'] or 0
+      return -self.get_period_movements['Waste'].value
 
    @property
    def calc_theoretical_usage_quantity(self):
@@ -1752,7 +1679,7 @@ class InventoryUsage(models.Model):
    
             par_level = round((weekly_inventory_usage + safety_stock) / deliveries_per_week, 3)
             self.inventory_item.par_level = par_level
-            self.inventory_item.save()
+            InventoryItems.objects.filter(pk=self.inventory_item_id).update(par_level=par_level)
 
 
       if self.usage_variance_percent >= 10:
@@ -1782,25 +1709,21 @@ class InventoryTransfers(models.Model):
    transfer_date = models.DateField()
 
    def save(self, *args, **kwargs):
-      super().save(*args, **kwargs)
+      from .stock import transfer_inventory
 
-      InventoryTransfersInternal.objects.create(
-         source_external_location=self.source_external_location,
-         destination_external_location=self.destination_external_location,
-         inventory_transfer=self.pk
-      )
+      adding = self._state.adding
 
-      inventory_item.quantity -= self.quantity_transferred
-      
-      inventory_item_at_destination_external_location = InventoryItems.objects.get(
-         external_location=destination_external_location,
-         item_name=inventory_item.item_name,
-         item_type=inventory_item.item_type
-      )
-      inventory_item_at_destination_external_location.quantity += self.quantity_transferred
+      with transaction.atomic():
+         super().save(*args, **kwargs)
+
+         if adding:
+            inventory_item_at_destination_external_location = InventoryItems.objects.get(
+               external_location=self.destination_external_location,
+               item_name=self.inventory_item.item_name,
+               item_type=self.inventory_item.item_type
+            )
 
-      inventory_item.save()
-      inventory_item_at_destination_external_location.save()
+            transfer_inventory(self, inventory_item_at_destination_external_location)
 
 
 class InventoryTransfersInternal(models.Model):
@@ -1831,6 +1754,12 @@ class InventoryWasteBin(models.Model):
    employee_reporter = models.ForeignKey(Employees, on_delete=models.CASCADE, related_name='employee_reporter')
    comments = models.TextField()
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'inventory_item', 'waste_date'], name='wastebin_loc_item_date_idx'),
+         models.Index(fields=['external_location', 'waste_date'], name='wastebin_location_date_idx'),
+      ]
+
    @property
    def get_external_location(self):
       return self.inventory_item.external_location
@@ -1840,18 +1769,20 @@ class InventoryWasteBin(models.Model):
       return self.inventory_item.avg_unit_price * self.quantity_wasted
 
    def save(self, *args, **kwargs):
+      from .counters import add_to_performance
+      from .stock import waste_inventory
+
       self.external_location = self.get_external_location
       self.money_wasted = self.calc_money_wasted
-      super().save(*args, **kwargs)
+      adding = self._state.adding
 
-      inventory_item = InventoryItems.objects.get(pk=self.inventory_item)
-      inventory_item.quantity -= self.quantity_wasted
-      inventory_item.total_value -= self.money_wasted
-      inventory_item.save()
+      with transaction.atomic():
+         super().save(*args, **kwargs)
 
-      employee_performance = EmployeesPerformance.objects.get_or_create(employee=self.employee_culprit)
-      employee_performance.total_inventory_waste_count += 1
-      employee_performance.save()
+         if adding:
+            waste_inventory(self)
+
+      add_to_performance(self.employee_culprit_id, total_inventory_waste_count=1)
 
       if self.waste_reason == 'Theft':
          location_training_insights = LocationTrainingInsights.objects.get(
@@ -1870,6 +1801,75 @@ class InventoryWasteBin(models.Model):
             location_training_insights.save()
 
 
+class InventoryMovements(models.Model):
+   MOVEMENT_TYPE_CHOICES = [
+      ('Receipt', 'Receipt'),
+      ('Sale', 'Sale'),
+      ('Waste', 'Waste'),
+      ('Transfer out', 'Transfer out'),
+      ('Transfer in', 'Transfer in'),
+      ('Adjustment', 'Adjustment')
+   ]
+
+   external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
+
+   inventory_item = models.ForeignKey(InventoryItems, on_delete=models.CASCADE, related_name='movements')
+   movement_type = models.CharField(max_length=12, choices=MOVEMENT_TYPE_CHOICES)
+   quantity = models.DecimalField(max_digits=10, decimal_places=3) # Signed: stock in is positive, stock out negative
+   value = models.DecimalField(max_digits=10, decimal_places=2)
+   movement_date = models.DateField(auto_now_add=True)
+
+   # What moved the stock; at most one is set, none for adjustments
+   order_inventory = models.ForeignKey(OrderInventory, null=True, blank=True, on_delete=models.SET_NULL)
+   menu_item_order = models.ForeignKey(MenuItemOrders, null=True, blank=True, on_delete=models.SET_NULL)
+   inventory_waste = models.ForeignKey(InventoryWasteBin, null=True, blank=True, on_delete=models.SET_NULL)
+   inventory_transfer = models.ForeignKey(InventoryTransfers, null=True, blank=True, on_delete=models.SET_NULL)
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'inventory_item', 'movement_date'], name='movement_loc_item_date_idx'),
+         models.Index(fields=['external_location', 'movement_date'], name='movement_location_date_idx'),
+         models.Index(fields=['inventory_item', 'movement_date'], name='movement_item_date_idx'),
+      ]
+
+
+# Each item's closing balance on the last day of an accounting period; reports start from the latest one and read forward
+class InventorySnapshots(models.Model):
+   external_location = models.ForeignKey(ExternalLocations, null=True, blank=True, on_delete=models.CASCADE)
+
+   inventory_item = models.ForeignKey(InventoryItems, on_delete=models.CASCADE, related_name='snapshots')
+   accounting_period = models.ForeignKey(AccountingPeriods, on_delete=models.CASCADE)
+   quantity = models.DecimalField(max_digits=10, decimal_places=3)
+   total_value = models.DecimalField(max_digits=10, decimal_places=2)
+   snapshot_date = models.DateField()
+   added_date = models.DateTimeField(auto_now_add=True)
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['inventory_item', 'snapshot_date'], name='snapshot_item_date_idx'),
+         models.Index(fields=['accounting_period', 'external_location'], name='snapshot_period_location_idx'),
+      ]
+
+
+# Running per-day totals for a location, added to as stock moves and payments land so a period's figures are a sum over
+# at most one row per day
+class DailyLocationRollups(models.Model):
+   external_location = models.ForeignKey(ExternalLocations, on_delete=models.CASCADE)
+
+   rollup_date = models.DateField()
+   purchases_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+   revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+   wastage_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+   transfers = models.PositiveIntegerField(default=0)
+   closing_inventory_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+   last_updated = models.DateTimeField(auto_now=True)
+
+   class Meta:
+      constraints = [
+         models.UniqueConstraint(fields=['external_location', 'rollup_date'], name='rollup_location_date_uniq'),
+      ]
+
+
 # Tip management
 class EmployeeTipRecords(models.Model):
    CATEGORY_CHOICES = [
@@ -1897,6 +1897,11 @@ class EmployeeTipRecords(models.Model):
    tip_date = models.DateTimeField(auto_now_add=True)
    daily_shift_record = models.ForeignKey(DailyShiftRecords, on_delete=models.CASCADE)
 
+   class Meta:
+      indexes = [
+         models.Index(fields=['external_location', 'tip_date'], name='tiprecord_location_date_idx'),
+      ]
+
 
 class TipPoolingRecords(models.Model):
    CALCULATE_OR_SEND_TIPS_CHOICES = [
@@ -1985,3 +1990,82 @@ class EmployeeTipPayouts(models.Model):
       self.tip_per_hour = self.get_tip_per_hour
 
       super().save(*args, **kwargs)
+
+
+# Background jobs
+class ReportJobs(models.Model):
+   JOB_TYPE_CHOICES = [
+      ('Menu engineering report', 'Menu engineering report'),
+      ('Waste analysis', 'Waste analysis'),
+      ('Inventory usage', 'Inventory usage'),
+      ('Inventory cost report', 'Inventory cost report')
+   ]
+
+   STATUS_CHOICES = [
+      ('Queued', 'Queued'),
+      ('Running', 'Running'),
+      ('Succeeded', 'Succeeded'),
+      ('Failed', 'Failed')
+   ]
+
+   external_location = models.ForeignKey(ExternalLocations, on_delete=models.CASCADE)
+
+   job_type = models.CharField(max_length=23, choices=JOB_TYPE_CHOICES)
+   requested_by = models.ForeignKey(Employees, null=True, blank=True, on_delete=models.SET_NULL)
+   status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='Queued')
+   progress = models.PositiveSmallIntegerField(default=0) # Percent done, reported by the job as it goes
+   attempts = models.PositiveSmallIntegerField(default=0)
+   max_attempts = models.PositiveSmallIntegerField(default=3)
+   run_after = models.DateTimeField(default=timezone.now) # Pushed back on each retry
+   worker = models.CharField(max_length=100, blank=True) # Host and pid of the worker running it
+   result = models.JSONField(default=dict, blank=True)
+   error = models.TextField(blank=True)
+   created_date = models.DateTimeField(auto_now_add=True)
+   started_date = models.DateTimeField(null=True, blank=True)
+   finished_date = models.DateTimeField(null=True, blank=True)
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['status', 'run_after'], name='reportjob_status_run_idx'),
+         models.Index(fields=['external_location', 'job_type', 'status'], name='reportjob_loc_type_status_idx'),
+      ]
+
+
+# When each location's reports are queued without anyone clicking Generate; expressions run on the schedule's own clock
+class ReportSchedules(models.Model):
+   external_location = models.ForeignKey(ExternalLocations, on_delete=models.CASCADE)
+
+   job_type = models.CharField(max_length=23, choices=ReportJobs.JOB_TYPE_CHOICES)
+   cron_expression = models.CharField(max_length=100, default='0 3 * * *') # minute hour day-of-month month day-of-week
+   time_zone = models.CharField(max_length=63, default='UTC') # IANA name, e.g. America/Toronto
+   enabled = models.BooleanField(default=True)
+   next_run = models.DateTimeField(null=True, blank=True)
+   last_run = models.DateTimeField(null=True, blank=True)
+   last_job = models.ForeignKey(ReportJobs, null=True, blank=True, on_delete=models.SET_NULL)
+
+   class Meta:
+      indexes = [
+         models.Index(fields=['enabled', 'next_run'], name='reportschedule_due_idx'),
+      ]
+
+   @property
+   def get_schedule(self):
+      from .cron import CronSchedule
+
+      return CronSchedule(self.cron_expression, self.time_zone)
+
+   @property
+   def calc_next_run(self):
+      return self.get_schedule.next_after(timezone.now())
+
+   def clean(self):
+      try:
+         self.get_schedule
+      except KeyError:
+         raise ValidationError({'time_zone': f'Unknown time zone \'{self.time_zone}\''})
+      except ValueError as error:
+         raise ValidationError({'cron_expression': str(error)})
+
+   def save(self, *args, **kwargs):
+      self.next_run = self.calc_next_run
+      super().save(*args, **kwargs)
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.generic import ListView
+
+
+# One page of a keyset walk; there is no page count, only the cursors either side of the rows on screen
+class KeysetPage:
+    def __init__(self, object_list, per_page, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+# Newest-first list pages that seek past the last row seen on (keyset_field, pk) instead of counting and
+# offsetting, so page 500 costs the same as page 1 and the table is never counted
+class KeysetListView(ListView):
+    keyset_field = None # A non-null date/datetime column; pages walk the primary key alone when unset
+    paginate_by = getattr(settings, 'APOS_LIST_PAGE_SIZE', 50)
+    max_paginate_by = getattr(settings, 'APOS_LIST_MAX_PAGE_SIZE', 200)
+    page_size_kwarg = 'page_size'
+    after_kwarg = 'after'
+    before_kwarg = 'before'
+
+    # Per template projections; only the columns and relations the page actually renders are loaded
+    prefetch_plan = None
+    list_only = ()
+    list_defer = ()
+
+    def get_ordering(self):
+        if self.keyset_field:
+            return [f'-{self.keyset_field}', '-pk']
+
+        return ['-pk']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if self.prefetch_plan is not None:
+            queryset = self.prefetch_plan.apply(queryset)
+
+        if self.list_only:
+            queryset = queryset.only(*self.list_only, *([self.keyset_field] if self.keyset_field else []))
+
+        if self.list_defer:
+            queryset = queryset.defer(*self.list_defer)
+
+        return queryset
+
+    def get_paginate_by(self, queryset):
+        try:
+            page_size = int(self.request.GET.get(self.page_size_kwarg, self.paginate_by))
+        except ValueError:
+            page_size = self.paginate_by
+
+        return max(1, min(page_size, self.max_paginate_by))
+
+    def paginate_queryset(self, queryset, page_size):
+        after = self.request.GET.get(self.after_kwarg)
+        before = self.request.GET.get(self.before_kwarg)
+
+        if before:
+            # Walk backwards towards newer rows, then flip the slice back into newest-first order
+            rows = list(queryset.filter(self.seek(queryset, before, newer=True)).reverse()[:page_size + 1])
+            has_newer, has_older = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            if after:
+                queryset = queryset.filter(self.seek(queryset, after, newer=False))
+
+            rows = list(queryset[:page_size + 1])
+            has_newer, has_older = bool(after), len(rows) > page_size
+            rows = rows[:page_size]
+
+        page = KeysetPage(
+            rows,
+            page_size,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_older else None,
+            previous_cursor=self.encode_cursor(rows[0]) if rows and has_newer else None,
+        )
+
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def seek(self, queryset, cursor, newer):
+        value, pk = self.decode_cursor(queryset, cursor)
+        direction = 'gt' if newer else 'lt'
+
+        if not self.keyset_field:
+            return Q(**{f'pk__{direction}': pk})
+
+        return Q(**{f'{self.keyset_field}__{direction}': value}) | Q(**{self.keyset_field: value, f'pk__{direction}': pk})
+
+    def encode_cursor(self, row):
+        value = getattr(row, self.keyset_field).isoformat() if self.keyset_field else ''
+        return urlsafe_base64_encode(force_bytes(f'{row.pk}|{value}'))
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            pk, value = force_str(urlsafe_base64_decode(cursor)).split('|', 1)
+            pk = queryset.model._meta.pk.to_python(pk)
+
+            if self.keyset_field:
+                value = queryset.model._meta.get_field(self.keyset_field).to_python(value)
+
+        except (ValueError, ValidationError):
+            raise Http404('Invalid page.')
+
+        return value, pk
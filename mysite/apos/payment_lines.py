@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from .costing import recipe_costs
+from .models import AddOns, MenuItems, PaymentLines
+
+
+CENTS = Decimal('0.01')
+
+
+# Add-ons with the number of plates they were on; payments settled before that was recorded only kept which add-ons the
+# menu item had, so each is taken to have been on every plate
+def _ordered_menu_items(payment):
+    for menu_item, info in (payment.ordered_menu_items_and_quantities or {}).items():
+        if 'add-on quantities' in info:
+            add_ons = {int(add_on): quantity for add_on, quantity in info['add-on quantities'].items()}
+        else:
+            add_ons = {int(add_on): info['quantity'] for add_on in info.get('add-ons', [])}
+
+        yield int(menu_item), info, add_ons
+
+
+# Unsaved line items for a batch of payments, priced with three queries however many payments there are.
+# The plate line uses the price and cost frozen on the order when it went 'In Progress'; payments taken before
+# orders carried a snapshot are priced at today's costs. Menu items or add-ons deleted since the sale are skipped
+def build_payment_lines(payments):
+    menu_item_ids, add_on_ids = set(), set()
+
+    for payment in payments:
+        for menu_item, _, add_ons in _ordered_menu_items(payment):
+            menu_item_ids.add(menu_item)
+            add_on_ids.update(add_ons)
+
+    menu_items = {
+        pk: (price, recipe_id)
+        for pk, price, recipe_id in MenuItems.objects.filter(pk__in=menu_item_ids).values_list('pk', 'price', 'recipe_id')
+    }
+    add_on_prices = {
+        pk: (additional_price, additional_ingredient_costs)
+        for pk, additional_price, additional_ingredient_costs in AddOns.objects.filter(
+            pk__in=add_on_ids
+        ).values_list('pk', 'additional_price', 'additional_ingredient_costs')
+    }
+    ingredient_costs = recipe_costs({recipe_id for _, recipe_id in menu_items.values()})
+
+    lines = []
+
+    for payment in payments:
+        for menu_item, info, add_ons in _ordered_menu_items(payment):
+            if menu_item not in menu_items or not info['quantity']:
+                continue
+
+            price, recipe_id = menu_items[menu_item]
+            line = dict(
+                external_location_id=payment.external_location_id,
+                payment_id=payment.pk,
+                menu_item_id=menu_item,
+                quantity=info['quantity'],
+                payment_datetime=payment.payment_datetime,
+            )
+            add_on_lines = [
+                PaymentLines(
+                    **{**line, 'quantity': quantity},
+                    add_on_id=add_on, unit_price=add_on_prices[add_on][0], unit_cost=add_on_prices[add_on][1],
+                )
+                for add_on, quantity in add_ons.items() if add_on in add_on_prices and quantity
+            ]
+
+            if 'unit_cost' in info:
+                unit_price, unit_cost = Decimal(info['unit_price']), Decimal(info['unit_cost'])
+            else:
+                # Add-ons on only some of the plates are spread over all of them
+                unit_price = price + sum(add_on_line.unit_price * add_on_line.quantity for add_on_line in add_on_lines) / info['quantity']
+                unit_cost = ingredient_costs[recipe_id] + sum(add_on_line.unit_cost * add_on_line.quantity for add_on_line in add_on_lines) / info['quantity']
+
+            lines.append(PaymentLines(**line, unit_price=unit_price.quantize(CENTS), unit_cost=unit_cost.quantize(CENTS)))
+            lines.extend(add_on_lines)
+
+    return lines
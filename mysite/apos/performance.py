@@ -0,0 +1,145 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Abs
+from django.db.models.lookups import GreaterThan
+
+from .cache import TieredCache, build_cache
+from .counters import COUNTER_FIELDS
+from .models import BreakRecords, DailyShiftRecords, InventoryWasteBin, Payments, Requests, WeeklyShiftRecords
+
+
+ZERO = Decimal('0')
+
+# DailyShiftRecords.save marks a punch-in more than this after the scheduled start as late
+LATE_AFTER = timedelta(minutes=7)
+
+# time - time is the one piece of clock arithmetic every backend (SQLite included) can do in SQL
+LATE = GreaterThan(
+    ExpressionWrapper(F('punch_in_time') - F('shift_scheduling__start_time'), output_field=DurationField()),
+    LATE_AFTER,
+)
+
+TIP = ExpressionWrapper(
+    Abs(F('total_bill') * (F('tip_amount_percent') - F('service_charge_percent')) / 100),
+    output_field=DecimalField(max_digits=14, decimal_places=4),
+)
+
+
+# Keyed by employee id; nothing invalidates entries, TIMEOUT alone bounds how stale a derived row can be
+class DerivedPerformanceCache(TieredCache):
+    key_prefix = 'apos:derived-performance:'
+    generation_key = 'apos:derived-performance-generation'
+
+
+derived_performance_cache = build_cache(DerivedPerformanceCache, 'APOS_DERIVED_PERFORMANCE_CACHE')
+
+
+def _zeroed():
+    return {name: ZERO if field.get_internal_type() == 'DecimalField' else 0 for name, field in COUNTER_FIELDS.items()}
+
+
+# Each source table summed per employee in one grouped query over its employee index
+def _derived_rows(employee_ids):
+    return [
+        DailyShiftRecords.objects.filter(employee__in=employee_ids).values('employee').annotate(
+            total_hours_worked=Sum('total_hours_worked'),
+            late_to_work_count=Count('pk', filter=LATE),
+            missed_work_days_count=Count('pk', filter=Q(status='Missed')),
+            uncompleted_shift_count=Count('pk', filter=Q(status='Uncompleted')),
+        ),
+        WeeklyShiftRecords.objects.filter(employee__in=employee_ids).values('employee').annotate(
+            total_earnings=Sum('earnings_this_week'),
+            total_overtime_hours_worked=Sum('overtime_hours_worked'),
+        ),
+        BreakRecords.objects.filter(employee__in=employee_ids).values('employee').annotate(
+            total_breaks_taken=Count('pk'),
+            total_break_time=Sum('break_duration'),
+        ),
+        Payments.objects.filter(employee__in=employee_ids).values('employee').annotate(
+            total_transactions_completed=Count('pk'),
+            total_sales_handled_amount=Sum('total_bill'),
+            total_tips_received=Sum(TIP),
+        ),
+        Requests.objects.filter(employee_requestor__in=employee_ids).values(employee=F('employee_requestor')).annotate(
+            requests_created=Count('pk'),
+        ),
+        InventoryWasteBin.objects.filter(employee_culprit__in=employee_ids).values(employee=F('employee_culprit')).annotate(
+            total_inventory_waste_count=Count('pk'),
+        ),
+    ]
+
+
+# What every EmployeesPerformance counter would read if it were worked out from the records themselves rather than
+# bumped by each save(); six queries for any number of employees
+def derive_performance(employee_ids):
+    employee_ids = list(employee_ids)
+    performance = {employee: _zeroed() for employee in employee_ids}
+
+    if not employee_ids:
+        return performance
+
+    for rows in _derived_rows(employee_ids):
+        for row in rows.order_by():
+            employee = row.pop('employee')
+
+            performance[employee].update((name, value) for name, value in row.items() if value is not None)
+
+    # Rounded to the columns' own places so derived and stored values compare equal
+    for counters in performance.values():
+        for name, field in COUNTER_FIELDS.items():
+            if field.get_internal_type() == 'DecimalField':
+                counters[name] = Decimal(str(counters[name])).quantize(Decimal(1).scaleb(-field.decimal_places))
+
+    return performance
+
+
+# Cached employees cost nothing and the rest share one derive_performance call
+def derived_performance(employee_ids):
+    performance = {}
+    missing = []
+
+    for employee in set(employee_ids):
+        cached = derived_performance_cache.get(employee)
+
+        if cached is None:
+            missing.append(employee)
+        else:
+            performance[employee] = cached
+
+    for employee, counters in derive_performance(missing).items():
+        derived_performance_cache.set(employee, counters)
+        performance[employee] = counters
+
+    return performance
+
+
+# Swaps the stored counters on already-loaded EmployeesPerformance rows for derived ones, in place
+def apply_derived_performance(rows):
+    rows = list(rows)
+    performance = derived_performance(row.employee_id for row in rows)
+
+    for row in rows:
+        for name, value in performance[row.employee_id].items():
+            setattr(row, name, value)
+
+    return rows
+
+
+# Counters whose stored value differs from the derived one, as {employee id: {counter: (stored, derived)}}
+def performance_differences(rows):
+    rows = list(rows)
+    performance = derive_performance(row.employee_id for row in rows)
+    differences = {}
+
+    for row in rows:
+        changed = {
+            name: (getattr(row, name), value)
+            for name, value in performance[row.employee_id].items() if getattr(row, name) != value
+        }
+
+        if changed:
+            differences[row.employee_id] = changed
+
+    return differences
@@ -0,0 +1,76 @@
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+
+# The relations a list template renders for every row; joined or batch loaded up front so a page costs
+# the same number of queries at 1 row as at 500
+class PrefetchPlan:
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+
+        return queryset
+
+    def validate(self, model):
+        errors = []
+
+        for lookup in self.select_related:
+            errors += self._validate_lookup(model, lookup, single_valued=True)
+
+        for lookup in self.prefetch_related:
+            if isinstance(lookup, Prefetch):
+                lookup = lookup.prefetch_through
+
+            errors += self._validate_lookup(model, lookup, single_valued=False)
+
+        return errors
+
+    def _validate_lookup(self, model, lookup, single_valued):
+        current = model
+
+        for part in lookup.split('__'):
+            try:
+                field = current._meta.get_field(part)
+            except FieldDoesNotExist:
+                return [f'\'{lookup}\' is not a relation of {model.__name__} ({current.__name__} has no \'{part}\')']
+
+            if not field.is_relation:
+                return [f'\'{lookup}\' is not a relation of {model.__name__} (\'{part}\' is a plain field)']
+
+            if single_valued and (field.many_to_many or field.one_to_many):
+                return [f'\'{lookup}\' is multi-valued and belongs in prefetch_related, not select_related']
+
+            current = field.related_model
+
+        return []
+
+
+def _list_views(view_class):
+    for subclass in view_class.__subclasses__():
+        yield subclass
+        yield from _list_views(subclass)
+
+
+@checks.register()
+def check_prefetch_plans(app_configs, **kwargs):
+    from .pagination import KeysetListView
+    from . import views
+
+    errors = []
+
+    for view in _list_views(KeysetListView):
+        if view.prefetch_plan is None or view.model is None:
+            continue
+
+        for message in view.prefetch_plan.validate(view.model):
+            errors.append(checks.Error(f'{view.__name__}.prefetch_plan: {message}', obj=view, id='apos.E001'))
+
+    return errors
@@ -0,0 +1,401 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Q, Sum
+
+from .ledger import NO_BALANCE, balances_at, period_movements_by_item
+from .models import (
+    AccountingPeriods, DailyLocationRollups, ExternalLocations, InventoryItems, InventoryMovements, InventoryUsage,
+    LocationTrainingInsights, MenuEngineeringReports, MenuItems, PaymentLines, WasteAnalysis, WasteRecords
+)
+
+
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+THOUSANDTHS = Decimal('0.001')
+TENTHS = Decimal('0.1')
+
+
+def _line_total(column):
+    return Sum(F('quantity') * F(column), output_field=DecimalField(max_digits=14, decimal_places=2), default=ZERO)
+
+
+# Units sold, revenue and COGS per menu item, summed by the database over the plate lines of the location's payments;
+# each plate line already includes its add-ons at the price and cost frozen when it was ordered
+def menu_item_totals(external_location):
+    rows = PaymentLines.objects.filter(external_location=external_location, add_on__isnull=True).values('menu_item').annotate(
+        number_sold=Sum('quantity', default=0),
+        total_revenue=_line_total('unit_price'),
+        total_cogs=_line_total('unit_cost'),
+    ).order_by()
+
+    return {row['menu_item']: (row['number_sold'], row['total_revenue'], row['total_cogs']) for row in rows}
+
+
+# Report generators take an optional progress(percent) callback (the report job queue passes one); a loop over n items
+# reports its share of the span between start and end as it goes
+def report_progress(progress, done, total, start=0, end=100):
+    if progress is not None and total:
+        progress(start + (end - start) * done // total)
+
+
+# Star/Puzzle/Plow horse/Dog against the averages of the whole menu; anything sitting exactly on an average can't be classified
+def classify(number_sold, gross_profit, avg_number_sold, avg_gross_profit):
+    if number_sold == avg_number_sold or gross_profit == avg_gross_profit:
+        return 'Insufficient data'
+
+    if number_sold > avg_number_sold:
+        return 'Star' if gross_profit > avg_gross_profit else 'Plow horse'
+
+    return 'Puzzle' if gross_profit > avg_gross_profit else 'Dog'
+
+
+def build_menu_engineering_reports(external_location, progress=None):
+    menu_items = list(MenuItems.objects.filter(external_location=external_location).values_list('pk', flat=True))
+
+    if not menu_items:
+        return []
+
+    sales = menu_item_totals(external_location)
+    totals = {menu_item: sales.get(menu_item, (0, ZERO, ZERO)) for menu_item in menu_items}
+    report_progress(progress, 1, 1, 0, 40)
+
+    avg_number_sold = Decimal(sum(number_sold for number_sold, _, _ in totals.values())) / len(totals)
+    avg_gross_profit = sum(revenue - cogs for _, revenue, cogs in totals.values()) / len(totals)
+
+    reports = []
+
+    for done, (menu_item, (number_sold, total_revenue, total_cogs)) in enumerate(totals.items(), 1):
+        gross_profit = total_revenue - total_cogs
+
+        reports.append(MenuEngineeringReports(
+            external_location=external_location,
+            menu_item_id=menu_item,
+            total_revenue=total_revenue.quantize(CENTS),
+            total_cogs=total_cogs.quantize(CENTS),
+            gross_profit=gross_profit.quantize(CENTS),
+            number_sold=number_sold,
+            matrix=classify(number_sold, gross_profit, avg_number_sold, avg_gross_profit),
+        ))
+        report_progress(progress, done, len(totals), 40, 90)
+
+    return reports
+
+
+def generate_menu_engineering_reports(external_location, progress=None):
+    reports = build_menu_engineering_reports(external_location, progress)
+
+    with transaction.atomic():
+        return MenuEngineeringReports.objects.bulk_create(reports)
+
+
+def _percent(numerator, denominator):
+    return (numerator / denominator * 100).quantize(TENTHS) if denominator else ZERO
+
+
+def accounting_period_on(report_date):
+    return AccountingPeriods.objects.filter(
+        accounting_period_start__lte=report_date,
+        accounting_period_end__gte=report_date
+    ).first()
+
+
+# One InventoryUsage per item at the location for today, with the same figures InventoryUsage.save works out one item at
+# a time: opening balances, this period's ledger totals and closing balances are each read once for the whole location
+def build_inventory_usage_reports(external_location, accounting_period, progress=None):
+    report_date = date.today()
+    start, end = accounting_period.accounting_period_start, accounting_period.accounting_period_end
+    at_period_end = report_date == end
+
+    inventory_items = InventoryItems.objects.filter(external_location=external_location).only(
+        'pk', 'external_location', 'quantity', 'total_value', 'safety_stock', 'deliveries_per_week'
+    )
+
+    opening = balances_at(external_location, start - timedelta(days=1))
+    closing = balances_at(external_location, report_date) if at_period_end else {}
+    movements = period_movements_by_item(external_location, start, end)
+    report_progress(progress, 1, 1, 0, 40)
+
+    inventory_items = list(inventory_items)
+    reports = []
+
+    for done, inventory_item in enumerate(inventory_items, 1):
+        opening_quantity, opening_value = opening.get(inventory_item.pk, NO_BALANCE)
+        purchases = movements[inventory_item.pk]['Receipt']
+        waste = movements[inventory_item.pk]['Waste']
+        wasted_quantity, wasted_value = -waste.quantity, -waste.value
+
+        current_usage_quantity = opening_quantity + purchases.quantity - inventory_item.quantity + wasted_quantity
+        current_usage_value = opening_value + purchases.value - inventory_item.total_value + wasted_value
+
+        report = InventoryUsage(
+            external_location=external_location,
+            inventory_item=inventory_item,
+            accounting_period=accounting_period,
+            opening_stock_quantity=opening_quantity,
+            opening_stock_value=opening_value,
+            purchases_quantity=purchases.quantity,
+            purchases_value=purchases.value,
+            wasted_quantity=wasted_quantity,
+            wasted_value=wasted_value,
+            current_usage_quantity=current_usage_quantity.quantize(THOUSANDTHS),
+            current_usage_value=current_usage_value.quantize(CENTS),
+            report_date=report_date,
+        )
+
+        if at_period_end:
+            closing_quantity, closing_value = closing.get(inventory_item.pk, NO_BALANCE)
+            theoretical_usage_quantity = opening_quantity + purchases.quantity - closing_quantity
+            theoretical_usage_value = opening_value + purchases.value - closing_value
+
+            report.closing_stock_quantity = closing_quantity
+            report.closing_stock_value = closing_value
+            report.theoretical_usage_quantity = theoretical_usage_quantity.quantize(THOUSANDTHS)
+            report.theoretical_usage_value = theoretical_usage_value.quantize(CENTS)
+            report.actual_usage_quantity = (theoretical_usage_quantity + wasted_quantity).quantize(THOUSANDTHS)
+            report.actual_usage_value = (theoretical_usage_value + wasted_value).quantize(CENTS)
+            report.usage_variance = report.actual_usage_quantity - report.theoretical_usage_quantity
+            report.usage_variance_percent = _percent(report.usage_variance, report.theoretical_usage_quantity)
+        else:
+            report.usage_variance = wasted_quantity
+            report.usage_variance_percent = _percent(wasted_quantity, current_usage_quantity - wasted_quantity)
+
+        reports.append(report)
+        report_progress(progress, done, len(inventory_items), 40, 90)
+
+    return reports
+
+
+# On each whole week into the period, par level = (average weekly usage + safety stock) / deliveries per week
+def par_level_updates(reports, accounting_period):
+    days = (date.today() - accounting_period.accounting_period_start).days
+
+    if days < 7 or days % 7:
+        return []
+
+    inventory_items = []
+
+    for report in reports:
+        inventory_item = report.inventory_item
+
+        if inventory_item.deliveries_per_week:
+            weekly_inventory_usage = report.current_usage_quantity / (days // 7)
+            inventory_item.par_level = round((weekly_inventory_usage + inventory_item.safety_stock) / inventory_item.deliveries_per_week, 3)
+            inventory_items.append(inventory_item)
+
+    return inventory_items
+
+
+def record_variance_faults(external_location, faults):
+    if not faults:
+        return
+
+    updated = LocationTrainingInsights.objects.filter(external_location=external_location).update(
+        variance_faults=F('variance_faults') + faults,
+        suggested_training='TBC', # Use KeplerPro to generate suggestions
+    )
+
+    if not updated:
+        LocationTrainingInsights.objects.create(
+            external_location=external_location,
+            variance_faults=faults,
+            suggested_training='TBC', # Use KeplerPro to generate suggestions
+        )
+
+
+def generate_inventory_usage_reports(external_location, progress=None):
+    accounting_period = accounting_period_on(date.today())
+
+    if accounting_period is None:
+        return []
+
+    reports = build_inventory_usage_reports(external_location, accounting_period, progress)
+
+    with transaction.atomic():
+        InventoryUsage.objects.bulk_create(reports)
+
+        # Only par_level is written, so stock moved by a terminal meanwhile is left alone
+        InventoryItems.objects.bulk_update(par_level_updates(reports, accounting_period), ['par_level'])
+
+        record_variance_faults(external_location, sum(1 for report in reports if report.usage_variance_percent >= 10))
+
+    return reports
+
+
+# One location's column in the region comparison; ending_inventory is only known once the period has closed
+LocationCostSummary = namedtuple('LocationCostSummary', [
+    'external_location', 'beginning_inventory', 'purchases', 'revenue', 'wastage', 'transfers', 'sales_usage',
+    'current_inventory', 'ending_inventory', 'current_cogs', 'gross_profit', 'cogs_percent', 'wastage_percent',
+])
+
+
+def _location_cost_summary(external_location, beginning_inventory, purchases, revenue, wastage, transfers, sales_usage,
+                           current_inventory, ending_inventory):
+    current_cogs = beginning_inventory + purchases - current_inventory + wastage
+
+    return LocationCostSummary(
+        external_location=external_location,
+        beginning_inventory=beginning_inventory,
+        purchases=purchases,
+        revenue=revenue,
+        wastage=wastage,
+        transfers=transfers,
+        sales_usage=sales_usage,
+        current_inventory=current_inventory,
+        ending_inventory=ending_inventory,
+        current_cogs=current_cogs,
+        gross_profit=revenue - current_cogs,
+        cogs_percent=_percent(current_cogs, revenue),
+        wastage_percent=_percent(wastage, current_cogs),
+    )
+
+
+# Cost figures for every location in the region side by side, from grouped aggregates over the daily rollups,
+# inventory balances and ledger (four queries however many locations there are) plus a region total
+def consolidated_region_report(region_location, accounting_period):
+    start, end = accounting_period.accounting_period_start, accounting_period.accounting_period_end
+    period_closed = end < date.today()
+
+    locations = list(ExternalLocations.objects.filter(region_location=region_location).order_by('location_name'))
+
+    rollups = {
+        row['external_location']: row for row in DailyLocationRollups.objects.filter(
+            external_location__in=locations, rollup_date__range=(start, end)
+        ).values('external_location').annotate(
+            purchases=Sum('purchases_value'), revenue=Sum('revenue'), wastage=Sum('wastage_value'), transfers=Sum('transfers')
+        ).order_by()
+    }
+
+    current = dict(InventoryItems.objects.filter(external_location__in=locations).values('external_location').annotate(
+        total=Sum('total_value')
+    ).order_by().values_list('external_location', 'total'))
+
+    # Balances on earlier days are today's balance less what has moved since
+    moved = {
+        row['external_location']: row for row in InventoryMovements.objects.filter(
+            external_location__in=locations, movement_date__gte=start
+        ).values('external_location').annotate(
+            since_start=Sum('value', default=ZERO),
+            after_end=Sum('value', filter=Q(movement_date__gt=end), default=ZERO),
+            sales=Sum('value', filter=Q(movement_type='Sale', movement_date__lte=end), default=ZERO),
+        ).order_by()
+    }
+
+    no_rollup = {'purchases': ZERO, 'revenue': ZERO, 'wastage': ZERO, 'transfers': 0}
+    no_movements = {'since_start': ZERO, 'after_end': ZERO, 'sales': ZERO}
+
+    summaries = []
+
+    for external_location in locations:
+        rollup = rollups.get(external_location.pk, no_rollup)
+        movements = moved.get(external_location.pk, no_movements)
+        current_inventory = current.get(external_location.pk) or ZERO
+
+        summaries.append(_location_cost_summary(
+            external_location,
+            beginning_inventory=current_inventory - movements['since_start'],
+            purchases=rollup['purchases'],
+            revenue=rollup['revenue'],
+            wastage=rollup['wastage'],
+            transfers=rollup['transfers'],
+            sales_usage=-movements['sales'],
+            current_inventory=current_inventory,
+            ending_inventory=current_inventory - movements['after_end'] if period_closed else None,
+        ))
+
+    def total_of(field, start=ZERO):
+        return sum((getattr(summary, field) for summary in summaries), start)
+
+    total = _location_cost_summary(
+        None,
+        beginning_inventory=total_of('beginning_inventory'),
+        purchases=total_of('purchases'),
+        revenue=total_of('revenue'),
+        wastage=total_of('wastage'),
+        transfers=total_of('transfers', 0),
+        sales_usage=total_of('sales_usage'),
+        current_inventory=total_of('current_inventory'),
+        ending_inventory=total_of('ending_inventory') if period_closed else None,
+    )
+
+    return summaries, total
+
+
+# Most frequent reason wins; ties go to whichever reason comes first in the choices so reruns agree
+def most_common_waste_reason(reason_counts):
+    if not reason_counts:
+        return 'Insufficient data'
+
+    order = {reason: position for position, (reason, _) in enumerate(WasteRecords.WASTE_REASON_CHOICES)}
+    return max(reason_counts, key=lambda reason: (reason_counts[reason], -order.get(reason, len(order))))
+
+
+# Menu items whose waste has been recorded since their latest analysis, or that have never been analysed. Dates are
+# whole days, so waste logged on the day of the last analysis counts as new
+def menu_items_with_new_waste(external_location):
+    last_analysed = dict(WasteAnalysis.objects.filter(menu_item__external_location=external_location).values('menu_item').annotate(
+        last=Max('analysis_date')
+    ).order_by().values_list('menu_item', 'last'))
+
+    last_wasted = WasteRecords.objects.filter(menu_item__external_location=external_location).values('menu_item').annotate(
+        last=Max('date_wasted')
+    ).order_by().values_list('menu_item', 'last')
+
+    menu_items = MenuItems.objects.filter(external_location=external_location).values_list('pk', flat=True)
+
+    changed = {menu_item for menu_item, last in last_wasted if menu_item not in last_analysed or last >= last_analysed[menu_item]}
+    return changed | {menu_item for menu_item in menu_items if menu_item not in last_analysed}
+
+
+# Total weight and most common reason for each of the location's menu items, from one query grouped by item and reason
+def build_waste_analysis(external_location, menu_items=None, progress=None):
+    if menu_items is None:
+        menu_items = MenuItems.objects.filter(external_location=external_location).values_list('pk', flat=True)
+
+    menu_items = list(menu_items)
+
+    if not menu_items:
+        return []
+
+    rows = WasteRecords.objects.filter(menu_item__in=menu_items).values('menu_item', 'waste_reason').annotate(
+        weight=Sum('weight_wasted'), count=Count('pk')
+    ).order_by()
+
+    weights = dict.fromkeys(menu_items, ZERO)
+    reason_counts = {menu_item: {} for menu_item in menu_items}
+
+    for row in rows:
+        weights[row['menu_item']] += row['weight']
+        reason_counts[row['menu_item']][row['waste_reason']] = row['count']
+
+    report_progress(progress, 1, 1, 20, 50)
+    analyses = []
+
+    for done, menu_item in enumerate(menu_items, 1):
+        analyses.append(WasteAnalysis(
+            external_location=external_location,
+            menu_item_id=menu_item,
+            total_weight_wasted=weights[menu_item].quantize(CENTS),
+            most_common_waste_reason=most_common_waste_reason(reason_counts[menu_item]),
+        ))
+        report_progress(progress, done, len(menu_items), 50, 90)
+
+    return analyses
+
+
+# Analyses only the menu items with waste recorded since their last analysis (all of them once the analyses have been
+# deleted); an item analysed again on the same day replaces that day's row rather than adding a second one
+def generate_waste_analysis(external_location, progress=None):
+    menu_items = menu_items_with_new_waste(external_location)
+    report_progress(progress, 1, 1, 0, 20)
+
+    analyses = build_waste_analysis(external_location, menu_items, progress)
+
+    with transaction.atomic():
+        WasteAnalysis.objects.filter(
+            menu_item__in=[analysis.menu_item_id for analysis in analyses], analysis_date=date.today()
+        ).delete()
+
+        return WasteAnalysis.objects.bulk_create(analyses)
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyLocationRollups, InventoryItems, InventoryMovements, Payments
+
+
+ZERO = Decimal('0')
+
+TRANSFER_MOVEMENTS = ('Transfer out', 'Transfer in')
+
+
+def _inventory_value(external_location_id):
+    return InventoryItems.objects.filter(external_location=external_location_id).aggregate(
+        total=Sum('total_value', default=ZERO)
+    )['total']
+
+
+# Adds to the location's row for the day with F() expressions, so concurrent writers each land their share. The day's
+# first writer opens the row with the location's inventory value as it stands, which already includes its own change
+def add_to_daily_rollup(external_location_id, rollup_date, purchases_value=ZERO, revenue=ZERO, wastage_value=ZERO,
+                        transfers=0, inventory_value_change=ZERO):
+    deltas = {
+        'purchases_value': purchases_value,
+        'revenue': revenue,
+        'wastage_value': wastage_value,
+        'transfers': transfers,
+        'closing_inventory_value': inventory_value_change,
+    }
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+
+    if not changes or external_location_id is None:
+        return
+
+    rollups = DailyLocationRollups.objects.filter(external_location=external_location_id, rollup_date=rollup_date)
+
+    if rollups.update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            DailyLocationRollups.objects.create(
+                external_location_id=external_location_id,
+                rollup_date=rollup_date,
+                purchases_value=purchases_value,
+                revenue=revenue,
+                wastage_value=wastage_value,
+                transfers=transfers,
+                closing_inventory_value=_inventory_value(external_location_id),
+            )
+    except IntegrityError:
+        # Another writer opened the row between our update and insert
+        rollups.update(**changes)
+
+
+# Folds a batch of ledger movements into their locations' rows for the day they were recorded
+def roll_up_movements(movements):
+    totals = defaultdict(lambda: {'purchases_value': ZERO, 'wastage_value': ZERO, 'transfers': 0, 'inventory_value_change': ZERO})
+
+    for movement in movements:
+        location = totals[movement.external_location_id, movement.movement_date]
+        location['inventory_value_change'] += movement.value
+
+        if movement.movement_type == 'Receipt':
+            location['purchases_value'] += movement.value
+        elif movement.movement_type == 'Waste':
+            location['wastage_value'] -= movement.value
+        elif movement.movement_type in TRANSFER_MOVEMENTS:
+            location['transfers'] += 1
+
+    for (external_location_id, rollup_date), deltas in totals.items():
+        add_to_daily_rollup(external_location_id, rollup_date, **deltas)
+
+
+def roll_up_payment(payment, previous_total_bill=ZERO):
+    add_to_daily_rollup(
+        payment.external_location_id,
+        timezone.localdate(payment.payment_datetime),
+        revenue=payment.total_bill - previous_total_bill,
+    )
+
+
+# Purchases, revenue, wastage and transfers between start and end inclusive, summed over at most one row per day
+def period_totals(external_location, start, end):
+    return DailyLocationRollups.objects.filter(external_location=external_location, rollup_date__range=(start, end)).aggregate(
+        purchases_value=Sum('purchases_value', default=ZERO),
+        revenue=Sum('revenue', default=ZERO),
+        wastage_value=Sum('wastage_value', default=ZERO),
+        transfers=Sum('transfers', default=0),
+    )
+
+
+# Recomputes the location's rows from the ledger and payments, for data recorded before rollups existed or to
+# reconcile after a bulk fix. Closing values walk back from today's inventory value through each day's net change
+def rebuild_daily_rollups(external_location, since=None):
+    movements = InventoryMovements.objects.filter(external_location=external_location)
+    payments = Payments.objects.filter(external_location=external_location)
+    rollups = DailyLocationRollups.objects.filter(external_location=external_location)
+
+    if since is not None:
+        movements = movements.filter(movement_date__gte=since)
+        payments = payments.annotate(payment_date=TruncDate('payment_datetime')).filter(payment_date__gte=since)
+        rollups = rollups.filter(rollup_date__gte=since)
+
+    days = defaultdict(lambda: {'purchases_value': ZERO, 'revenue': ZERO, 'wastage_value': ZERO, 'transfers': 0, 'change': ZERO})
+
+    for row in movements.values('movement_date', 'movement_type').annotate(value=Sum('value'), count=Count('pk')).order_by():
+        day = days[row['movement_date']]
+        day['change'] += row['value']
+
+        if row['movement_type'] == 'Receipt':
+            day['purchases_value'] += row['value']
+        elif row['movement_type'] == 'Waste':
+            day['wastage_value'] -= row['value']
+        elif row['movement_type'] in TRANSFER_MOVEMENTS:
+            day['transfers'] += row['count']
+
+    for row in payments.values(day=TruncDate('payment_datetime')).annotate(revenue=Sum('total_bill')).order_by():
+        days[row['day']]['revenue'] += row['revenue']
+
+    closing_inventory_value = _inventory_value(external_location.pk)
+    rows = []
+
+    for rollup_date in sorted(days, reverse=True):
+        day = days[rollup_date]
+
+        rows.append(DailyLocationRollups(
+            external_location=external_location,
+            rollup_date=rollup_date,
+            purchases_value=day['purchases_value'],
+            revenue=day['revenue'],
+            wastage_value=day['wastage_value'],
+            transfers=day['transfers'],
+            closing_inventory_value=closing_inventory_value,
+        ))
+
+        closing_inventory_value -= day['change']
+
+    with transaction.atomic():
+        rollups.delete()
+        return DailyLocationRollups.objects.bulk_create(rows)
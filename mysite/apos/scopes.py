@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from django.db.models import Q
+
+from .models import *
+
+
+# The columns that make a row visible to an employee; only the columns a model actually has are declared,
+# so each list view compiles down to a handful of indexed equality checks instead of a 15-way OR
+ModelScope = namedtuple('ModelScope', [
+    'identifier_fields',
+    'region_fields',
+    'location_fields',
+    'employee_fields',
+], defaults=((), (), (), ()))
+
+
+MODEL_SCOPES = {
+    # Location management
+    RegionLocations: ModelScope(identifier_fields=('unique_identifier',)),
+    ExternalLocations: ModelScope(region_fields=('region_location',)),
+    InternalLocations: ModelScope(location_fields=('external_location',)),
+    LocationTrainingInsights: ModelScope(location_fields=('external_location',)),
+
+    # Employee management
+    Employees: ModelScope(identifier_fields=('unique_identifier',), region_fields=('region_location',), location_fields=('external_location',)),
+    EmployeesPerformance: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    Requests: ModelScope(location_fields=('external_location',), employee_fields=('employee_requestor', 'employee_responder')),
+
+    # Shift scheduling management
+    ShiftScheduling: ModelScope(location_fields=('external_location',), employee_fields=('employee', 'employee_swapped')),
+    DailyShiftRecords: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    WeeklyShiftRecords: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    BreakRecords: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+
+    # Inventory management
+    InventoryItems: ModelScope(location_fields=('external_location',)),
+    InventoryChecks: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    Vendors: ModelScope(location_fields=('external_location',)),
+    Orders: ModelScope(location_fields=('external_location',)),
+    OrderInventory: ModelScope(location_fields=('external_location',)),
+    OrderInventoryAlerts: ModelScope(location_fields=('external_location',)),
+
+    # Task management
+    Tasks: ModelScope(location_fields=('external_location',), employee_fields=('employee_assignee', 'employee_assignor')),
+    TaskComments: ModelScope(location_fields=('external_location',), employee_fields=('employee_tasker', 'employee_commenter')),
+    TaskAlerts: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+
+    # Recipe and menu management
+    Recipes: ModelScope(region_fields=('region_location',)),
+    RecipeIngredients: ModelScope(region_fields=('region_location',)),
+    MenuItems: ModelScope(location_fields=('external_location',)),
+    AddOns: ModelScope(location_fields=('external_location',)),
+    MenuItemAddOns: ModelScope(location_fields=('external_location',)),
+    MenuItemOrders: ModelScope(location_fields=('external_location',)),
+    MenuEngineeringReports: ModelScope(location_fields=('external_location',)),
+    WasteRecords: ModelScope(location_fields=('external_location',)),
+    WasteAnalysis: ModelScope(location_fields=('external_location',)),
+    Payments: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    PaymentLines: ModelScope(location_fields=('external_location',)),
+    NutritionAllergenInfo: ModelScope(location_fields=('external_location',)),
+
+    # Inventory cost reports
+    AccountingPeriods: ModelScope(region_fields=('region_location',)),
+    InventoryCostReports: ModelScope(location_fields=('external_location',)),
+    InventoryUsage: ModelScope(location_fields=('external_location',)),
+    InventoryTransfers: ModelScope(location_fields=('source_external_location', 'destination_external_location')),
+    InventoryTransfersInternal: ModelScope(location_fields=('source_external_location', 'destination_external_location')),
+    InventoryWasteBin: ModelScope(location_fields=('external_location',), employee_fields=('employee_culprit', 'employee_reporter')),
+
+    # Tip management
+    EmployeeTipRecords: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+    TipPoolingRecords: ModelScope(location_fields=('external_location',)),
+    EmployeeTipPayouts: ModelScope(location_fields=('external_location',), employee_fields=('employee',)),
+}
+
+
+def register_scope(model, scope):
+    MODEL_SCOPES[model] = scope
+
+
+def get_model_scope(model):
+    return MODEL_SCOPES.get(model._meta.concrete_model, ModelScope())
+
+
+def scope_predicate(model, context, identifier=True, employee=False):
+    scope = get_model_scope(model)
+    predicate = Q()
+
+    # A missing (None or blank) value never grants visibility; comparing against it would match every unassigned row
+    clauses = []
+
+    if identifier and context.unique_identifier:
+        clauses += [(field, context.unique_identifier) for field in scope.identifier_fields]
+
+    if context.region_location_id is not None:
+        clauses += [(f'{field}_id', context.region_location_id) for field in scope.region_fields]
+
+    if context.external_location_id is not None:
+        clauses += [(f'{field}_id', context.external_location_id) for field in scope.location_fields]
+
+    if employee and context.employee_id is not None:
+        clauses += [(f'{field}_id', context.employee_id) for field in scope.employee_fields]
+
+    for lookup, value in clauses:
+        predicate |= Q(**{lookup: value})
+
+    return predicate
+
+
+def scope_queryset(queryset, context, identifier=True, employee=False):
+    predicate = scope_predicate(queryset.model, context, identifier=identifier, employee=employee)
+
+    if not predicate:
+        return queryset.none()
+
+    return queryset.filter(predicate)
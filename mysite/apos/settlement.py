@@ -0,0 +1,114 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .counters import add_to_performance
+from .models import DailyShiftRecords, EmployeeTipRecords, MenuItemOrders
+
+
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+
+Settlement = namedtuple('Settlement', [
+    'orders',
+    'ordered_menu_items_and_quantities',
+    'name_ordered_menu_items_and_quantities',
+    'total_bill',
+    'tip_amount',
+])
+
+
+# The table's completed orders with their menu items and add-ons, in two queries however many plates there are
+def completed_orders(internal_location):
+    return list(MenuItemOrders.objects.filter(
+        internal_location=internal_location, order_status='Completed'
+    ).select_related('menu_item').prefetch_related('add_ons').order_by('pk'))
+
+
+# Bill, receipt names and tip for a table in one pass over its orders. Plates use the price and cost frozen when they
+# went 'In Progress'; orders from before the snapshot existed are priced at today's menu. Two orders of the same menu
+# item share an entry, with their quantities added and price and cost averaged over them; 'add-on quantities' counts the
+# plates each add-on was actually on, which can be fewer than the entry's quantity
+def settle_orders(orders, tip_amount_percent=0, service_charge_percent=0):
+    ordered = {}
+    names = {}
+    subtotal = ZERO
+
+    for order in orders:
+        add_ons = list(order.add_ons.all())
+
+        if order.unit_price is not None:
+            unit_price = order.unit_price
+        else:
+            unit_price = order.menu_item.price + sum((add_on.additional_price for add_on in add_ons), ZERO)
+
+        subtotal += unit_price * order.quantity
+
+        if order.menu_item_id not in ordered:
+            ordered[order.menu_item_id] = {'quantity': 0, 'add-ons': [], 'add-on quantities': {}}
+            names[order.menu_item.item_name] = {'quantity': 0, 'add-ons': [], 'add-on quantities': {}}
+
+        line = ordered[order.menu_item_id]
+        name_line = names[order.menu_item.item_name]
+
+        if order.unit_cost is not None:
+            quantity = line['quantity'] + order.quantity
+
+            for field, value in (('unit_price', order.unit_price), ('unit_cost', order.unit_cost)):
+                previous = Decimal(line.get(field, value)) * line['quantity']
+                line[field] = str(((previous + value * order.quantity) / quantity).quantize(CENTS))
+
+        line['quantity'] += order.quantity
+        name_line['quantity'] += order.quantity
+
+        for add_on in add_ons:
+            if add_on.pk not in line['add-ons']:
+                line['add-ons'].append(add_on.pk)
+                name_line['add-ons'].append(add_on.add_on_name)
+
+            # String keys, as they read back from the JSONField
+            key = str(add_on.pk)
+            line['add-on quantities'][key] = line['add-on quantities'].get(key, 0) + order.quantity
+            name_line['add-on quantities'][add_on.add_on_name] = name_line['add-on quantities'].get(add_on.add_on_name, 0) + order.quantity
+
+    total_bill = (subtotal * (1 + Decimal(tip_amount_percent + service_charge_percent) / 100)).quantize(CENTS)
+    tip_amount = abs(total_bill * Decimal(tip_amount_percent - service_charge_percent) / 100).quantize(CENTS)
+
+    return Settlement(orders, ordered, names, total_bill, tip_amount)
+
+
+# The rest of settling up, run inside the payment's transaction: clear the billed orders off the table, credit the
+# server's performance counters and record their tip against the shift they're clocked into
+def record_settlement(payment, settlement):
+    if settlement.orders:
+        MenuItemOrders.objects.filter(pk__in=[order.pk for order in settlement.orders]).delete()
+
+    if payment.employee_id is None:
+        return
+
+    add_to_performance(
+        payment.employee_id,
+        total_tips_received=settlement.tip_amount,
+        total_transactions_completed=1,
+        total_sales_handled_amount=payment.total_bill,
+    )
+
+    daily_shift_record = DailyShiftRecords.objects.filter(
+        employee=payment.employee_id,
+        shift_date=timezone.localdate(payment.payment_datetime),
+        punch_in_time__isnull=False,
+        punch_out_time__isnull=True,
+    ).values_list('pk', flat=True).first()
+
+    # A tip record has to hang off a shift; nothing to attach it to when the server isn't clocked in
+    if daily_shift_record is not None:
+        EmployeeTipRecords.objects.create(
+            external_location=payment.external_location,
+            employee_id=payment.employee_id,
+            category=payment.category,
+            internal_location=payment.internal_location,
+            tip_amount=settlement.tip_amount,
+            tip_type=payment.payment_type,
+            daily_shift_record_id=daily_shift_record,
+        )
@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import Group
-from .models import Employees
+from .cache import employee_scope_cache
+from .costing import invalidate_inventory_item_costs, invalidate_recipe_costs
+from .models import Employees, ExternalLocations, CustomUser, InventoryItems, RecipeIngredients, Recipes
 
 
 @receiver(post_save, sender=Employees)
@@ -14,7 +16,9 @@ def create_user_for_employee(sender, instance, created, **kwargs):
         return
 
     if created and not CustomUser.objects.filter(username=instance.account_username).exists():
-        user = CustomUser.objects.create_user(
+        # account_password is already hashed by Employees.save; hashing it again would lock the employee out of the
+        # password they were given
+        user = CustomUser.objects.create(
             username=instance.account_username,
             password=instance.account_password,
             phone_number=instance.phone,
@@ -59,3 +63,82 @@ def create_user_for_employee(sender, instance, created, **kwargs):
 
     else:
         print(f"Halt!: A user with username {instance.account_username} already exists.")
+
+
+# Employee scope cache invalidation
+@receiver(pre_save, sender=Employees)
+def remember_previous_employee_user(sender, instance, **kwargs):
+    # An employee pointed at another login account leaves the old account with a scope it no longer has
+    instance._previous_user_id = Employees.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first() if instance.pk else None
+
+
+# Employees never linked to their user are scoped by account username (see resolve_employee_context), so their
+# scopes are cached under whichever user has that username
+def _unlinked_user_ids(employees):
+    return CustomUser.objects.filter(
+        username__in=employees.filter(user__isnull=True).values('account_username')
+    ).values_list('pk', flat=True)
+
+
+@receiver(post_save, sender=Employees)
+@receiver(post_delete, sender=Employees)
+def invalidate_employee_scope(sender, instance, **kwargs):
+    employee_scope_cache.invalidate(instance.user_id, getattr(instance, '_previous_user_id', None))
+
+    if instance.user_id is None:
+        employee_scope_cache.invalidate(*CustomUser.objects.filter(username=instance.account_username).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_employee_scope_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+
+    if not reverse:
+        employee_scope_cache.invalidate(instance.pk)
+    elif pk_set:
+        employee_scope_cache.invalidate(*pk_set)
+    else:
+        employee_scope_cache.clear()
+
+
+@receiver(post_save, sender=ExternalLocations)
+def invalidate_employee_scope_on_location_change(sender, instance, **kwargs):
+    employees = Employees.objects.filter(external_location=instance)
+
+    employee_scope_cache.invalidate(*employees.values_list('user_id', flat=True), *_unlinked_user_ids(employees))
+
+
+# Deleting a location nulls out Employees.external_location with a bulk update that sends no signals
+@receiver(post_delete, sender=ExternalLocations)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def clear_employee_scope(sender, **kwargs):
+    employee_scope_cache.clear()
+
+
+# Recipe cost cache invalidation
+@receiver(pre_save, sender=RecipeIngredients)
+def invalidate_previous_recipe_cost(sender, instance, **kwargs):
+    # An ingredient moved to another recipe changes the cost of the one it left too
+    if instance.pk:
+        invalidate_recipe_costs(RecipeIngredients.objects.filter(pk=instance.pk).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def invalidate_recipe_cost(sender, instance, **kwargs):
+    invalidate_recipe_costs([instance.recipe_id])
+
+
+@receiver(post_delete, sender=Recipes)
+def invalidate_deleted_recipe_cost(sender, instance, **kwargs):
+    invalidate_recipe_costs([instance.pk])
+
+
+# Covers total_value/quantity changes through save(); code that moves stock with QuerySet.update() must call
+# invalidate_inventory_item_costs itself
+@receiver(post_save, sender=InventoryItems)
+def invalidate_inventory_item_recipe_costs(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_inventory_item_costs([instance.pk])
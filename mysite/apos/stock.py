@@ -0,0 +1,158 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from .costing import invalidate_inventory_item_costs, unit_price
+from .models import InventoryItems, InventoryMovements, RecipeIngredients
+from .rollups import roll_up_movements
+
+
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+QUANTITY = DecimalField(max_digits=14, decimal_places=3)
+VALUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _per_item(deltas, output_field):
+    return Case(
+        *[When(pk=inventory_item, then=Value(delta)) for inventory_item, delta in deltas.items()],
+        default=Value(ZERO),
+        output_field=output_field,
+    )
+
+
+# Appends the movements to the ledger and moves every item's balance by their sum in a single UPDATE, so two
+# terminals moving the same item at once can't lose each other's changes and the ledger always adds up to the balance
+def record_movements(movements):
+    movements = [movement for movement in movements if movement.quantity or movement.value]
+
+    if not movements:
+        return []
+
+    quantities = defaultdict(Decimal)
+    values = defaultdict(Decimal)
+
+    for movement in movements:
+        quantities[movement.inventory_item_id] += movement.quantity
+        values[movement.inventory_item_id] += movement.value
+
+    with transaction.atomic():
+        InventoryMovements.objects.bulk_create(movements)
+
+        InventoryItems.objects.filter(pk__in=quantities).update(
+            quantity=F('quantity') + _per_item(quantities, QUANTITY),
+            total_value=F('total_value') + _per_item(values, VALUE),
+            last_updated=timezone.now(),
+        )
+
+        roll_up_movements(movements)
+
+        # update() sends no post_save, so the recipe cost cache has to hear about it from here
+        transaction.on_commit(lambda: invalidate_inventory_item_costs(list(quantities)))
+
+    return movements
+
+
+# Location and average unit price of each item, read under a row lock so the value that leaves matches the stock it leaves with.
+# The UPDATE comes first because select_for_update does nothing on SQLite: writing before reading makes the transaction
+# a write one from the start, so a second terminal waits for it instead of failing to upgrade its read with 'database is locked'
+def _locked_items(inventory_item_ids):
+    InventoryItems.objects.filter(pk__in=inventory_item_ids).update(last_updated=timezone.now())
+
+    rows = InventoryItems.objects.select_for_update().filter(pk__in=inventory_item_ids).values_list(
+        'pk', 'external_location_id', 'total_value', 'quantity'
+    )
+
+    return {pk: (external_location, unit_price(total_value, quantity)) for pk, external_location, total_value, quantity in rows}
+
+
+# Takes the quantities out of stock at each item's average unit price
+def issue_stock(deltas, movement_type, **source):
+    with transaction.atomic():
+        items = _locked_items(deltas)
+
+        return record_movements([
+            InventoryMovements(
+                external_location_id=items[inventory_item][0],
+                inventory_item_id=inventory_item,
+                movement_type=movement_type,
+                quantity=-quantity,
+                value=-(items[inventory_item][1] * quantity).quantize(CENTS),
+                **source,
+            )
+            for inventory_item, quantity in deltas.items() if inventory_item in items
+        ])
+
+
+# Inventory quantity each item loses when an order is cooked: recipe ingredients and add-ons, times the plates ordered
+def order_stock_deltas(order):
+    deltas = defaultdict(Decimal)
+
+    ingredients = RecipeIngredients.objects.filter(recipe=order.menu_item.recipe_id).values_list('inventory_item_id', 'quantity')
+
+    for inventory_item, quantity in ingredients:
+        deltas[inventory_item] += quantity * order.quantity
+
+    for inventory_item, additional_quantity in order.add_ons.values_list('inventory_item_id', 'additional_quantity'):
+        deltas[inventory_item] += additional_quantity * order.quantity
+
+    return dict(deltas)
+
+
+def consume_order_stock(order):
+    return issue_stock(order_stock_deltas(order), 'Sale', menu_item_order=order)
+
+
+def receive_order_inventory(order_inventory):
+    order = order_inventory.order
+
+    return record_movements([InventoryMovements(
+        external_location_id=order_inventory.external_location_id,
+        inventory_item_id=order.inventory_item_id,
+        movement_type='Receipt',
+        quantity=order_inventory.received_quantity,
+        value=(order_inventory.received_quantity * order.unit_price).quantize(CENTS),
+        order_inventory=order_inventory,
+    )])
+
+
+def waste_inventory(inventory_waste):
+    return record_movements([InventoryMovements(
+        external_location_id=inventory_waste.external_location_id,
+        inventory_item_id=inventory_waste.inventory_item_id,
+        movement_type='Waste',
+        quantity=-inventory_waste.quantity_wasted,
+        value=-inventory_waste.money_wasted,
+        inventory_waste=inventory_waste,
+    )])
+
+
+# Stock leaves the source at its average unit price and arrives at the destination carrying that same value
+def transfer_inventory(inventory_transfer, destination_inventory_item):
+    with transaction.atomic():
+        items = _locked_items([inventory_transfer.inventory_item_id, destination_inventory_item.pk])
+        source_location, source_unit_price = items[inventory_transfer.inventory_item_id]
+        quantity = inventory_transfer.quantity_transferred
+        value = (source_unit_price * quantity).quantize(CENTS)
+
+        return record_movements([
+            InventoryMovements(
+                external_location_id=source_location,
+                inventory_item_id=inventory_transfer.inventory_item_id,
+                movement_type='Transfer out',
+                quantity=-quantity,
+                value=-value,
+                inventory_transfer=inventory_transfer,
+            ),
+            InventoryMovements(
+                external_location_id=items[destination_inventory_item.pk][0],
+                inventory_item_id=destination_inventory_item.pk,
+                movement_type='Transfer in',
+                quantity=quantity,
+                value=value,
+                inventory_transfer=inventory_transfer,
+            ),
+        ])
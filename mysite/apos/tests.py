@@ -1,3 +1,773 @@
-from django.test import TestCase
+import itertools
+import threading
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from .cache import employee_scope_cache
+from .costing import recipe_cost_cache, recipe_costs
+from .counters import CounterBuffer, add_to_performance, apply_counters
+from .leaderboards import leaderboard_cache
+from .imports import import_rows
+from .jobs import JOB_HANDLERS, claim_jobs, enqueue, run_job
+from .middleware import resolve_employee_context
+from .pagination import KeysetListView
+from .performance import performance_differences
+from .rollups import rebuild_daily_rollups
+from .stock import issue_stock, record_movements
+from .models import *
+
+
+_phones = itertools.count(1000)
+
+
+def make_region(**fields):
+    return RegionLocations.objects.create(**{
+        'state_or_province_name': 'Ontario',
+        'country_name': 'Canada',
+        'overtime_threshold': 40,
+        **fields,
+    })
+
+
+def make_location(region, location_name='Store'):
+    return ExternalLocations.objects.create(
+        region_location=region, location_name=location_name, address='1 Main St', contact_person='Front desk'
+    )
+
+
+# Saved the way the employees page saves them, so the login account and group come from create_user_for_employee
+def make_employee(external_location, job_position='Waiter', first_name='Sam', last_name='Taylor', **fields):
+    return Employees.objects.create(**{
+        'region_location': external_location.region_location,
+        'external_location': external_location,
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': 'staff@example.com',
+        'phone': f'+1416555{next(_phones):04d}',
+        'hire_date': date(2024, 1, 1),
+        'job_position': job_position,
+        'hourly_wage': Decimal('20.00'),
+        'availability': {'Monday': ['09:00-17:00']},
+        **fields,
+    })
+
+
+def make_inventory_item(external_location, item_name='Flour', quantity='100.000', total_value='250.00', **fields):
+    return InventoryItems.objects.create(**{
+        'external_location': external_location,
+        'item_name': item_name,
+        'item_type': InventoryItems.ITEM_TYPE_CHOICES[0][0],
+        'quantity': Decimal(quantity),
+        'total_value': Decimal(total_value),
+        'unit_of_measurement': InventoryItems.UNIT_OF_MEASUREMENT_CHOICES[0][0],
+        'barcode': item_name,
+        'safety_stock': Decimal('5.00'),
+        'deliveries_per_week': 2,
+        **fields,
+    })
+
+
+def make_accounting_period(region, start=None, end=None):
+    start = start or date.today() - timedelta(days=3)
+
+    return AccountingPeriods.objects.create(region_location=region, accounting_period_start=start, accounting_period_end=end or start + timedelta(days=27))
+
+
+# Recipes.save and MenuItems.save work out costs from ingredients these tests don't need, so both go in with bulk_create
+def make_menu_item(external_location, item_name='Pizza', price='10.00'):
+    recipe = Recipes.objects.bulk_create([Recipes(
+        region_location=external_location.region_location, recipe_name=item_name, image='-', description='-',
+        preparation_time=1, cooking_temperature=1, cooking_time=1, dishing_up_time=1, total_recipe_time=3,
+        quality_standards='-', serving_size=1,
+    )])[0]
+
+    return MenuItems.objects.bulk_create([MenuItems(
+        external_location=external_location, recipe=recipe, item_name=item_name, image='-', price=Decimal(price),
+        course=MenuItems.COURSE_CHOICES[0][0], is_available=True, gross_profit=0,
+    )])[0]
+
+
+def make_add_on(external_location, inventory_item, add_on_name='Extra cheese', additional_price='2.00', additional_ingredient_costs='0.50'):
+    return AddOns.objects.bulk_create([AddOns(
+        external_location=external_location, inventory_item=inventory_item, add_on_name=add_on_name,
+        additional_quantity=0, additional_price=Decimal(additional_price), is_available=True,
+        additional_ingredient_costs=Decimal(additional_ingredient_costs),
+    )])[0]
+
+
+# Runs target(i) on n threads released together, each on its own database connection; returns what any of them raised
+def run_concurrently(n, target):
+    start = threading.Barrier(n)
+    errors = []
+
+    def run(i):
+        try:
+            start.wait()
+            target(i)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return errors
+
+
+class LeaderboardScopeTests(TestCase):
+    def setUp(self):
+        employee_scope_cache.clear()
+        leaderboard_cache.clear()
+
+        region = make_region()
+        self.store = make_location(region, 'Store')
+        self.other_store = make_location(region, 'Other store')
+
+        self.owner = make_employee(self.store, 'Owner', first_name='Olive')
+        self.manager = make_employee(self.store, 'Manager', first_name='Mona')
+        self.waiter = make_employee(self.store, 'Waiter', first_name='Walt')
+        self.other_waiter = make_employee(self.other_store, 'Waiter', first_name='Otto')
+
+        apply_counters({
+            self.waiter.pk: {'total_earnings': Decimal('500.00')},
+            self.other_waiter.pk: {'total_earnings': Decimal('900.00')},
+        })
+
+    def leaderboards_for(self, employee):
+        self.client.force_login(employee.user)
+        response = self.client.get(reverse('employees_performance'))
+
+        self.assertEqual(response.status_code, 200)
+        return response.context['leaderboards']
+
+    def test_management_only_gets_their_own_location(self):
+        leaderboards = self.leaderboards_for(self.manager)
+
+        self.assertEqual([location.pk for location, _ in leaderboards], [self.store.pk])
+
+        earnings = leaderboards[0][1]['total_earnings']
+        self.assertEqual([entry.employee_id for entry in earnings.most], [self.waiter.pk])
+        self.assertNotIn(self.other_waiter.pk, [entry.employee_id for entry in earnings.least])
+
+    def test_owner_gets_every_location_in_the_region(self):
+        leaderboards = self.leaderboards_for(self.owner)
+
+        self.assertEqual([location.pk for location, _ in leaderboards], [self.store.pk, self.other_store.pk])
+        self.assertEqual([entry.employee_id for entry in leaderboards[1][1]['total_earnings'].most], [self.other_waiter.pk])
+
+
+class ExportCSVTests(TestCase):
+    def setUp(self):
+        employee_scope_cache.clear()
+
+        self.owner = make_employee(make_location(make_region()), 'Owner')
+        self.client.force_login(self.owner.user)
+
+    def test_location_that_is_not_an_id_redirects_with_a_message(self):
+        response = self.client.get(reverse('export_csv', args=['payments']), {'location': 'abc'})
+
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+        self.assertEqual([str(message) for message in response.wsgi_request._messages], ['Export location needs to be a location id.'])
+
+    def test_location_id_streams_the_export(self):
+        response = self.client.get(reverse('export_csv', args=['payments']), {'location': self.owner.external_location_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'id,payment_datetime,'))
+
+
+class PermissionQueryCountTests(TestCase):
+    # One list view per permission mixin family (OwnerFullManagementOrChefOrEmployeeLimitedPermissionMixin has no view).
+    # A page costs the session, the user, the employee scope (first request only; it's cached after that) and the list
+    # itself; a refused request swaps the list for the employee's name in the redirect message, which the scope lookup
+    # already loaded on the first request
+    VIEWS = [
+        # url name, mixin family, status for Owner / Management / Employee
+        ('external_locations', 'OwnerRequiredMixin', (200, 302, 302)),
+        ('accounting_reports', 'OwnerOrManagementRequiredMixin', (200, 200, 302)),
+        ('inventory_items', 'OwnerOrManagementOrChefRequiredMixin', (200, 200, 302)),
+        ('internal_locations', 'AllGroupsLocationFilteredMixin', (200, 200, 200)),
+        ('inventory_waste_bin', 'AllGroupsUserLocationFilteredMixin', (200, 200, 200)),
+        ('employees', 'OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin', (200, 200, 302)),
+        ('requests', 'OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin', (200, 200, 302)),
+    ]
+
+    def setUp(self):
+        location = make_location(make_region())
+
+        self.roles = (
+            ('Owner', make_employee(location, 'Owner', first_name='Olive')),
+            ('Management', make_employee(location, 'Manager', first_name='Mona')),
+            ('Employee', make_employee(location, 'Waiter', first_name='Walt')),
+        )
+
+    def test_each_request_costs_a_fixed_number_of_queries(self):
+        for name, family, statuses in self.VIEWS:
+            for (role, employee), status in zip(self.roles, statuses):
+                with self.subTest(view=name, mixin=family, role=role):
+                    employee_scope_cache.clear()
+                    self.client.force_login(employee.user)
+
+                    with self.assertNumQueries(4 if status == 200 else 3):
+                        self.assertEqual(self.client.get(reverse(name)).status_code, status)
+
+                    with self.assertNumQueries(3):
+                        self.assertEqual(self.client.get(reverse(name)).status_code, status)
+
+
+class PrefetchPlanQueryCountTests(TestCase):
+    ROWS = 500
+
+    def setUp(self):
+        employee_scope_cache.clear()
+
+        self.location = make_location(make_region())
+        self.owner = make_employee(self.location, 'Owner', first_name='Olive')
+        self.employee = make_employee(self.location, 'Waiter', first_name='Walt')
+        self.inventory_item = make_inventory_item(self.location)
+
+        self.client.force_login(self.owner.user)
+
+    # Every relation the view's prefetch plan declares, read off each row the page rendered
+    def assertPlanCoversRelations(self, url_name, relations):
+        counts = {}
+
+        for size in (1, self.ROWS):
+            employee_scope_cache.clear()
+
+            with mock.patch.object(KeysetListView, 'max_paginate_by', self.ROWS), CaptureQueriesContext(connection) as queries:
+                rows = self.client.get(reverse(url_name), {'page_size': size}).context['object_list']
+
+                for row in rows:
+                    for relation in relations:
+                        relation(row)
+
+            self.assertEqual(len(rows), size)
+            counts[size] = len(queries)
+
+        self.assertEqual(counts[1], counts[self.ROWS], f'{url_name}: {counts[1]} queries for 1 row, {counts[self.ROWS]} for {self.ROWS}')
+
+    def test_menu_item_orders(self):
+        table = InternalLocations.objects.create(external_location=self.location, location_name='Table 1')
+        menu_item = make_menu_item(self.location)
+        add_ons = [make_add_on(self.location, self.inventory_item, f'Extra {i}') for i in range(2)]
+
+        orders = MenuItemOrders.objects.bulk_create([
+            MenuItemOrders(external_location=self.location, menu_item=menu_item, internal_location=table) for _ in range(self.ROWS)
+        ])
+        MenuItemOrders.add_ons.through.objects.bulk_create([
+            MenuItemOrders.add_ons.through(menuitemorders_id=order.pk, addons_id=add_on.pk) for order in orders for add_on in add_ons
+        ])
+
+        self.assertPlanCoversRelations('menu_item_orders', [
+            lambda row: row.menu_item.item_name,
+            lambda row: row.internal_location.location_name,
+            lambda row: [add_on.add_on_name for add_on in row.add_ons.all()],
+        ])
+
+    def test_order_inventory_alerts(self):
+        vendor = Vendors.objects.create(
+            external_location=self.location, name='Mill', email='mill@example.com', phone='+14165550100', address='-',
+            website='-', other_contact_info='-', preferred_vendor=True,
+        )
+        order = Orders.objects.bulk_create([Orders(
+            external_location=self.location, vendor=vendor, inventory_item=self.inventory_item, unit_price=Decimal('2.50'),
+            ordered_quantity=Decimal('10'), total_order_value=Decimal('25.00'), order_date=date.today(),
+            arrival_date=date.today(), order_status=Orders.ORDER_STATUS_CHOICES[0][0],
+        )])[0]
+
+        OrderInventoryAlerts.objects.bulk_create([
+            OrderInventoryAlerts(external_location=self.location, order=order, alert_message='-', alert_type=OrderInventoryAlerts.ALERT_TYPE_CHOICES[0][0])
+            for _ in range(self.ROWS)
+        ])
+
+        self.assertPlanCoversRelations('order_inventory_alerts', [
+            lambda row: row.order.vendor.name,
+            lambda row: row.order.inventory_item.item_name,
+        ])
+
+    def test_task_comments(self):
+        task = Tasks.objects.bulk_create([Tasks(
+            external_location=self.location, task_name='Close', description='-', task_type=Tasks.TASK_TYPE_CHOICES[0][0],
+            due_date=timezone.now(), employee_assignee=self.employee, priority=Tasks.PRIORITY_CHOICES[0][0],
+            employee_assignor=self.owner,
+        )])[0]
+
+        TaskComments.objects.bulk_create([
+            TaskComments(external_location=self.location, task=task, employee_tasker=self.employee, comment='-', employee_commenter=self.owner)
+            for _ in range(self.ROWS)
+        ])
+
+        self.assertPlanCoversRelations('task_comments', [
+            lambda row: row.task.task_name,
+            lambda row: row.employee_tasker.first_name,
+            lambda row: row.employee_commenter.first_name,
+        ])
+
+    def test_break_records(self):
+        schedule = ShiftScheduling.objects.bulk_create([ShiftScheduling(
+            external_location=self.location, job_position='Waiter', shift_type=ShiftScheduling.SHIFT_TYPE_CHOICES[0][0],
+            start_time=time(9), end_time=time(17), total_hours=Decimal('8.0'), shift_date=date.today(),
+        )])[0]
+        shift = DailyShiftRecords.objects.bulk_create([DailyShiftRecords(
+            external_location=self.location, employee=self.employee, shift_scheduling=schedule, shift_type=schedule.shift_type,
+            shift_date=date.today(), total_hours_worked=Decimal('8.0'), earnings=Decimal('160.00'),
+        )])[0]
+
+        BreakRecords.objects.bulk_create([
+            BreakRecords(
+                external_location=self.location, employee=self.employee, daily_shift_record=shift, start_break_time=time(12),
+                end_break_time=time(12, 30), break_duration=30,
+            )
+            for _ in range(self.ROWS)
+        ])
+
+        self.assertPlanCoversRelations('break_records', [
+            lambda row: row.employee.first_name,
+            lambda row: row.daily_shift_record.shift_date,
+        ])
+
+    def test_employee_tip_payouts(self):
+        pool = TipPoolingRecords.objects.bulk_create([TipPoolingRecords(
+            external_location=self.location, date=date.today(),
+            calculate_or_send_tips=TipPoolingRecords.CALCULATE_OR_SEND_TIPS_CHOICES[0][0], total_pool=Decimal('100.00'),
+            participants='-', total_hours_worked=Decimal('10.00'), tip_per_hour=Decimal('10.00'),
+        )])[0]
+
+        EmployeeTipPayouts.objects.bulk_create([
+            EmployeeTipPayouts(
+                external_location=self.location, employee=self.employee, tip_pool_record=pool, payout_amount=Decimal('10.00'),
+                tip_per_hour=Decimal('10.00'),
+            )
+            for _ in range(self.ROWS)
+        ])
+
+        self.assertPlanCoversRelations('employee_tip_payouts', [
+            lambda row: row.employee.first_name,
+            lambda row: row.tip_pool_record.total_pool,
+        ])
+
+
+class ListProjectionTests(TestCase):
+    def test_deferred_columns_are_real_columns_the_page_does_not_page_on(self):
+        for view in KeysetListView.__subclasses__():
+            for name in view.list_defer:
+                with self.subTest(view=view.__name__, column=name):
+                    self.assertIn(name, [field.name for field in view.model._meta.concrete_fields])
+                    self.assertNotEqual(name, view.keyset_field)
+
+    def test_requests_page_leaves_the_message_and_response_unloaded(self):
+        employee_scope_cache.clear()
+
+        location = make_location(make_region())
+        owner = make_employee(location, 'Owner', first_name='Olive')
+        Requests.objects.bulk_create([Requests(
+            external_location=location, request_type='Other', request_message='Long message', employee_requestor=owner,
+            request_response='Long response', employee_responder=owner,
+        )])
+
+        self.client.force_login(owner.user)
+        request = self.client.get(reverse('requests')).context['object_list'][0]
+
+        self.assertEqual(request.get_deferred_fields(), {'request_message', 'request_response'})
+
+
+class EmployeeScopeCacheTests(TestCase):
+    def setUp(self):
+        employee_scope_cache.clear()
+
+        self.employee = make_employee(make_location(make_region()), 'Manager')
+
+    def test_moving_an_employee_to_another_account_drops_both_cached_scopes(self):
+        previous_user = self.employee.user
+        new_user = CustomUser.objects.create_user(username='replacement', password='-', phone_number='+14165559999')
+
+        resolve_employee_context(previous_user)
+        resolve_employee_context(new_user)
+        self.assertIsNotNone(employee_scope_cache.get(previous_user.pk))
+
+        self.employee.user = new_user
+        self.employee.save()
+
+        self.assertIsNone(employee_scope_cache.get(previous_user.pk))
+        self.assertIsNone(employee_scope_cache.get(new_user.pk))
+        self.assertIsNone(resolve_employee_context(previous_user).employee_id)
+        self.assertEqual(resolve_employee_context(new_user).employee_id, self.employee.pk)
+
+    # The state an employee is left in when they're added under a username that already had an account
+    def test_employee_never_linked_to_their_user_is_found_by_username(self):
+        user = self.employee.user
+        Employees.objects.filter(pk=self.employee.pk).update(user=None)
+
+        context = resolve_employee_context(user)
+
+        self.assertEqual(context.employee_id, self.employee.pk)
+        self.assertEqual(context.external_location_id, self.employee.external_location_id)
+        self.assertEqual(context.group_names, {'Management'})
+
+        self.employee.refresh_from_db()
+        self.employee.external_location = make_location(self.employee.region_location, 'Other store')
+        self.employee.save()
+
+        self.assertEqual(resolve_employee_context(user).external_location_id, self.employee.external_location_id)
+
+
+class EmployeeAccountPasswordTests(TestCase):
+    def setUp(self):
+        self.location = make_location(make_region())
+
+    def test_hand_created_and_imported_employees_log_in_with_the_same_generated_password(self):
+        created = make_employee(self.location, 'Chef', first_name='Carla', last_name='Moreno', email='carla@example.com')
+
+        result = import_rows('employees', [{
+            'first_name': 'Ivan', 'last_name': 'Petrov', 'email': 'ivan@example.com', 'phone': '+14165550001',
+            'hire_date': '2024-01-01', 'job_position': 'Chef', 'hourly_wage': '20.00',
+            'availability': '{"Monday": ["09:00-17:00"]}',
+        }], self.location)
+        self.assertEqual(result.errors, [])
+
+        imported = Employees.objects.get(phone='+14165550001')
+
+        for employee in (created, imported):
+            employee.refresh_from_db()
+
+            self.assertTrue(employee.user.check_password(employee.get_account_password))
+            self.assertTrue(self.client.login(username=employee.account_username, password=employee.get_account_password))
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.region = make_region()
+        self.location = make_location(self.region)
+
+    def run_queued(self, job):
+        self.assertEqual(claim_jobs(1), [job.pk])
+        run_job(job.pk)
+        job.refresh_from_db()
+
+        return job
+
+    def test_handlers_report_progress_per_item_as_they_go(self):
+        make_accounting_period(self.region)
+
+        for i in range(4):
+            make_inventory_item(self.location, item_name=f'Item {i}')
+
+        job = enqueue('Inventory usage', self.location)
+        stored = []
+        handler = JOB_HANDLERS['Inventory usage']
+
+        # Reads the job row back after every call, so this sees what a client polling job_status would
+        def watched(job, progress):
+            def recording(percent):
+                progress(percent)
+                stored.append(ReportJobs.objects.get(pk=job.pk).progress)
+
+            return handler(job, recording)
+
+        with mock.patch.dict(JOB_HANDLERS, {'Inventory usage': watched}):
+            job = self.run_queued(job)
+
+        self.assertEqual(job.status, 'Succeeded')
+        self.assertEqual(job.result, {'reports': 4})
+        self.assertEqual(stored, [40, 52, 65, 77, 90])
+        self.assertEqual(job.progress, 100)
+
+    def test_cost_report_without_an_accounting_period_fails_without_retrying(self):
+        job = self.run_queued(enqueue('Inventory cost report', self.location))
+
+        self.assertEqual(job.status, 'Failed')
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('No accounting period covers', job.error)
+        self.assertFalse(InventoryCostReports.objects.exists())
+
+    def test_unknown_job_types_are_rejected_when_queued(self):
+        with self.assertRaises(ValueError):
+            enqueue('Payroll', self.location)
+
+        self.assertFalse(ReportJobs.objects.exists())
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.location = make_location(make_region())
+        self.table = InternalLocations.objects.create(external_location=self.location, location_name='Table 1')
+        self.pizza = make_menu_item(self.location)
+        self.cheese = make_add_on(self.location, make_inventory_item(self.location))
+
+    def test_add_on_lines_count_only_the_plates_the_add_on_was_on(self):
+        with_cheese, plain = MenuItemOrders.objects.bulk_create([
+            MenuItemOrders(external_location=self.location, menu_item=self.pizza, internal_location=self.table, order_status='Completed', quantity=2),
+            MenuItemOrders(external_location=self.location, menu_item=self.pizza, internal_location=self.table, order_status='Completed', quantity=1),
+        ])
+        with_cheese.add_ons.add(self.cheese)
+
+        payment = Payments(internal_location=self.table, tip_amount_percent=0, category='Dine-in', payment_type='Cash')
+        payment.save()
+
+        self.assertEqual(payment.total_bill, Decimal('34.00'))
+        self.assertEqual(payment.ordered_menu_items_and_quantities[self.pizza.pk]['add-on quantities'], {str(self.cheese.pk): 2})
+        self.assertEqual(payment.name_ordered_menu_items_and_quantities['Pizza']['add-on quantities'], {'Extra cheese': 2})
+
+        lines = {line.add_on_id: line for line in PaymentLines.objects.filter(payment=payment)}
+
+        self.assertEqual(lines[self.cheese.pk].quantity, 2)
+        self.assertEqual(lines[None].quantity, 3)
+        self.assertEqual(lines[None].unit_price, Decimal('11.33'))
+
+
+class OrderCostSnapshotTests(TestCase):
+    def setUp(self):
+        recipe_cost_cache.clear()
+
+        self.location = make_location(make_region())
+        self.table = InternalLocations.objects.create(external_location=self.location, location_name='Table 1')
+        self.pizza = make_menu_item(self.location)
+        self.flour = make_inventory_item(self.location, quantity='100.000', total_value='100.00')
+
+        RecipeIngredients.objects.create(recipe=self.pizza.recipe, inventory_item=self.flour, quantity=Decimal('2.000'))
+
+    def test_snapshot_reads_the_cost_fresh_when_the_cached_one_is_stale(self):
+        self.assertEqual(recipe_costs([self.pizza.recipe_id])[self.pizza.recipe_id], Decimal('2.00'))
+
+        # A price change another worker saved; its signal never reached this process's cache
+        InventoryItems.objects.filter(pk=self.flour.pk).update(total_value=Decimal('300.00'))
+        self.assertEqual(recipe_costs([self.pizza.recipe_id])[self.pizza.recipe_id], Decimal('2.00'))
+
+        order = MenuItemOrders.objects.create(menu_item=self.pizza, internal_location=self.table, quantity=1)
+        order.order_status = 'In Progress'
+        order.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.unit_cost, Decimal('6.00'))
+
+
+class PerformanceCounterConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    INCREMENTS = 25
+
+    def setUp(self):
+        self.employee = make_employee(make_location(make_region()))
+
+    def performance(self):
+        return EmployeesPerformance.objects.get(employee=self.employee)
+
+    def test_concurrent_increments_on_one_employee_are_all_kept(self):
+        def increment(i):
+            for _ in range(self.INCREMENTS):
+                add_to_performance(self.employee.pk, total_transactions_completed=1, total_sales_handled_amount=Decimal('1.25'))
+
+        self.assertEqual(run_concurrently(self.THREADS, increment), [])
+
+        performance = self.performance()
+        self.assertEqual(performance.total_transactions_completed, self.THREADS * self.INCREMENTS)
+        self.assertEqual(performance.total_sales_handled_amount, Decimal('1.25') * self.THREADS * self.INCREMENTS)
+        self.assertEqual(EmployeesPerformance.objects.filter(employee=self.employee).count(), 1)
+
+    def test_concurrent_batches_racing_to_create_the_row_are_all_kept(self):
+        other = make_employee(self.employee.external_location, first_name='Robin')
+
+        def increment(i):
+            for _ in range(self.INCREMENTS):
+                apply_counters({self.employee.pk: {'requests_created': 1}, other.pk: {'total_hours_worked': 0.5}})
+
+        self.assertEqual(run_concurrently(self.THREADS, increment), [])
+
+        self.assertEqual(self.performance().requests_created, self.THREADS * self.INCREMENTS)
+        self.assertEqual(EmployeesPerformance.objects.get(employee=other).total_hours_worked, Decimal('0.5') * self.THREADS * self.INCREMENTS)
+
+    def test_buffered_increments_from_many_threads_add_up_after_a_flush(self):
+        buffer = CounterBuffer(max_pending=1000, max_age_seconds=3600)
+
+        def increment(i):
+            for _ in range(self.INCREMENTS):
+                buffer.add(self.employee.pk, late_to_work_count=1)
+
+        self.assertEqual(run_concurrently(self.THREADS, increment), [])
+        buffer.flush()
+
+        self.assertEqual(self.performance().late_to_work_count, self.THREADS * self.INCREMENTS)
+
+    # Outside a transaction the hook runs straight away, so it must only be registered once the UPDATE is written
+    def test_leaderboards_hear_of_a_change_only_after_it_is_written(self):
+        other = make_employee(self.employee.external_location, first_name='Robin')
+        seen = []
+
+        def counters_changed(names):
+            seen.append((set(names), self.performance().requests_created))
+
+        with mock.patch('apos.leaderboards.counters_changed', counters_changed):
+            # New rows for both, then the lone employee's existing row
+            apply_counters({self.employee.pk: {'requests_created': 1}, other.pk: {'requests_created': 1}})
+            apply_counters({self.employee.pk: {'requests_created': 2}})
+
+        self.assertEqual(seen, [({'requests_created'}, 1), ({'requests_created'}, 3)])
+
+
+class ReconcilePerformanceTests(TestCase):
+    def setUp(self):
+        self.employee = make_employee(make_location(make_region()))
+        apply_counters({self.employee.pk: {'requests_created': 5, 'total_hours_worked': Decimal('3.00')}})
+
+    def reconcile(self):
+        call_command('reconcile_performance', fix=True, stdout=StringIO())
+
+        return EmployeesPerformance.objects.get(employee=self.employee)
+
+    def test_fix_sets_the_counters_to_the_derived_values(self):
+        performance = self.reconcile()
+
+        self.assertEqual((performance.requests_created, performance.total_hours_worked), (0, Decimal('0.00')))
+
+    def test_fix_keeps_an_increment_written_while_the_batch_was_derived(self):
+        def differences_then_increment(rows):
+            differences = performance_differences(rows)
+            apply_counters({self.employee.pk: {'requests_created': 1}})
+            return differences
+
+        with mock.patch('apos.management.commands.reconcile_performance.performance_differences', differences_then_increment):
+            performance = self.reconcile()
+
+        self.assertEqual((performance.requests_created, performance.total_hours_worked), (1, Decimal('0.00')))
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    TAKES = 10
+
+    def setUp(self):
+        self.location = make_location(make_region())
+        self.flour = make_inventory_item(self.location, quantity='500.000', total_value='1250.00')
+
+    def assertBalanceMatchesLedger(self, quantity, total_value):
+        self.flour.refresh_from_db()
+        ledger = InventoryMovements.objects.filter(inventory_item=self.flour)
+
+        self.assertEqual((self.flour.quantity, self.flour.total_value), (quantity, total_value))
+        self.assertEqual(sum(movement.quantity for movement in ledger), quantity)
+        self.assertEqual(sum(movement.value for movement in ledger), total_value)
+
+    def test_concurrent_movements_on_one_item_are_all_applied(self):
+        def take(i):
+            for _ in range(self.TAKES):
+                record_movements([InventoryMovements(
+                    external_location=self.location, inventory_item=self.flour, movement_type='Sale',
+                    quantity=Decimal('-1.500'), value=Decimal('-3.75'),
+                )])
+
+        self.assertEqual(run_concurrently(self.THREADS, take), [])
+
+        taken = self.THREADS * self.TAKES
+        self.assertBalanceMatchesLedger(Decimal('500.000') - Decimal('1.500') * taken, Decimal('1250.00') - Decimal('3.75') * taken)
+
+    def test_concurrent_issues_at_average_price_are_all_applied(self):
+        def take(i):
+            for _ in range(self.TAKES):
+                issue_stock({self.flour.pk: Decimal('2.000')}, 'Sale')
+
+        self.assertEqual(run_concurrently(self.THREADS, take), [])
+
+        # 2.50 a unit before and after every take, so each one takes 5.00
+        taken = self.THREADS * self.TAKES
+        self.assertBalanceMatchesLedger(Decimal('500.000') - Decimal('2.000') * taken, Decimal('1250.00') - Decimal('5.00') * taken)
+
+
+# Flour at two stores in one region, and transfers from the first to the second
+class TransferFixture:
+    def setUp(self):
+        region = make_region()
+        self.store = make_location(region, 'Store')
+        self.other_store = make_location(region, 'Other store')
+        self.flour = make_inventory_item(self.store)
+        self.other_flour = make_inventory_item(self.other_store, quantity='20.000', total_value='50.00')
+
+    def transfer(self, quantity):
+        return InventoryTransfers.objects.create(
+            source_external_location=self.store, destination_external_location=self.other_store, inventory_item=self.flour,
+            quantity_transferred=Decimal(quantity), transfer_cost=Decimal('0.00'), transfer_date=date.today(),
+        )
+
+
+class InventoryTransferTests(TransferFixture, TestCase):
+    def test_transfer_moves_stock_at_the_source_average_price(self):
+        transfer = self.transfer('10.000')
+
+        self.flour.refresh_from_db()
+        self.other_flour.refresh_from_db()
+
+        # 2.50 a unit at the source, so 25.00 leaves with the flour
+        self.assertEqual((self.flour.quantity, self.flour.total_value), (Decimal('90.000'), Decimal('225.00')))
+        self.assertEqual((self.other_flour.quantity, self.other_flour.total_value), (Decimal('30.000'), Decimal('75.00')))
+        self.assertEqual(sorted(transfer.inventorymovements_set.values_list('external_location', 'inventory_item', 'movement_type', 'quantity', 'value')), [
+            (self.store.pk, self.flour.pk, 'Transfer out', Decimal('-10.000'), Decimal('-25.00')),
+            (self.other_store.pk, self.other_flour.pk, 'Transfer in', Decimal('10.000'), Decimal('25.00')),
+        ])
+
+    def test_saving_a_transfer_again_moves_no_more_stock(self):
+        transfer = self.transfer('10.000')
+        transfer.save()
+
+        self.flour.refresh_from_db()
+
+        self.assertEqual(self.flour.quantity, Decimal('90.000'))
+        self.assertEqual(InventoryMovements.objects.filter(inventory_transfer=transfer).count(), 2)
+
+
+class DailyLocationRollupTests(TransferFixture, TestCase):
+    def rollups(self):
+        return sorted(DailyLocationRollups.objects.filter(rollup_date=date.today()).values_list('external_location', 'transfers', 'closing_inventory_value'))
+
+    def test_transfers_are_counted_at_both_locations(self):
+        self.transfer('10.000')
+        self.transfer('4.000')
+
+        # Each transfer is one movement out of the store and one into the other store
+        expected = [(self.store.pk, 2, Decimal('215.00')), (self.other_store.pk, 2, Decimal('85.00'))]
+        self.assertEqual(self.rollups(), expected)
+
+        rebuild_daily_rollups(self.store)
+        rebuild_daily_rollups(self.other_store)
+
+        self.assertEqual(self.rollups(), expected)
+
+
+class InventoryCostReportQueryCountTests(TestCase):
+    def setUp(self):
+        self.region = make_region()
+        self.location = make_location(self.region)
+        make_accounting_period(self.region)
+
+    def create_report(self):
+        return InventoryCostReports.objects.create(external_location=self.location)
+
+    # The accounting period, the opening balance (current stock, last snapshots and the movements since), the period's
+    # rollup totals, stock on hand and the INSERT, however many items or movements the location has
+    def test_report_costs_the_same_queries_however_much_the_location_holds(self):
+        make_inventory_item(self.location, item_name='Item 0')
+
+        with self.assertNumQueries(7):
+            self.create_report()
+
+        for i in range(1, 20):
+            make_inventory_item(self.location, item_name=f'Item {i}')
+
+        with self.assertNumQueries(7):
+            report = self.create_report()
+
+        self.assertEqual(report.accounting_period.region_location, self.region)
+        self.assertEqual(report.current_cogs, -Decimal('250.00') * 20)
@@ -12,6 +12,7 @@ urlpatterns = [
 
     # Home
     path('home/', views.home, name='home'),
+    path('employee-scope-cache-stats/', views.employee_scope_cache_stats, name='employee_scope_cache_stats'),
 
     # Location management
     path('region-locations/', views.RegionLocationsListView.as_view(), name='region_locations'),
@@ -148,6 +149,10 @@ urlpatterns = [
     path('accounting-periods/delete/<int:pk>/', views.AccountingPeriodsDeleteView.as_view(), name='accounting_reports_delete'),
     path('inventory-cost-reports/', views.InventoryCostReportsListView.as_view(), name='inventory_cost_reports'),
     path('inventory-cost-reports/create/', views.inventory_cost_report_create, name='inventory_cost_reports_create'),
+    path('inventory-cost-reports/region/', views.region_consolidated_report, name='region_consolidated_report'),
+    path('exports/<slug:name>/', views.export_csv, name='export_csv'),
+    path('imports/<slug:name>/', views.import_csv, name='import_csv'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
     path('inventory-usage/', views.InventoryUsageListView.as_view(), name='inventory_usage'),
     path('inventory-usage/create/', views.inventory_usage_create, name='inventory_usage_create'),
     path('inventory-transfers/', views.InventoryTransfersListView.as_view(), name='inventory_transfers'),
@@ -2,18 +2,32 @@ import random
 from datetime import date
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import Prefetch, Q
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from django.views.generic import ListView, FormView
+from django.views.generic import FormView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from .models import *
 from .forms import *
 from .mixins import *
 from .utils import *
+from .middleware import get_employee_context, get_employee_or_404
+from .cache import employee_scope_cache
+from .pagination import KeysetListView
+from .prefetch import PrefetchPlan
+from .reports import consolidated_region_report
+from .jobs import enqueue
+from .exports import EXPORTS, csv_lines, export_filename, export_queryset, gzip_chunks
+from .imports import IMPORTS, import_rows, read_csv
+from .counters import COUNTER_SETTINGS
+from .performance import apply_derived_performance
+from .leaderboards import leaderboards
+from .scopes import scope_queryset
 
 
 # User signup + authentication
@@ -105,7 +119,7 @@ def logout_request(request):
 # Homepage
 @login_required
 def home(request):
-    employee = Employees.objects.filter(user=request.user).first()
+    employee = get_employee_context(request).employee
 
     if employee:
         context = {'name': employee.first_name}
@@ -115,8 +129,16 @@ def home(request):
     return render(request, 'apos/home.html', context)
 
 
+@login_required
+def employee_scope_cache_stats(request):
+    if not get_employee_context(request).in_groups('Owner'):
+        return no_permission_redirect(request)
+
+    return JsonResponse(employee_scope_cache.stats())
+
+
 # Location management
-class RegionLocationsListView(LoginRequiredMixin, OwnerRequiredMixin, ListView):
+class RegionLocationsListView(LoginRequiredMixin, OwnerRequiredMixin, KeysetListView):
     model = RegionLocations
     template_name = 'apos/regions.html'
 
@@ -128,8 +150,7 @@ class RegionLocationsCreateView(LoginRequiredMixin, OwnerRequiredMixin, CreateVi
     success_url = reverse_lazy('regions')
 
     def form_valid(self, form):
-        user = self.request.user
-        unique_identifier = get_object_or_404(Employees, user=user).unique_identifier
+        unique_identifier = get_employee_or_404(self.request).unique_identifier
 
         messages.success(self.request, f'Region {form.instance.region_name} added successfully!')
         return super().form_valid(form)
@@ -152,9 +173,10 @@ class RegionLocationsDeleteView(LoginRequiredMixin, OwnerRequiredMixin, DeleteVi
     success_url = reverse_lazy('regions')
 
 
-class ExternalLocationsListView(LoginRequiredMixin, OwnerRequiredMixin, ListView):
+class ExternalLocationsListView(LoginRequiredMixin, OwnerRequiredMixin, KeysetListView):
     model = ExternalLocations
     template_name = 'apos/external_locations.html'
+    prefetch_plan = PrefetchPlan(select_related=('region_location',))
 
 
 class ExternalLocationsCreateView(LoginRequiredMixin, OwnerRequiredMixin, CreateView):
@@ -169,8 +191,7 @@ class ExternalLocationsCreateView(LoginRequiredMixin, OwnerRequiredMixin, Create
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['unique_identifier'] = employee.unique_identifier
 
         return kwargs
@@ -188,8 +209,7 @@ class ExternalLocationsUpdateView(LoginRequiredMixin, OwnerRequiredMixin, Update
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['unique_identifier'] = employee.unique_identifier
 
         return kwargs
@@ -201,9 +221,10 @@ class ExternalLocationsDeleteView(LoginRequiredMixin, OwnerRequiredMixin, Delete
     success_url = reverse_lazy('external_locations')
 
 
-class InternalLocationsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class InternalLocationsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = InternalLocations
     template_name = 'apos/internal_locations.html'
+    prefetch_plan = PrefetchPlan(select_related=('external_location',))
 
 
 class InternalLocationsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, CreateView):
@@ -213,8 +234,7 @@ class InternalLocationsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredM
     success_url = reverse_lazy('internal_locations')
 
     def form_valid(self, form):
-        user = self.request.user
-        external_location = get_object_or_404(Employees, user=user).external_location
+        external_location = get_employee_or_404(self.request).external_location
         form.instance.external_location = external_location
 
         messages.success(self.request, f'Internal location {form.instance.location_name} added successfully!')
@@ -238,15 +258,20 @@ class InternalLocationsDeleteView(LoginRequiredMixin, OwnerOrManagementRequiredM
     success_url = reverse_lazy('internal_locations')
 
 
-class LocationTrainingInsightsListView(LoginRequiredMixin, OwnerRequiredMixin, ListView):
+class LocationTrainingInsightsListView(LoginRequiredMixin, OwnerRequiredMixin, KeysetListView):
     model = LocationTrainingInsights
     template_name = 'apos/location_training_insights.html'
+    keyset_field = 'last_updated'
+    prefetch_plan = PrefetchPlan(select_related=('external_location',))
 
 
 # Employee management
-class EmployeesListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, ListView):
+class EmployeesListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, KeysetListView):
     model = Employees
     template_name = 'apos/employees.html'
+    keyset_field = 'hire_date'
+    prefetch_plan = PrefetchPlan(select_related=('external_location',))
+    list_defer = ('availability', 'account_password')
 
 
 class EmployeesCreateView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, CreateView):
@@ -256,8 +281,7 @@ class EmployeesCreateView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, Cr
     success_url = reverse_lazy('employees')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.region_location = employee.region_location
         form.instance.external_location = employee.external_location
 
@@ -305,14 +329,45 @@ class EmployeesDeleteView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, De
     success_url = reverse_lazy('employees')
 
 
-class EmployeesPerformanceListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, ListView):
+class EmployeesPerformanceListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, KeysetListView):
     model = EmployeesPerformance
     template_name = 'apos/employees_performance.html'
+    prefetch_plan = PrefetchPlan(select_related=('employee',))
+
+    # With derived counters the stored totals aren't kept up to date; only the rows on screen get worked out
+    def paginate_queryset(self, queryset, page_size):
+        paginated = super().paginate_queryset(queryset, page_size)
+
+        if COUNTER_SETTINGS['SOURCE'] == 'derived':
+            apply_derived_performance(paginated[2])
+
+        return paginated
+
+    # Most and least top 10 on each counter; owners get every location in their region, management only their own
+    # location (the same rows their list shows) and chefs and employees, who only see their own row, get none
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        employee_context = get_employee_context(self.request)
+
+        if not self.is_chef_or_employee():
+            if employee_context.in_groups('Owner'):
+                locations = scope_queryset(ExternalLocations.objects.order_by('pk'), employee_context)
+            else:
+                locations = ExternalLocations.objects.filter(pk=employee_context.external_location_id)
 
+            locations = list(locations)
+            boards = leaderboards(location.pk for location in locations)
+            context['leaderboards'] = [(location, boards[location.pk]) for location in locations]
 
-class RequestsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+        return context
+
+
+class RequestsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = Requests
     template_name = 'apos/requests.html'
+    keyset_field = 'request_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee_requestor', 'employee_responder'))
+    list_defer = ('request_message', 'request_response')
 
 
 class RequestsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -322,8 +377,7 @@ class RequestsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, Cre
     success_url = reverse_lazy('requests')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee_requestor = employee
 
         messages.success(self.request, 'Request successfully created!')
@@ -337,8 +391,7 @@ class RequestsUpdateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, Upd
     success_url = reverse_lazy('requests')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee_responder = employee
         
         messages.success(self.request, 'Request successfully updated!')
@@ -352,9 +405,11 @@ class RequestsDeleteView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin,
 
 
 # Shift scheduling management
-class ShiftSchedulingListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class ShiftSchedulingListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = ShiftScheduling
     template_name = 'apos/shift_scheduling.html'
+    keyset_field = 'shift_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee', 'employee_swapped'))
 
 
 class ShiftSchedulingCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -377,8 +432,7 @@ class ShiftSchedulingCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequi
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = external_location
 
         return kwargs
@@ -396,8 +450,7 @@ class ShiftSchedulingUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefRequi
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = external_location
 
         return kwargs
@@ -409,9 +462,11 @@ class ShiftSchedulingDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequi
     success_url = reverse_lazy('shift_scheduling')
 
 
-class DailyShiftRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class DailyShiftRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = DailyShiftRecords
     template_name = 'apos/daily_shift_records.html'
+    keyset_field = 'shift_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee',))
 
 
 class DailyShiftRecordsUpdateView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, UpdateView):
@@ -421,14 +476,18 @@ class DailyShiftRecordsUpdateView(LoginRequiredMixin, AllGroupsUserLocationFilte
     success_url = reverse_lazy('daily_shift_records')
 
 
-class WeeklyShiftRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class WeeklyShiftRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = WeeklyShiftRecords
     template_name = 'apos/weekly_shift_records.html'
+    keyset_field = 'start_week_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee',))
 
 
-class BreakRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class BreakRecordsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = BreakRecords
     template_name = 'apos/break_records.html'
+    keyset_field = 'break_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee', 'daily_shift_record'))
 
 
 class BreakRecordsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -438,8 +497,7 @@ class BreakRecordsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin,
     success_url = reverse_lazy('break_records')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee = employee
         form.instance.daily_shift_record = DailyShiftRecords.objects.filter(
             external_location=employee.external_location,
@@ -465,7 +523,7 @@ class BreakRecordsUpdateView(LoginRequiredMixin, AllGroupsUserLocationFilteredMi
 
 
 # Inventory management
-class InventoryItemsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class InventoryItemsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = InventoryItems
     template_name = 'apos/inventory_items.html'
 
@@ -477,8 +535,7 @@ class InventoryItemsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
     success_url = reverse_lazy('inventory_items')
 
     def form_valid(self, form):
-        user = self.request.user
-        external_location = get_object_or_404(Employees, user=user).external_location
+        external_location = get_employee_or_404(self.request).external_location
         form.instance.external_location = external_location
 
         messages.success(self.request, f'Inventory item called \'{form.instance.item_name}\' successfully created!')
@@ -502,9 +559,11 @@ class InventoryItemsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
     success_url = reverse_lazy('inventory_items')
 
 
-class InventoryChecksListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class InventoryChecksListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = InventoryChecks
     template_name = 'apos/inventory_checks.html'
+    keyset_field = 'check_date'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item', 'employee'))
 
 
 class InventoryChecksCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -514,8 +573,7 @@ class InventoryChecksCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMix
     success_url = reverse_lazy('inventory_checks')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee = employee
 
         messages.success(self.request, f'Inventory check for {form.instance.item.item_name} successfully logged!')
@@ -523,8 +581,7 @@ class InventoryChecksCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMix
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -548,9 +605,10 @@ class InventoryChecksDeleteView(LoginRequiredMixin, AllGroupsLocationFilteredMix
 
 
 # Vendor management
-class VendorsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class VendorsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = Vendors
     template_name = 'apos/vendors.html'
+    list_defer = ('other_contact_info',)
 
 
 class VendorsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -560,8 +618,7 @@ class VendorsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin
     success_url = reverse_lazy('vendors')
 
     def form_valid(self, form):
-        user = self.request.user
-        external_location = get_object_or_404(Employees, user=user).external_location
+        external_location = get_employee_or_404(self.request).external_location
         form.instance.external_location = external_location
 
         messages.success(self.request, f'Vendor \'{form.instance.vendor_name}\' successfully added!')
@@ -586,9 +643,11 @@ class VendorsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin
 
 
 # Inventory order management
-class OrdersListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class OrdersListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = Orders
     template_name = 'apos/orders.html'
+    keyset_field = 'order_date'
+    prefetch_plan = PrefetchPlan(select_related=('vendor', 'inventory_item'))
 
 
 class OrdersCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -598,8 +657,7 @@ class OrdersCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
     success_url = reverse_lazy('orders')
 
     def form_valid(self, form):
-        user = self.request.user
-        external_location = get_object_or_404(Employees, user=user).external_location
+        external_location = get_employee_or_404(self.request).external_location
         form.instance.external_location = external_location
 
         messages.success(self.request, f'Order successfully added!')
@@ -617,9 +675,11 @@ class OrdersUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
         return super().form_valid(form)
 
 
-class OrderInventoryListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class OrderInventoryListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = OrderInventory
     template_name = 'apos/order_inventory.html'
+    keyset_field = 'received_date'
+    prefetch_plan = PrefetchPlan(select_related=('order__vendor', 'order__inventory_item'))
 
 
 class OrderInventoryCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -630,8 +690,7 @@ class OrderInventoryCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -648,9 +707,11 @@ class OrderInventoryUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
         return super().form_valid(form)
 
 
-class OrderInventoryAlertsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class OrderInventoryAlertsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = OrderInventoryAlerts
     template_name = 'apos/order_inventory_alerts.html'
+    keyset_field = 'alert_date'
+    prefetch_plan = PrefetchPlan(select_related=('order__vendor', 'order__inventory_item'))
 
     def form_valid(self, form):
         messages.success(self.request, 'You have a new alert!')
@@ -658,9 +719,12 @@ class OrderInventoryAlertsListView(LoginRequiredMixin, OwnerOrManagementOrChefRe
 
 
 # Task management
-class TasksListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class TasksListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = Tasks
     template_name = 'apos/tasks.html'
+    keyset_field = 'due_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee_assignee', 'employee_assignor'))
+    list_defer = ('description',)
 
 
 class TasksCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -670,8 +734,7 @@ class TasksCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
     success_url = reverse_lazy('tasks')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee_assignor = employee
         
         messages.success(self.request, f'Task \'{form.instance.task_name}\' successfully assigned!')
@@ -679,8 +742,7 @@ class TasksCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -703,9 +765,11 @@ class TasksDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
     success_url = reverse_lazy('tasks')
 
 
-class TaskCommentsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class TaskCommentsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = TaskComments
     template_name = 'apos/task_comments.html'
+    keyset_field = 'comment_date'
+    prefetch_plan = PrefetchPlan(select_related=('task', 'employee_tasker', 'employee_commenter'))
 
 
 class TaskCommentsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -715,8 +779,7 @@ class TaskCommentsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequired
     success_url = reverse_lazy('task_comments')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee_commenter = employee
 
         messages.success(self.request, f'Comment added!')
@@ -724,8 +787,7 @@ class TaskCommentsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequired
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -743,8 +805,7 @@ class TaskCommentsUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefRequired
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -756,15 +817,16 @@ class TaskCommentsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequired
     success_url = reverse_lazy('task_comments')
 
 
-class TaskAlertsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, ListView):
+class TaskAlertsListView(LoginRequiredMixin, OwnerOrManagementOrChefFullEmployeeLimitedPermissionMixin, KeysetListView):
     model = TaskAlerts
     template_name = 'apos/task_alerts.html'
+    keyset_field = 'alert_date'
+    prefetch_plan = PrefetchPlan(select_related=('task', 'employee'))
 
 
 @login_required
 def task_alerts_create(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
     tasks_at_user = Tasks.objects.filter(employee_assignee=employee)
 
@@ -781,9 +843,10 @@ class TaskAlertsDeleteView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixi
 
 
 # Recipe management
-class RecipesListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class RecipesListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = Recipes
     template_name = 'apos/recipes.html'
+    list_defer = ('description', 'quality_standards')
 
 
 class RecipesCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -793,8 +856,7 @@ class RecipesCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin
     success_url = reverse_lazy('recipes')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.region_location = employee.region_location
 
         messages.success(self.request, f'Recipe \'{form.instance.recipe_name}\' successfully created!')
@@ -818,9 +880,10 @@ class RecipesDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin
     success_url = reverse_lazy('recipes')
 
 
-class RecipeIngredientsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class RecipeIngredientsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = RecipeIngredients
     template_name = 'apos/recipe_ingredients.html'
+    prefetch_plan = PrefetchPlan(select_related=('recipe', 'inventory_item'))
 
 
 class RecipeIngredientsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -835,8 +898,7 @@ class RecipeIngredientsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefReq
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
 
         kwargs['region_location'] = employee.region_location
         kwargs['external_location'] = employee.external_location
@@ -856,8 +918,7 @@ class RecipeIngredientsUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefReq
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
 
         kwargs['region_location'] = employee.region_location
         kwargs['external_location'] = employee.external_location
@@ -872,9 +933,10 @@ class RecipeIngredientsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefReq
 
 
 # Menu management
-class MenuItemsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class MenuItemsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = MenuItems
     template_name = 'apos/menu_items.html'
+    prefetch_plan = PrefetchPlan(select_related=('recipe',))
 
 
 class MenuItemsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -884,8 +946,7 @@ class MenuItemsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMix
     success_url = reverse_lazy('menu_items')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.external_location = employee.external_location
 
         messages.success(self.request, f'Menu item \'{form.instance.item_name}\' successfully added to the menu!')
@@ -893,8 +954,7 @@ class MenuItemsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMix
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['region_location'] = employee.region_location
 
         return kwargs
@@ -912,8 +972,7 @@ class MenuItemsUpdateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMix
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['region_location'] = employee.region_location
 
         return kwargs
@@ -925,9 +984,10 @@ class MenuItemsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMix
     success_url = reverse_lazy('menu_items')
 
 
-class AddOnsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class AddOnsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = AddOns
     template_name = 'apos/add_ons.html'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item',))
 
 
 class AddOnsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -942,8 +1002,7 @@ class AddOnsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -966,9 +1025,10 @@ class AddOnsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin,
     success_url = reverse_lazy('add_ons')
 
 
-class MenuItemAddOnsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class MenuItemAddOnsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = MenuItemAddOns
     template_name = 'apos/menu_item_add_ons.html'
+    prefetch_plan = PrefetchPlan(select_related=('menu_item', 'add_on'))
 
 
 class MenuItemAddOnsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -983,8 +1043,7 @@ class MenuItemAddOnsCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -996,15 +1055,18 @@ class MenuItemAddOnsDeleteView(LoginRequiredMixin, OwnerOrManagementOrChefRequir
     success_url = reverse_lazy('menu_item_add_ons')
 
 
-class MenuItemOrdersListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class MenuItemOrdersListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = MenuItemOrders
     template_name = 'apos/menu_item_orders.html'
+    prefetch_plan = PrefetchPlan(
+        select_related=('menu_item', 'internal_location'),
+        prefetch_related=(Prefetch('add_ons', queryset=AddOns.objects.order_by('add_on_name')),),
+    )
 
 
 @login_required
 def menu_item_ordering_page(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
     menu_items = MenuItems.objects.filter(external_location=employee.external_location)
     random_menu_item = menu_items.order_by('?').first().item_name if menu_items.exists() else 'Wait, there are no items on the menu... WHERE\'S THE CHEF? HELP! HELP!!!'
@@ -1059,35 +1121,33 @@ class MenuItemOrdersUpdateView(LoginRequiredMixin, AllGroupsLocationFilteredMixi
         return super().form_valid(form)
 
 
-class MenuEngineeringReportsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class MenuEngineeringReportsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = MenuEngineeringReports
     template_name = 'apos/menu_engineering_reports.html'
+    keyset_field = 'report_date'
+    prefetch_plan = PrefetchPlan(select_related=('menu_item',))
 
 
 @login_required
 def menu_engineering_report_create(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
-    if not user.groups.filter(name__in=['Owner', 'Management', 'Chef']).exists():
+    if not get_employee_context(request).in_groups('Owner', 'Management', 'Chef'):
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
         previous_url = request.META.get('HTTP_REFERER', 'home')
         return redirect(previous_url)
     
-    menu_items_at_external_location = MenuItems.objects.filter(external_location=employee.external_location)
+    job = enqueue('Menu engineering report', employee.external_location, requested_by=employee)
 
-    for menu_item in menu_items_at_external_location:
-        MenuEngineeringReports.objects.create(menu_item=menu_item)
-
-    return redirect('menu_engineering_reports')
+    messages.success(request, 'Menu engineering reports are being generated. They will appear here shortly.')
+    return redirect_with_job('menu_engineering_reports', job)
 
 
 @login_required
 def menu_engineering_report_delete_all(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
-    if not user.groups.filter(name__in=['Owner', 'Management', 'Chef']).exists():
+    if not get_employee_context(request).in_groups('Owner', 'Management', 'Chef'):
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
         previous_url = request.META.get('HTTP_REFERER', 'home')
         return redirect(previous_url)
@@ -1100,9 +1160,11 @@ def menu_engineering_report_delete_all(request):
 
 
 # Menu waste management
-class WasteRecordsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class WasteRecordsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = WasteRecords
     template_name = 'apos/waste_records.html'
+    keyset_field = 'date_wasted'
+    prefetch_plan = PrefetchPlan(select_related=('menu_item',))
 
 
 class WasteRecordsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -1116,8 +1178,7 @@ class WasteRecordsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin,
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1134,8 +1195,7 @@ class WasteRecordsUpdateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin,
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1147,32 +1207,29 @@ class WasteRecordsDeleteView(LoginRequiredMixin, AllGroupsLocationFilteredMixin,
     success_url = reverse_lazy('waste_records')
 
 
-class WasteAnalysisListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class WasteAnalysisListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = WasteAnalysis
     template_name = 'apos/waste_analysis.html'
+    keyset_field = 'analysis_date'
+    prefetch_plan = PrefetchPlan(select_related=('menu_item',))
 
 
 @login_required
 def waste_analysis_create(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
     if employee.job_position not in ['Owner', 'Manager', 'Chef', 'Cook', 'Kitchen assistant']:
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
         return redirect('waste_analysis')
 
-    menu_items_at_external_location = MenuItems.objects.filter(external_location=employee.external_location)
+    job = enqueue('Waste analysis', employee.external_location, requested_by=employee)
 
-    for menu_items in menu_items_at_external_location:
-        WasteAnalysis.objects.create(menu_item=menu_items)
-    
-    messages.success(request, 'Waste analysis records created successfully!')
-    return redirect('waste_analysis')
+    messages.success(request, 'Waste analysis records are being created. They will appear here shortly.')
+    return redirect_with_job('waste_analysis', job)
 
 @login_required
 def waste_analysis_delete_all(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
     if employee.job_position not in ['Owner', 'Manager', 'Chef', 'Cook', 'Kitchen assistant']:
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
@@ -1187,9 +1244,12 @@ def waste_analysis_delete_all(request):
 
 
 # Receipt creator + transactions log/tracker
-class PaymentsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class PaymentsListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = Payments
     template_name = 'apos/payments.html'
+    keyset_field = 'payment_datetime'
+    prefetch_plan = PrefetchPlan(select_related=('internal_location', 'employee'))
+    list_defer = ('ordered_menu_items_and_quantities', 'name_ordered_menu_items_and_quantities')
 
 
 class PaymentsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -1199,8 +1259,7 @@ class PaymentsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, Cre
     success_url = reverse_lazy('payment_success_receipt')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee = employee
 
         messages.success(self.request, f'Payment at table #{form.instance.internal_location} processed successfully!')
@@ -1208,8 +1267,7 @@ class PaymentsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, Cre
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1217,8 +1275,7 @@ class PaymentsCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, Cre
 
 @login_required
 def payment_receipt_print(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
     latest_payment = Payments.objects.filter(employee=employee).order_by('-payment_datetime').first()
     success_payment_msg = random.choice([
@@ -1234,9 +1291,10 @@ def payment_receipt_print(request):
 
 
 # Nutrition and allergen management
-class NutritionAllergenInfoListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class NutritionAllergenInfoListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = NutritionAllergenInfo
     template_name = 'apos/nutrition_allergen_info.html'
+    prefetch_plan = PrefetchPlan(select_related=('menu_item',))
 
 
 class NutritionAllergenInfoCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -1251,8 +1309,7 @@ class NutritionAllergenInfoCreateView(LoginRequiredMixin, OwnerOrManagementOrChe
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1276,9 +1333,10 @@ class NutritionAllergenInfoDeleteView(LoginRequiredMixin, OwnerOrManagementOrChe
 
 
 # Inventory cost reports
-class AccountingPeriodsListView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, ListView):
+class AccountingPeriodsListView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, KeysetListView):
     model = AccountingPeriods
     template_name = 'apos/accounting_periods.html'
+    keyset_field = 'accounting_period_start'
 
 
 class AccountingPeriodsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, CreateView):
@@ -1288,8 +1346,7 @@ class AccountingPeriodsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredM
     success_url = reverse_lazy('accounting_periods')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.region_location = employee.region_location
 
         messages.success(self.request, 'Accounting period added successfully!')
@@ -1313,54 +1370,200 @@ class AccountingPeriodsDeleteView(LoginRequiredMixin, OwnerOrManagementRequiredM
     success_url = reverse_lazy('accounting_periods')
 
 
-class InventoryCostReportsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+class InventoryCostReportsListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = InventoryCostReports
     template_name = 'apos/inventory_cost_reports.html'
+    keyset_field = 'report_date'
+    prefetch_plan = PrefetchPlan(select_related=('accounting_period',))
 
 
 @login_required
 def inventory_cost_report_create(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
-    if not user.groups.filter(name__in=['Owner', 'Management', 'Chef']).exists():
+    if not get_employee_context(request).in_groups('Owner', 'Management', 'Chef'):
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
         previous_url = request.META.get('HTTP_REFERER', 'home')
         return redirect(previous_url)
 
-    InventoryCostReports.objects.create(external_location=employee.external_location)
+    job = enqueue('Inventory cost report', employee.external_location, requested_by=employee)
+
+    messages.success(request, 'Inventory cost report is being created. It will appear here shortly.')
+    return redirect_with_job('inventory_cost_reports', job)
 
-    messages.success(request, 'Inventory cost report created successfully!')
-    return redirect('inventory_cost_reports')
 
+# Background report jobs; list pages get ?job=<pk> so their template can poll job_status until the reports land
+def redirect_with_job(url_name, job):
+    return redirect(f'{reverse(url_name)}?job={job.pk}')
 
-class InventoryUsageListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, ListView):
+
+@login_required
+def job_status(request, pk):
+    employee = get_employee_or_404(request)
+    job = get_object_or_404(ReportJobs, pk=pk, external_location=employee.external_location)
+
+    return JsonResponse({
+        'id': job.pk,
+        'job_type': job.job_type,
+        'status': job.status,
+        'progress': job.progress,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+    })
+
+
+@login_required
+def region_consolidated_report(request):
+    employee = get_employee_or_404(request)
+
+    if not get_employee_context(request).in_groups('Owner'):
+        messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
+        previous_url = request.META.get('HTTP_REFERER', 'home')
+        return redirect(previous_url)
+
+    accounting_periods = AccountingPeriods.objects.filter(
+        Q(region_location=employee.region_location) | Q(region_location__isnull=True)
+    ).order_by('-accounting_period_start')
+
+    if request.GET.get('period'):
+        accounting_period = get_object_or_404(accounting_periods, pk=request.GET['period'])
+    else:
+        accounting_period = accounting_periods.filter(
+            accounting_period_start__lte=date.today(),
+            accounting_period_end__gte=date.today()
+        ).first()
+
+    if accounting_period is None:
+        messages.error(request, 'There is no accounting period covering today. Add one to see the consolidated report.')
+        return redirect('accounting_reports')
+
+    summaries, total = consolidated_region_report(employee.region_location, accounting_period)
+
+    return render(request, 'apos/region_consolidated_report.html', {
+        'accounting_period': accounting_period,
+        'accounting_periods': accounting_periods,
+        'summaries': summaries,
+        'total': total,
+    })
+
+
+@login_required
+def export_csv(request, name):
+    employee = get_employee_or_404(request)
+    context = get_employee_context(request)
+
+    if name not in EXPORTS:
+        raise Http404
+
+    if not context.in_groups('Owner', 'Management'):
+        messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
+        previous_url = request.META.get('HTTP_REFERER', 'home')
+        return redirect(previous_url)
+
+    # Owners can export any location in their region (or all of it); management only their own location
+    if context.in_groups('Owner'):
+        external_locations = ExternalLocations.objects.filter(region_location=employee.region_location)
+
+        if request.GET.get('location'):
+            # Checked here; a bad id would otherwise only fail once the response had started streaming
+            try:
+                location = int(request.GET['location'])
+            except ValueError:
+                messages.error(request, 'Export location needs to be a location id.')
+                previous_url = request.META.get('HTTP_REFERER', 'home')
+                return redirect(previous_url)
+
+            external_locations = external_locations.filter(pk=location)
+    else:
+        external_locations = ExternalLocations.objects.filter(pk=employee.external_location_id)
+
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        messages.error(request, 'Export dates need to be in YYYY-MM-DD format.')
+        previous_url = request.META.get('HTTP_REFERER', 'home')
+        return redirect(previous_url)
+
+    compress = request.GET.get('gzip') in ('1', 'true')
+    lines = csv_lines(export_queryset(name, external_locations, start, end))
+
+    if compress:
+        response = StreamingHttpResponse(gzip_chunks(lines), content_type='application/gzip')
+    else:
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(name, start, end, compress)}"'
+    return response
+
+
+@login_required
+def import_csv(request, name):
+    employee = get_employee_or_404(request)
+
+    if name not in IMPORTS:
+        raise Http404
+
+    # Same groups that can create these records one at a time
+    groups = ('Owner', 'Management') if name == 'employees' else ('Owner', 'Management', 'Chef')
+
+    if not get_employee_context(request).in_groups(*groups):
+        messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
+        previous_url = request.META.get('HTTP_REFERER', 'home')
+        return redirect(previous_url)
+
+    result = None
+
+    if request.method == 'POST':
+        form = CSVImportForm(request.POST, request.FILES)
+
+        if form.is_valid():
+            result = import_rows(name, read_csv(request.FILES['file']), employee.external_location)
+
+            if result.errors:
+                messages.error(request, f'{len(result.errors)} row(s) could not be imported. See the list below.')
+            else:
+                messages.success(request, f'{result.created} row(s) imported, {result.skipped} already there.')
+    else:
+        form = CSVImportForm()
+
+    return render(request, 'apos/import_csv.html', {
+        'form': form,
+        'import_name': name,
+        'result': result,
+    })
+
+
+class InventoryUsageListView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, KeysetListView):
     model = InventoryUsage
     template_name = 'apos/inventory_usage.html'
+    keyset_field = 'report_date'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item', 'accounting_period'))
 
 
 @login_required
 def inventory_usage_create(request):
-    user = request.user
-    employee = get_object_or_404(Employees, user=user)
+    employee = get_employee_or_404(request)
 
-    if not user.groups.filter(name__in=['Owner', 'Management', 'Chef']).exists():
+    if not get_employee_context(request).in_groups('Owner', 'Management', 'Chef'):
         messages.error(request, f'Woah there {employee.first_name}! Nothing to see here! Please go back :)')
         previous_url = request.META.get('HTTP_REFERER', 'home')
         return redirect(previous_url)
 
-    inventory_item_at_external_location = InventoryItems.objects.filter(external_location=employee.external_location)
+    job = enqueue('Inventory usage', employee.external_location, requested_by=employee)
 
-    for inventory_item in inventory_item_at_external_location:
-        InventoryUsage.objects.create(inventory_item=inventory_item)
-    
-    messages.success(request, 'Inventory usage report created successfully!')
-    return redirect('inventory_usage')
+    messages.success(request, 'Inventory usage report is being created. It will appear here shortly.')
+    return redirect_with_job('inventory_usage', job)
 
 
-class InventoryTransfersListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class InventoryTransfersListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = InventoryTransfers
     template_name = 'apos/inventory_transfers.html'
+    keyset_field = 'transfer_date'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item', 'source_external_location', 'destination_external_location'))
 
 
 class InventoryTransfersCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRequiredMixin, CreateView):
@@ -1374,8 +1577,7 @@ class InventoryTransfersCreateView(LoginRequiredMixin, OwnerOrManagementOrChefRe
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
 
         kwargs['region_location'] = employee.region_location
         kwargs['external_location'] = employee.external_location
@@ -1394,8 +1596,7 @@ class InventoryTransfersUpdateView(LoginRequiredMixin, AllGroupsLocationFiltered
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
 
         kwargs['region_location'] = employee.region_location
         kwargs['external_location'] = employee.external_location
@@ -1409,9 +1610,11 @@ class InventoryTransfersDeleteView(LoginRequiredMixin, AllGroupsLocationFiltered
     success_url = reverse_lazy('inventory_transfers')
 
 
-class InventoryTransfersInternalListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, ListView):
+class InventoryTransfersInternalListView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, KeysetListView):
     model = InventoryTransfers
     template_name = 'apos/inventory_transfers_internal.html'
+    keyset_field = 'transfer_date'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item', 'source_external_location', 'destination_external_location'))
 
 
 class InventoryTransfersInternalCreateView(LoginRequiredMixin, AllGroupsLocationFilteredMixin, CreateView):
@@ -1456,9 +1659,12 @@ class InventoryTransfersInternalDeleteView(LoginRequiredMixin, AllGroupsLocation
     success_url = reverse_lazy('inventory_transfers_internal')
 
 
-class InventoryWasteBinListView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, ListView):
+class InventoryWasteBinListView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, KeysetListView):
     model = InventoryWasteBin
     template_name = 'apos/inventory_waste_bin.html'
+    keyset_field = 'waste_date'
+    prefetch_plan = PrefetchPlan(select_related=('inventory_item', 'employee_culprit', 'employee_reporter'))
+    list_defer = ('comments',)
 
 
 class InventoryWasteBinCreateView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, CreateView):
@@ -1468,8 +1674,7 @@ class InventoryWasteBinCreateView(LoginRequiredMixin, AllGroupsUserLocationFilte
     success_url = reverse_lazy('inventory_waste_bin')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.employee_reporter = employee
         
         messages.success(self.request, f'Wastage caused by {form.instance.employee_culprit} recorded successfully!')
@@ -1477,8 +1682,7 @@ class InventoryWasteBinCreateView(LoginRequiredMixin, AllGroupsUserLocationFilte
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1496,8 +1700,7 @@ class InventoryWasteBinUpdateView(LoginRequiredMixin, AllGroupsUserLocationFilte
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
         
         return kwargs
@@ -1510,9 +1713,11 @@ class InventoryWasteBinDeleteView(LoginRequiredMixin, AllGroupsUserLocationFilte
 
 
 # Tip management
-class EmployeeTipRecordsListView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, ListView):
+class EmployeeTipRecordsListView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, KeysetListView):
     model = EmployeeTipRecords
     template_name = 'apos/employee_tip_records.html'
+    keyset_field = 'tip_date'
+    prefetch_plan = PrefetchPlan(select_related=('employee', 'internal_location'))
 
 
 class EmployeeTipRecordsCreateView(LoginRequiredMixin, AllGroupsUserLocationFilteredMixin, CreateView):
@@ -1522,8 +1727,7 @@ class EmployeeTipRecordsCreateView(LoginRequiredMixin, AllGroupsUserLocationFilt
     success_url = reverse_lazy('employee_tip_records')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
 
         form.instance.external_location = employee.external_location
         form.instance.employee = employee
@@ -1540,8 +1744,7 @@ class EmployeeTipRecordsCreateView(LoginRequiredMixin, AllGroupsUserLocationFilt
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
@@ -1559,16 +1762,16 @@ class EmployeeTipRecordsUpdateView(LoginRequiredMixin, AllGroupsUserLocationFilt
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         kwargs['external_location'] = employee.external_location
 
         return kwargs
     
 
-class TipPoolingRecordsListView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, ListView):
+class TipPoolingRecordsListView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, KeysetListView):
     model = TipPoolingRecords
     template_name = 'apos/tip_pooling_records.html'
+    keyset_field = 'date'
 
 
 class TipPoolingRecordsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredMixin, CreateView):
@@ -1578,8 +1781,7 @@ class TipPoolingRecordsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredM
     success_url = reverse_lazy('tip-pooling_records')
 
     def form_valid(self, form):
-        user = self.request.user
-        employee = get_object_or_404(Employees, user=user)
+        employee = get_employee_or_404(self.request)
         form.instance.external_location = employee.external_location
 
         if form.instance.calculate_or_send_tips == 'calculate':
@@ -1590,6 +1792,8 @@ class TipPoolingRecordsCreateView(LoginRequiredMixin, OwnerOrManagementRequiredM
         return super().form_valid(form)
 
 
-class EmployeeTipPayoutsListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, ListView):
+class EmployeeTipPayoutsListView(LoginRequiredMixin, OwnerOrManagementFullChefOrEmployeeLimitedPermissionMixin, KeysetListView):
     model = EmployeeTipPayouts
     template_name = 'apos/employee_tip_payouts.html'
+    keyset_field = 'date'
+    prefetch_plan = PrefetchPlan(select_related=('employee', 'tip_pool_record'))
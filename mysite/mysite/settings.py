@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apos.middleware.EmployeeContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,6 +90,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than SQLite's shared in-memory database, whose table locks fail the threaded tests outright
+        # instead of waiting their turn
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -97,6 +103,51 @@ DATABASES = {
 AUTH_USER_MODEL = 'apos.CustomUser'
 
 
+# Per-user group and location scope cache used by the permission mixins;
+# set CACHE_ALIAS to one of CACHES to share entries between worker processes
+APOS_EMPLOYEE_SCOPE_CACHE = {
+    'MAXSIZE': 2048,
+    'TIMEOUT': 60,
+    'CACHE_ALIAS': None,
+}
+
+# Per-recipe ingredient cost cache; entries are dropped when an ingredient or its inventory item is saved
+APOS_RECIPE_COST_CACHE = {
+    'MAXSIZE': 4096,
+    'TIMEOUT': 300,
+    'CACHE_ALIAS': None,
+}
+
+# Derived EmployeesPerformance rows, kept for TIMEOUT seconds; nothing invalidates them early
+APOS_DERIVED_PERFORMANCE_CACHE = {
+    'MAXSIZE': 4096,
+    'TIMEOUT': 60,
+    'CACHE_ALIAS': None,
+}
+
+# Per-location performance leaderboards; a counter write marks its metrics stale so only those are rebuilt,
+# TIMEOUT bounds how long another worker's writes can go unseen
+APOS_LEADERBOARD_CACHE = {
+    'MAXSIZE': 1024,
+    'TIMEOUT': 300,
+    'CACHE_ALIAS': None,
+}
+
+# Default and largest rows per list page; pages can ask for any size in between with ?page_size=
+APOS_LIST_PAGE_SIZE = 50
+APOS_LIST_MAX_PAGE_SIZE = 200
+
+# Report jobs run by `manage.py run_report_jobs` (defaults in apos.jobs.JOB_SETTINGS). Set APOS_REPORT_JOBS to a
+# dict of just the keys to change: MAX_ATTEMPTS, BACKOFF_SECONDS (doubled each attempt, up to MAX_BACKOFF_SECONDS)
+# and STALE_AFTER_SECONDS
+
+# EmployeesPerformance counters (defaults in apos.counters.COUNTER_SETTINGS). Set APOS_PERFORMANCE_COUNTERS to a dict
+# of just the keys to change. SOURCE 'derived' stops writing them and the performance page sums the shift, break,
+# payment, request and waste records instead (`manage.py reconcile_performance` compares the two). BUFFERED
+# increments are summed per process and written every MAX_PENDING employees or MAX_AGE_SECONDS, at the cost of losing
+# the unwritten ones if the process dies
+
+
 # Twilio SMS authentication
 TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN')